@@ -0,0 +1,100 @@
+"""
+Сравнение времени OCR и пикового RSS с подготовкой изображений и без неё.
+
+    uv run -m benchmarks.bench_preprocessing [--repeat 3] [images...]
+
+Каждый режим запускается в отдельном процессе, чтобы пиковый RSS одного
+режима не влиял на другой. По умолчанию берутся 00006.png, 00006_aug.png и 2.png.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_IMAGES = [os.path.join(ROOT, name) for name in ('00006.png', '00006_aug.png', '2.png')]
+MODES = ('raw', 'preprocessed')
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss в Linux — килобайты
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode: str, images: list[str], repeat: int) -> dict:
+    from surya.foundation import FoundationPredictor
+    from surya.recognition import RecognitionPredictor
+    from surya.detection import DetectionPredictor
+
+    from src.tg_bot.utils.image_preprocessing import preprocess_image
+
+    recognition_predictor = RecognitionPredictor(FoundationPredictor())
+    detection_predictor = DetectionPredictor()
+    rss_after_load = peak_rss_mb()
+
+    results = {}
+    for path in images:
+        timings = []
+        lines = 0
+        for _ in range(repeat):
+            image = Image.open(path)
+            started = time.perf_counter()
+            if mode == 'preprocessed':
+                image = preprocess_image(image).image
+            prediction = recognition_predictor([image], det_predictor=detection_predictor)[0]
+            timings.append(time.perf_counter() - started)
+            lines = len(prediction.text_lines)
+        results[os.path.basename(path)] = {
+            'seconds_min': min(timings),
+            'seconds_mean': sum(timings) / len(timings),
+            'text_lines': lines,
+        }
+
+    return {
+        'mode': mode,
+        'images': results,
+        'rss_after_load_mb': rss_after_load,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images', nargs='*', default=DEFAULT_IMAGES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--mode', choices=MODES, help='запустить один режим в текущем процессе')
+    parser.add_argument('--json', action='store_true', help='вывести отчёт в JSON')
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.images, args.repeat)))
+        return
+
+    reports = []
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_preprocessing', '--mode', mode,
+             '--repeat', str(args.repeat), *args.images],
+            cwd=ROOT, check=True, capture_output=True, text=True,
+        ).stdout
+        reports.append(json.loads(output.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+        return
+
+    for report in reports:
+        print(f"{report['mode']}: пиковый RSS {report['peak_rss_mb']:.0f} МБ "
+              f"(после загрузки моделей {report['rss_after_load_mb']:.0f} МБ)")
+        for name, stats in report['images'].items():
+            print(f"  {name:<16} min {stats['seconds_min']:.2f} с, "
+                  f"mean {stats['seconds_mean']:.2f} с, строк {stats['text_lines']}")
+
+
+if __name__ == '__main__':
+    main()
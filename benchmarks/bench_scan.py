@@ -0,0 +1,298 @@
+"""
+Офлайн-бенчмарк пути /scan без Telegram и YandexGPT.
+
+    uv run -m benchmarks.bench_scan [--ocr recorded|live] [--concurrency 1,4,8]
+                                    [--scans 20] [--llm-latency 0.8]
+                                    [--completions completions.json]
+                                    [--output report.json] [inputs...]
+
+Входы — файлы или каталоги с изображениями (png/jpg) и записанными выходами
+OCR в формате ocr_results.json; запись с тем же именем, что и изображение
+(00006.png + 00006.json), считается его OCR. По умолчанию — изображения из
+корня репозитория и ocr_results.json.
+
+Этапы, как в cmd_scan: decode → preprocess → ocr → parse → persist. В режиме
+recorded этап ocr воспроизводит записанный выход (с задержкой --ocr-latency),
+в режиме live работает настоящий OCR-воркер с Surya. YandexGPT подменяется
+заглушкой, которая отдаёт записанные ответы с задержкой --llm-latency:
+--completions — JSON-список ответов (по кругу) или словарь sha1(промпт) → ответ.
+
+Отчёт — JSON: p50/p95 по этапам и пропускная способность для каждого уровня
+параллельности, пиковый RSS. Результаты пишутся во временную БД.
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, redirect_stdout
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_INPUTS = [os.path.join(ROOT, name) for name in ('00006.png', '00006_aug.png', '2.png', 'ocr_results.json')]
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+STAGES = ('decode', 'preprocess', 'ocr', 'parse', 'persist', 'total')
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss в Linux — килобайты
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@dataclass
+class Sample:
+    name: str
+    image_path: str | None = None
+    # Записанный выход OCR: список страниц {"text_lines": [{"text", "bbox", ...}]}
+    recorded: list | None = None
+
+
+@dataclass
+class StageTimer:
+    timings: dict[str, list[float]] = field(default_factory=lambda: {stage: [] for stage in STAGES})
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name].append(time.perf_counter() - started)
+
+
+class ReplayLLM:
+    """Заглушка llm_client.run: записанные ответы с заданной задержкой."""
+
+    def __init__(self, completions: list[str] | dict[str, str] | None, latency: float, jitter: float):
+        self.completions = completions
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._cycle = itertools.cycle(completions) if isinstance(completions, list) and completions else None
+
+    def completion_for(self, prompt: str) -> str:
+        if isinstance(self.completions, dict):
+            return self.completions.get(hashlib.sha1(prompt.encode('utf-8')).hexdigest(), '')
+        return next(self._cycle) if self._cycle else ''
+
+    async def run(self, prompt: str, model: str = "yandexgpt", temperature: float | None = None):
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        return SimpleNamespace(alternatives=[SimpleNamespace(text=self.completion_for(prompt))])
+
+    async def complete(self, prompt: str, model: str = "yandexgpt", temperature: float | None = None) -> str:
+        result = await self.run(prompt, model=model, temperature=temperature)
+        return result.alternatives[0].text
+
+
+def collect_samples(inputs: list[str]) -> list[Sample]:
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            paths.extend(sorted(os.path.join(path, name) for name in os.listdir(path)))
+        else:
+            paths.append(path)
+
+    samples: dict[str, Sample] = {}
+    for path in paths:
+        stem, extension = os.path.splitext(os.path.basename(path))
+        sample = samples.setdefault(stem, Sample(name=stem))
+        if extension.lower() in IMAGE_EXTENSIONS:
+            sample.image_path = path
+        elif extension.lower() == '.json':
+            with open(path, encoding='utf-8') as file:
+                sample.recorded = json.load(file)
+    return list(samples.values())
+
+
+def recorded_pages(recorded: list) -> list:
+    from src.tg_bot.utils.pdf_reader import TextLine
+
+    return [
+        SimpleNamespace(text_lines=[
+            TextLine(text=line['text'], bbox=line['bbox'], confidence=line.get('confidence', 1.0))
+            for line in page['text_lines']
+        ])
+        for page in recorded
+    ]
+
+
+async def scan_once(sample: Sample, user_id: int, timer: StageTimer, ocr_mode: str, ocr_latency: float):
+    """Один проход пути cmd_scan с замером каждого этапа."""
+    from src.tg_bot.config import settings
+    from src.tg_bot.services.analysis_service import AnalysisService, _restore_coordinates
+    from src.tg_bot.services.ocr_worker import ocr_worker
+    from src.tg_bot.utils.image_preprocessing import preprocess_image
+    from src.tg_bot.utils.ocr_to_csv import ocr_results_to_csv
+
+    with timer.stage('total'):
+        image = prepared = None
+        if sample.image_path is not None:
+            with timer.stage('decode'):
+                image = await asyncio.to_thread(lambda: Image.open(sample.image_path).convert('RGB'))
+            if settings.ocr_preprocess:
+                with timer.stage('preprocess'):
+                    prepared = await asyncio.to_thread(
+                        preprocess_image,
+                        image,
+                        max_side=settings.ocr_max_side,
+                        target_dpi=settings.ocr_target_dpi,
+                        crop_page=settings.ocr_crop_page,
+                        deskew=settings.ocr_deskew,
+                    )
+
+        with timer.stage('ocr'):
+            if ocr_mode == 'live':
+                pages = [await ocr_worker.recognize(prepared.image if prepared else image)]
+                if prepared is not None:
+                    _restore_coordinates(pages[0], prepared)
+            else:
+                await asyncio.sleep(ocr_latency)
+                pages = recorded_pages(sample.recorded)
+
+        with timer.stage('parse'):
+            csv_text = await ocr_results_to_csv(pages)
+
+        with timer.stage('persist'):
+            if csv_text:
+                rows = [f"{user_id},{line}" for line in csv_text.strip().split('\n') if line]
+                await AnalysisService.save_scan_to_csv('\n'.join(rows))
+
+
+def summarize(values: list[float]) -> dict:
+    if not values:
+        return {'count': 0}
+    array = np.asarray(values) * 1000
+    return {
+        'count': len(values),
+        'p50_ms': round(float(np.percentile(array, 50)), 3),
+        'p95_ms': round(float(np.percentile(array, 95)), 3),
+        'max_ms': round(float(array.max()), 3),
+    }
+
+
+async def run_level(samples: list[Sample], concurrency: int, scans: int, args, user_ids) -> dict:
+    timer = StageTimer()
+    slots = asyncio.Semaphore(concurrency)
+    errors = []
+
+    async def one(index: int):
+        async with slots:
+            try:
+                await scan_once(samples[index % len(samples)], next(user_ids), timer, args.ocr, args.ocr_latency)
+            except Exception as e:
+                errors.append(f"{samples[index % len(samples)].name}: {e!r}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(scans)))
+    wall = time.perf_counter() - started
+
+    return {
+        'concurrency': concurrency,
+        'scans': scans,
+        'wall_seconds': round(wall, 3),
+        'throughput_per_second': round((scans - len(errors)) / wall, 3) if wall else None,
+        'errors': errors,
+        'stages': {stage: summarize(values) for stage, values in timer.timings.items()},
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+async def run(args) -> dict:
+    from src.tg_bot.services.ocr_worker import ocr_worker, model_registry
+    from src.tg_bot.services.result_writer import result_writer
+    from src.tg_bot.utils import llm_client as llm_module
+
+    completions = None
+    if args.completions:
+        with open(args.completions, encoding='utf-8') as file:
+            completions = json.load(file)
+    stub = ReplayLLM(completions, latency=args.llm_latency, jitter=args.llm_jitter)
+    llm_module.llm_client.run = stub.run
+    llm_module.llm_client.complete = stub.complete
+
+    samples = collect_samples(args.inputs)
+    if args.ocr == 'live':
+        samples = [sample for sample in samples if sample.image_path is not None]
+        await model_registry.start(warmup=True)
+        await ocr_worker.start()
+    else:
+        skipped = [sample.name for sample in samples if sample.recorded is None]
+        if skipped:
+            print(f"нет записанного OCR, пропускаю: {', '.join(skipped)}", file=sys.stderr)
+        samples = [sample for sample in samples if sample.recorded is not None]
+    if not samples:
+        raise SystemExit("Нет входов для выбранного режима OCR")
+
+    user_ids = itertools.count(10 ** 12)
+    levels = []
+    await result_writer.start()
+    try:
+        # Прогревочный проход, чтобы импорт и первые аллокации не попали в замеры
+        await run_level(samples, 1, len(samples), args, user_ids)
+        for concurrency in args.concurrency:
+            levels.append(await run_level(samples, concurrency, args.scans, args, user_ids))
+    finally:
+        await result_writer.stop()
+        if args.ocr == 'live':
+            await ocr_worker.stop()
+            await model_registry.stop()
+
+    return {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {
+            'ocr': args.ocr,
+            'samples': [sample.name for sample in samples],
+            'scans_per_level': args.scans,
+            'ocr_latency': args.ocr_latency,
+            'llm_latency': args.llm_latency,
+            'llm_jitter': args.llm_jitter,
+            'llm_calls': stub.calls,
+        },
+        'levels': levels,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='*', default=DEFAULT_INPUTS)
+    parser.add_argument('--ocr', choices=('recorded', 'live'), default='recorded')
+    parser.add_argument('--concurrency', type=lambda text: [int(value) for value in text.split(',')],
+                        default=[1, 4, 8])
+    parser.add_argument('--scans', type=int, default=20, help='сканов на каждый уровень параллельности')
+    parser.add_argument('--ocr-latency', type=float, default=0.0, help='задержка воспроизведения OCR, с')
+    parser.add_argument('--llm-latency', type=float, default=0.8, help='задержка ответа заглушки LLM, с')
+    parser.add_argument('--llm-jitter', type=float, default=0.0)
+    parser.add_argument('--completions', help='JSON с записанными ответами LLM')
+    parser.add_argument('--output', help='записать отчёт в файл вместо stdout')
+    args = parser.parse_args()
+
+    # Настройки читаются при импорте модулей бота — подменяем пути до импорта
+    workdir = tempfile.mkdtemp(prefix='bench_scan_')
+    os.environ['DB_PATH'] = os.path.join(workdir, 'bench.db')
+    os.environ['SCAN_CACHE_DIR'] = os.path.join(workdir, 'scan_cache')
+
+    # Сервисы печатают отладку в stdout — уводим её в stderr, чтобы stdout оставался чистым JSON
+    with redirect_stdout(sys.stderr):
+        report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,67 @@
 import asyncio
+import logging
+from functools import partial
 
 from aiogram import Bot, Dispatcher
 
 from .config import settings
-from .handlers.user_handlers import router
+from .handlers.user_handlers import router, deliver_scan_result
+from .middlewares.metrics import MetricsMiddleware
+from .middlewares.throttling import ThrottlingMiddleware
+from .services.ocr_worker import ocr_worker, model_registry
+from .services.storage import get_storage
+from .services.result_writer import result_writer
+from .services.chart_renderer import chart_renderer
+from .services.job_queue import get_job_queue, get_job_results
+from .utils.metrics import MetricsServer
+
+
+async def start_models():
+    # Прогрев идёт фоновой задачей и не задерживает начало поллинга
+    await model_registry.start(warmup=settings.models_warmup_on_start)
+
+
+async def import_legacy_csv():
+    # Старый analysis_results.csv переносится в SQLite один раз
+    get_storage().import_csv(settings.legacy_csv_path)
 
 
 async def main():
+    logging.basicConfig(level=settings.log_level)
+    metrics_server = MetricsServer(settings.metrics_host, settings.metrics_port)
+
     bot = Bot(token=settings.bot_token)
     dp = Dispatcher()
+    router.message.middleware(MetricsMiddleware())
+    router.callback_query.middleware(MetricsMiddleware())
+    router.message.middleware(ThrottlingMiddleware({
+        "scan": (settings.rate_scan_burst, settings.rate_scan_per_minute),
+        "llm": (settings.rate_llm_burst, settings.rate_llm_per_minute),
+        "chart": (settings.rate_chart_burst, settings.rate_chart_per_minute),
+    }))
     dp.include_router(router)
+    dp.startup.register(import_legacy_csv)
+    dp.startup.register(metrics_server.start)
+    dp.startup.register(result_writer.start)
+    dp.startup.register(chart_renderer.start)
+    if settings.scan_queue_enabled:
+        # Тяжёлое распознавание — в процессах src.tg_bot.worker, бот только доставляет результаты
+        job_results = get_job_results()
+        job_results.register("image", partial(deliver_scan_result, bot))
+        job_results.register("pdf", partial(deliver_scan_result, bot))
+        dp.startup.register(job_results.start)
+        dp.shutdown.register(job_results.stop)
+        dp.shutdown.register(get_job_queue().close)
+    else:
+        dp.startup.register(ocr_worker.start)
+        dp.startup.register(start_models)
+    dp.shutdown.register(ocr_worker.stop)
+    dp.shutdown.register(model_registry.stop)
+    dp.shutdown.register(metrics_server.stop)
+    dp.shutdown.register(chart_renderer.stop)
+    # Дописываем принятые сканы до закрытия базы
+    dp.shutdown.register(result_writer.stop)
+    dp.shutdown.register(get_storage().close)
     await dp.start_polling(bot)
 
 
@@ -5,6 +5,103 @@ class Settings(BaseSettings):
     yc_folder_id: str
     yc_auth_token: str
 
+    # Воркер распознавания: размер батча, окно ожидания (сек) и длина очереди
+    ocr_max_batch_size: int = 8
+    ocr_max_wait: float = 0.05
+    ocr_queue_size: int = 32
+
+    # Модели Surya: прогрев в фоне после старта и выгрузка после простоя (сек, 0 — не выгружать)
+    models_warmup_on_start: bool = True
+    models_idle_unload: float = 1800
+
+    # Хранилище результатов и старый CSV, который импортируется в него один раз
+    db_path: str = "analysis_results.db"
+    legacy_csv_path: str = "analysis_results.csv"
+
+    # YandexGPT: одновременные запросы, таймаут (сек), повторы и предохранитель
+    llm_max_concurrency: int = 4
+    llm_timeout: float = 60.0
+    llm_retries: int = 3
+    llm_backoff_base: float = 0.5
+    llm_backoff_max: float = 8.0
+    llm_breaker_threshold: int = 5
+    llm_breaker_reset: float = 30.0
+    # Не чаще скольких секунд редактировать сообщение при потоковом выводе ответа YandexGPT
+    llm_stream_edit_interval: float = 1.0
+
+    # Лимит частоты тяжёлых команд на пользователя: сколько подряд (burst) и сколько в минуту
+    rate_scan_burst: int = 3
+    rate_scan_per_minute: float = 6
+    rate_llm_burst: int = 3
+    rate_llm_per_minute: float = 6
+    rate_chart_burst: int = 5
+    rate_chart_per_minute: float = 20
+
+    # Справедливая очередь к OCR и YandexGPT: одновременных работ OCR и веса пользователей
+    # (user_id → сколько слотов подряд получает за обход, по умолчанию 1)
+    fair_ocr_concurrency: int = 16
+    fair_user_weights: dict[int, int] = {}
+
+    # Кэш распознанных сканов: каталог и предельный размер
+    scan_cache_dir: str = "scan_cache"
+    scan_cache_max_bytes: int = 200 * 1024 * 1024
+
+    # Архив выходов OCR всех сканов (колоночные файлы) для повторного прогона парсеров без OCR
+    ocr_archive_enabled: bool = True
+    ocr_archive_dir: str = "ocr_archive"
+
+    # Подготовка фото перед OCR: длинная сторона (px), целевой DPI и дополнительные шаги
+    ocr_preprocess: bool = True
+    ocr_max_side: int = 2048
+    ocr_target_dpi: int | None = None
+    ocr_crop_page: bool = False
+    ocr_deskew: bool = False
+
+    # Второй проход OCR: строки таблицы с уверенностью Surya ниже ocr_min_confidence
+    # распознаются повторно по увеличенным вырезкам (не больше ocr_refine_max_lines, 0 — выключено);
+    # оставшиеся ненадёжными строки получают статус invalid
+    ocr_min_confidence: float = 0.75
+    ocr_refine_max_lines: int = 24
+    ocr_refine_scale: float = 2.0
+
+    # PDF: разрешение растеризации страниц без текстового слоя и предел числа страниц
+    pdf_dpi: int = 150
+    pdf_max_pages: int = 50
+
+    # Кэш сводок /analyse и ответов /ask
+    summary_cache_max_entries: int = 10000
+    summary_cache_ttl_days: int = 30
+
+    # Графики /chart: процессов отрисовки (0 — рисовать в потоке бота) и записей в кэше графиков
+    chart_render_processes: int = 2
+    chart_cache_max_entries: int = 1000
+
+    # История в промпте: бюджет токенов и число последних точек на показатель
+    llm_history_token_budget: int = 2000
+    llm_history_latest_points: int = 6
+
+    # Очередь заданий на распознавание для отдельных процессов-воркеров (python -m src.tg_bot.worker).
+    # При scan_queue_enabled=False сканы распознаются в процессе бота, как раньше
+    scan_queue_enabled: bool = False
+    scan_worker_processes: int = 2
+    jobs_db_path: str = "jobs.db"
+    jobs_spool_dir: str = "jobs_spool"
+    jobs_max_attempts: int = 3
+    jobs_retry_delay: float = 5.0
+    jobs_lease: float = 120.0
+    jobs_poll_interval: float = 0.5
+
+    # Групповая запись результатов сканов: транзакция собирается, пока не наберётся
+    # write_batch_max_rows строк или не пройдёт write_batch_max_delay секунд с первого скана
+    write_batch_max_rows: int = 500
+    write_batch_max_delay: float = 0.05
+
+    # Метрики: локальный HTTP-эндпоинт /metrics (порт 0 — выключен) и JSON-лог с разбивкой времени запросов
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 9108
+    log_request_timings: bool = False
+    log_level: str = "INFO"
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
 settings = Settings()
@@ -1,20 +1,52 @@
+import asyncio
 import io
 import csv
-from datetime import timedelta, datetime
+import html
+from datetime import timedelta, datetime, date
 
+import pandas as pd
 from PIL import Image
 
 from aiogram import Router, types, F, Bot
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command, StateFilter
+from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 
 
 from src.tg_bot.services.analysis_service import AnalysisService
+from src.tg_bot.services.ocr_worker import OcrQueueFullError
+from src.tg_bot.services.job_queue import get_job_queue, Job, FAILED
+from src.tg_bot.config import settings
 from src.tg_bot.models.analysis_models import AnalysesQuery
+from src.tg_bot.utils.metrics import stage
+from src.tg_bot.utils.status_engine import ABNORMAL_STATUSES
+from src.tg_bot.utils.telegram_stream import MESSAGE_LIMIT, MessageStream
 
 router = Router()
 
+# Сколько карточек запрашивать на страницу истории
+HISTORY_PAGE_SIZE = 10
+
+
+# Аргументы /history, включающие фильтр «только отклонения»
+ABNORMAL_ARGS = ("отклонения", "abnormal")
+
+
+class HistoryPage(CallbackData, prefix="hist"):
+    """
+    Курсор страницы истории: направление и id крайней карточки текущей страницы.
+    Дата карточки в callback data не попадает (лимит 64 байта, ':' — разделитель
+    полей): хранилище берёт её по id. direction="first" — первая страница
+    (переключение фильтра отклонений).
+    """
+    direction: str
+    row_id: int
+    start: str | None = None
+    end: str | None = None
+    abnormal: bool = False
+
 # Состояния FSM для процесса выбора периода
 class AnalysisPeriod(StatesGroup):
     choosing_start = State()
@@ -38,7 +70,7 @@ async def cmd_start(message: types.Message):
         ],
         resize_keyboard=True
     )
-    await message.answer("Welcome! Use /scan, /analyse, /history or /ask commands.", reply_markup=keyboard)
+    await message.answer("Welcome! Use /scan, /analyse, /history, /chart or /ask commands.", reply_markup=keyboard)
 
 @router.message(Command("ask"))
 async def cmd_ask_start(message: types.Message, state: FSMContext):
@@ -49,15 +81,16 @@ async def cmd_ask_start(message: types.Message, state: FSMContext):
     # Переводим бота в состояние ожидания вопроса
     await state.set_state(PromptState.waiting_for_prompt)
 
-@router.message(StateFilter(PromptState.waiting_for_prompt), F.text)
-async def process_user_prompt(message: types.Message, state: FSMContext):
-    # Сначала проверяем, не хочет ли пользователь отменить действие
-    if message.text.lower() in ['/cancel', 'отмена']:
-        await message.reply("Действие отменено.")
-        await state.clear()
-        await cmd_start(message)
-        return
+# Отмена регистрируется раньше обработчика вопроса и без флага rate_limit:
+# она не тратит токен LLM и доступна пользователю, упёршемуся в лимит
+@router.message(StateFilter(PromptState.waiting_for_prompt), F.text.lower().in_({'/cancel', 'отмена'}))
+async def process_prompt_cancel(message: types.Message, state: FSMContext):
+    await message.reply("Действие отменено.")
+    await state.clear()
+    await cmd_start(message)
 
+@router.message(StateFilter(PromptState.waiting_for_prompt), F.text, flags={"rate_limit": "llm"})
+async def process_user_prompt(message: types.Message, state: FSMContext):
     # Отправляем уведомление о том, что запрос обрабатывается
     processing_message = await message.reply("🧠 Анализирую ваш запрос и историю... Пожалуйста, подождите.")
 
@@ -65,13 +98,14 @@ async def process_user_prompt(message: types.Message, state: FSMContext):
         user_id = message.from_user.id
         user_prompt = message.text
 
-        # Вызываем ваш метод из AnalysisService
-        # ВАЖНО: т.к. pandas и GPT могут работать долго, в реальном приложении
-        # этот вызов стоит обернуть в asyncio.to_thread, чтобы не блокировать бота.
-        result = AnalysisService.analyse_by_prompt(user_id=user_id, user_prompt=user_prompt)
+        # Ответ YandexGPT появляется в сообщении по мере генерации
+        stream = MessageStream(processing_message, interval=settings.llm_stream_edit_interval)
+        result = await AnalysisService.analyse_by_prompt(
+            user_id=user_id, user_prompt=user_prompt, on_partial=stream.update
+        )
 
         # Отправляем результат пользователю
-        await processing_message.edit_text(result.summary)
+        await stream.finish(result.summary)
 
     except Exception as e:
         await processing_message.edit_text(f"Произошла ошибка при анализе вашего запроса: {e}")
@@ -86,11 +120,11 @@ async def incorrect_prompt_input(message: types.Message):
 @router.message(Command("scan"))
 async def cmd_scan_start(message: types.Message, state: FSMContext):
     await state.clear() # На случай, если пользователь был в другом состоянии
-    await message.answer("Пожалуйста, отправьте фото вашего анализа.\nДля отмены введите /cancel.")
+    await message.answer("Пожалуйста, отправьте фото или PDF вашего анализа.\nДля отмены введите /cancel.")
     # Устанавливаем состояние ожидания фото
     await state.set_state(ScanState.waiting_for_photo)
 
-@router.message(StateFilter(ScanState.waiting_for_photo), F.photo)
+@router.message(StateFilter(ScanState.waiting_for_photo), F.photo, flags={"rate_limit": "scan"})
 async def cmd_scan(message: types.Message, bot: Bot, state: FSMContext):
     if not message.photo:
         await message.reply("Пожалуйста, отправьте фото вашего анализа.")
@@ -99,43 +133,82 @@ async def cmd_scan(message: types.Message, bot: Bot, state: FSMContext):
     processing_message = await message.reply("🔬 Анализирую изображение... Это может занять некоторое время.")
 
     try:
-        file_id = message.photo[-1].file_id
-        file_info = await bot.get_file(file_id)
-        downloaded_file = await bot.download_file(file_info.file_path)
+        photo = message.photo[-1]
+        # Тот же файл уже распознавали — не скачиваем и не распознаём повторно
+        recognized_csv_text = AnalysisService.get_cached_scan(photo.file_unique_id)
+
+        if recognized_csv_text is None:
+            with stage("download"):
+                file_info = await bot.get_file(photo.file_id)
+                downloaded_file = await bot.download_file(file_info.file_path)
+
+            if settings.scan_queue_enabled:
+                # Распознавание выполнят процессы-воркеры, результат придёт через deliver_scan_result
+                await enqueue_scan("image", message, processing_message, downloaded_file.read(), photo.file_unique_id)
+                return
 
-        image_stream = io.BytesIO(downloaded_file.read())
-        image = Image.open(image_stream)
+            with stage("decode"):
+                image_stream = io.BytesIO(downloaded_file.read())
+                image = Image.open(image_stream)
+                image.load()
 
-        recognized_csv_text = AnalysisService.run_ocr_on_image(image)
-        print(recognized_csv_text)
+            recognized_csv_text = await AnalysisService.run_ocr_on_image(
+                image, photo.file_unique_id, user_id=message.from_user.id
+            )
 
         if not recognized_csv_text:
             await processing_message.edit_text("Не удалось распознать данные на изображении. Попробуйте фото лучшего качества.")
             return
 
-        user_id = message.from_user.id
+        await save_recognized_scan(message, processing_message, recognized_csv_text)
 
-        # Parse the recognized CSV safely
-        reader = csv.reader(io.StringIO(recognized_csv_text))
-        rows = list(reader)
+    except OcrQueueFullError:
+        await processing_message.edit_text(
+            "⏳ Сейчас распознаётся слишком много изображений. Попробуйте отправить фото через минуту."
+        )
+    except Exception as e:
+        await processing_message.edit_text(
+            f"Произошла ошибка при обработке файла: <code>{e}</code>", parse_mode="HTML"
+        )
+    finally:
+        await state.clear()
 
-        if not rows:
-            await processing_message.edit_text("Ошибка: CSV пуст.")
-            return
+@router.message(StateFilter(ScanState.waiting_for_photo), F.document, flags={"rate_limit": "scan"})
+async def cmd_scan_document(message: types.Message, bot: Bot, state: FSMContext):
+    document = message.document
+    is_pdf = document.mime_type == "application/pdf" or (document.file_name or "").lower().endswith(".pdf")
+    if not is_pdf:
+        await message.reply("Поддерживаются только фото и PDF-документы.")
+        return
+
+    processing_message = await message.reply("🔬 Анализирую документ... Это может занять некоторое время.")
+
+    try:
+        recognized_csv_text = AnalysisService.get_cached_scan(document.file_unique_id)
+
+        if recognized_csv_text is None:
+            with stage("download"):
+                file_info = await bot.get_file(document.file_id)
+                downloaded_file = await bot.download_file(file_info.file_path)
 
-        data_rows = [[user_id] + row for row in rows if len(row) > 0]
+            if settings.scan_queue_enabled:
+                await enqueue_scan("pdf", message, processing_message, downloaded_file.read(), document.file_unique_id)
+                return
 
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerows(data_rows)
-        updated_csv_text = output.getvalue()
+            recognized_csv_text = await AnalysisService.run_ocr_on_pdf(
+                downloaded_file.read(), document.file_unique_id, user_id=message.from_user.id
+            )
 
-        AnalysisService.save_scan_to_csv(updated_csv_text)
+        if not recognized_csv_text:
+            await processing_message.edit_text("Не удалось распознать данные в документе.")
+            return
 
+        await save_recognized_scan(message, processing_message, recognized_csv_text)
+
+    except OcrQueueFullError:
         await processing_message.edit_text(
-            "✅ Данные успешно распознаны и сохранены в вашу историю."
+            "⏳ Сейчас распознаётся слишком много документов. Попробуйте отправить файл через минуту."
         )
-
     except Exception as e:
         await processing_message.edit_text(
             f"Произошла ошибка при обработке файла: <code>{e}</code>", parse_mode="HTML"
@@ -143,6 +216,57 @@ async def cmd_scan(message: types.Message, bot: Bot, state: FSMContext):
     finally:
         await state.clear()
 
+async def enqueue_scan(kind: str, message: types.Message, processing_message: types.Message,
+                       data: bytes, file_unique_id: str):
+    payload = {
+        "user_id": message.from_user.id,
+        "chat_id": processing_message.chat.id,
+        "message_id": processing_message.message_id,
+        "file_unique_id": file_unique_id,
+    }
+    await asyncio.to_thread(get_job_queue().enqueue, kind, payload, data)
+    await processing_message.edit_text("📥 Скан поставлен в очередь на распознавание. Я напишу, когда всё будет готово.")
+
+
+async def deliver_scan_result(bot: Bot, job: Job):
+    """Колбэк результата задания из очереди: сохраняет строки и обновляет сообщение «Анализирую…»."""
+    payload = job.payload
+    if job.status == FAILED:
+        text = f"Произошла ошибка при обработке файла: <code>{html.escape(job.error or '')}</code>"
+    elif not job.result:
+        text = "Не удалось распознать данные. Попробуйте фото лучшего качества."
+    else:
+        text = await store_recognized_scan(payload["user_id"], job.result)
+    await bot.edit_message_text(text, chat_id=payload["chat_id"], message_id=payload["message_id"], parse_mode="HTML")
+
+
+async def save_recognized_scan(message: types.Message, processing_message: types.Message, recognized_csv_text: str):
+    await processing_message.edit_text(await store_recognized_scan(message.from_user.id, recognized_csv_text))
+
+
+async def store_recognized_scan(user_id: int, recognized_csv_text: str) -> str:
+    """Сохраняет распознанные строки пользователя и возвращает текст ответа."""
+    # Parse the recognized CSV safely
+    reader = csv.reader(io.StringIO(recognized_csv_text))
+    rows = list(reader)
+
+    if not rows:
+        return "Ошибка: CSV пуст."
+
+    data_rows = [[user_id] + row for row in rows if len(row) > 0]
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerows(data_rows)
+    updated_csv_text = output.getvalue()
+
+    saved_rows = await AnalysisService.save_scan_to_csv(updated_csv_text)
+
+    if saved_rows == 0:
+        return "ℹ️ Эти результаты уже есть в вашей истории."
+
+    return "✅ Данные успешно распознаны и сохранены в вашу историю."
+
 @router.message(StateFilter(ScanState.waiting_for_photo), F.text)
 async def process_scan_cancel(message: types.Message, state: FSMContext):
     if message.text.lower() in ['/cancel', 'отмена']:
@@ -150,43 +274,186 @@ async def process_scan_cancel(message: types.Message, state: FSMContext):
         await state.clear()
         await cmd_start(message) # Возвращаем главное меню
     else:
-        await message.reply("Я ожидаю фото. Пожалуйста, отправьте изображение или отмените действие командой /cancel.")
+        await message.reply("Я ожидаю фото или PDF. Пожалуйста, отправьте файл или отмените действие командой /cancel.")
 
 
-@router.message(Command("analyse"))
+@router.message(Command("analyse"), flags={"rate_limit": "llm"})
 async def cmd_analyse(message: types.Message):
     # Уведомляем пользователя, что процесс запущен
     processing_message = await message.reply("🧠 Составляю общую картину по вашей истории... Пожалуйста, подождите.")
     
+    stream = MessageStream(processing_message, interval=settings.llm_stream_edit_interval)
+
+    async def show_partial(text: str):
+        await stream.update(f"**Сводка по анализам:**\n\n{text}")
+
     # Этот вызов теперь работает с распознанным текстом из всех сканов!
-    result = AnalysisService.analyse_history(user_id=message.from_user.id)
+    result = await AnalysisService.analyse_history(user_id=message.from_user.id, on_partial=show_partial)
     
     # Редактируем сообщение с финальным результатом
-    await processing_message.edit_text(f"**Сводка по анализам:**\n\n{result.summary}")
+    await stream.finish(f"**Сводка по анализам:**\n\n{result.summary}")
 
 @router.message(Command("history"))
 async def cmd_history(message: types.Message):
-    # Example: user can send "/history 7" to get last 7 days
-    try:
-        days = int(message.text.split()[1])
-    except (IndexError, ValueError):
-        days = None # all
+    # Example: user can send "/history 7" to get last 7 days, "/history 30 отклонения" — only abnormal ones
+    args = message.text.split()[1:]
+    days = next((int(arg) for arg in args if arg.isdigit()), None)  # None — all
+    abnormal = any(arg.lower() in ABNORMAL_ARGS for arg in args)
+
+    start_date = (datetime.now() - timedelta(days=days)).date() if days is not None else None
+    page = build_results_page(message.from_user.id, start_date, None, abnormal=abnormal)
+    if page is None:
+        if abnormal:
+            await message.reply(f"Нет отклонений за последние {days} дней" if days is not None else "Отклонений в вашей истории нет")
+        else:
+            await message.reply(f"Нет анализов за последние {days} дней" if days is not None else "Вы не отправляли ваши анализы")
+        return
+    text, keyboard = page
+    await message.reply(text, parse_mode="HTML", reply_markup=keyboard)
+
 
-    history = AnalysisService.get_history(message.from_user.id, days)
-    if history.empty:
-        await message.reply(f"Нет анализов за последние {days} дней" if days is not None else "Вы не отправляли ваши анализы") 
+@router.message(Command("chart"), flags={"rate_limit": "chart"})
+async def cmd_chart(message: types.Message):
+    # Example: "/chart глюкоза" — values over time with the reference band
+    parts = message.text.split(maxsplit=1)
+    if len(parts) < 2 or not parts[1].strip():
+        await message.reply("Укажите показатель, например: /chart глюкоза")
         return
-    answer = []
-    for _, row in history.iterrows():
-        analysis_card = (
-            f"📅 *Дата:* `{row.get('date', 'N/A').strftime('%Y-%m-%d')}`\n"
-            f"🔬 *Анализ:* {row.get('analysis', 'N/A')}\n"
-            f"📈 *Результат:* `{row.get('result', 'N/A')}`\n"
-            f"🩺 *Статус:* {row.get('status', 'N/A')}\n" +
-            "─" * 20 + "\n"
+    query = parts[1].strip()
+
+    chart = await AnalysisService.get_chart(message.from_user.id, query)
+    if chart is None:
+        await message.reply(f"В вашей истории нет числовых результатов «{query}».")
+        return
+
+    if chart.file_id is not None:
+        # График уже отправлялся — Telegram перешлёт его по file_id без повторной загрузки
+        try:
+            await message.answer_photo(chart.file_id, caption=chart.title)
+            return
+        except TelegramBadRequest:
+            AnalysisService.remember_chart_file_id(chart, None)
+
+    with stage("chart_upload"):
+        sent = await message.answer_photo(
+            types.BufferedInputFile(chart.png, filename="chart.png"), caption=chart.title
         )
-        answer.append(analysis_card)
-    await message.reply(''.join(answer))
+    AnalysisService.remember_chart_file_id(chart, sent.photo[-1].file_id)
+
+
+def format_reference(row) -> str | None:
+    """Референс из сохранённых границ: «3–11 10^9/л», «< 5.2 ммоль/л»; None, если его нет."""
+    low = None if pd.isna(row.ref_low) else f"{row.ref_low:g}"
+    high = None if pd.isna(row.ref_high) else f"{row.ref_high:g}"
+    if low is not None and high is not None:
+        text = f"{low}–{high}"
+    elif high is not None:
+        text = f"< {high}"
+    elif low is not None:
+        text = f"> {low}"
+    else:
+        return None
+    return f"{text} {row.ref_unit}" if isinstance(row.ref_unit, str) and row.ref_unit else text
+
+
+def format_analysis_card(row) -> str:
+    reference = format_reference(row)
+    return (
+        f"📅 <b>Дата:</b> <code>{html.escape(str(row.date))}</code>\n"
+        f"🔬 <b>Анализ:</b> {html.escape(str(row.analysis))}\n"
+        f"📈 <b>Результат:</b> <code>{html.escape(str(row.result))}</code>\n"
+        + (f"📏 <b>Норма:</b> <code>{html.escape(reference)}</code>\n" if reference else "") +
+        f"🩺 <b>Статус:</b> {html.escape(str(row.status))}\n" +
+        "─" * 20 + "\n"
+    )
+
+
+def build_results_page(user_id: int, start_date: date | None, end_date: date | None,
+                       cursor: HistoryPage | None = None,
+                       abnormal: bool = False) -> tuple[str, types.InlineKeyboardMarkup | None] | None:
+    """
+    Одна страница результатов за период: строки читаются из хранилища по курсору,
+    в сообщение попадают только целые карточки, пока оно не длиннее MESSAGE_LIMIT.
+    abnormal оставляет только результаты с отклонениями (фильтр по сохранённому статусу).
+    None — на странице нет ни одной записи.
+    """
+    backward = cursor is not None and cursor.direction == "prev"
+    position = cursor.row_id if cursor is not None else None
+    rows, has_more = AnalysisService.get_results_page(
+        user_id, start_date, end_date,
+        after=None if backward else position,
+        before=position if backward else None,
+        limit=HISTORY_PAGE_SIZE,
+        statuses=list(ABNORMAL_STATUSES) if abnormal else None,
+    )
+    if rows.empty:
+        return None
+
+    title = "📊 <b>Ваши результаты с отклонениями" if abnormal else "📊 <b>Ваши результаты"
+    if start_date is not None:
+        title += f" с {start_date}"
+    if end_date is not None:
+        title += f" по {end_date}"
+    title += ":</b>\n\n"
+
+    # При листании назад страницу заполняем с конца, чтобы она примыкала к предыдущей
+    records = list(rows.itertuples(index=False))
+    ordered = reversed(records) if backward else records
+    cards = []
+    length = len(title)
+    for row in ordered:
+        card = format_analysis_card(row)
+        if cards and length + len(card) > MESSAGE_LIMIT:
+            has_more = True
+            break
+        cards.append((row, card))
+        length += len(card)
+    if backward:
+        cards.reverse()
+
+    first, last = cards[0][0], cards[-1][0]
+    has_prev = has_more if backward else cursor is not None
+    has_next = cursor is not None if backward else has_more
+
+    period = {
+        "start": start_date.isoformat() if start_date else None,
+        "end": end_date.isoformat() if end_date else None,
+    }
+    filtered = {**period, "abnormal": abnormal}
+    buttons = []
+    if has_prev:
+        buttons.append(types.InlineKeyboardButton(
+            text="◀️ Назад",
+            callback_data=HistoryPage(direction="prev", row_id=first.id, **filtered).pack(),
+        ))
+    if has_next:
+        buttons.append(types.InlineKeyboardButton(
+            text="Вперёд ▶️",
+            callback_data=HistoryPage(direction="next", row_id=last.id, **filtered).pack(),
+        ))
+    # Переключатель фильтра открывает первую страницу того же периода
+    toggle = types.InlineKeyboardButton(
+        text="📋 Все результаты" if abnormal else "⚠️ Только отклонения",
+        callback_data=HistoryPage(direction="first", row_id=0, abnormal=not abnormal, **period).pack(),
+    )
+    keyboard = types.InlineKeyboardMarkup(inline_keyboard=[buttons, [toggle]] if buttons else [[toggle]])
+    return title + ''.join(card for _, card in cards), keyboard
+
+
+@router.callback_query(HistoryPage.filter())
+async def paginate_history(callback: types.CallbackQuery, callback_data: HistoryPage):
+    start_date = date.fromisoformat(callback_data.start) if callback_data.start else None
+    end_date = date.fromisoformat(callback_data.end) if callback_data.end else None
+    cursor = None if callback_data.direction == "first" else callback_data
+    page = build_results_page(callback.from_user.id, start_date, end_date, cursor=cursor,
+                              abnormal=callback_data.abnormal)
+    if page is None:
+        await callback.answer("Отклонений за этот период нет." if callback_data.direction == "first"
+                              and callback_data.abnormal else "Больше записей нет.")
+        return
+    text, keyboard = page
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+    await callback.answer()
 
 # Обработчик кнопки "посмотреть результаты анализов за период"
 @router.message(F.text == "посмотреть результаты анализов за период")
@@ -323,71 +590,34 @@ async def process_back(message: types.Message, state: FSMContext):
 # Функция для отображения результатов анализов
 async def show_analysis_results(message: types.Message, start_date, end_date):
     """
-    Читает историю анализов для конкретного пользователя из CSV,
-    фильтрует по дате и красиво выводит результат.
+    Читает историю анализов конкретного пользователя из хранилища
+    за выбранный период и красиво выводит результат.
     """
-    user_id_to_find = str(message.from_user.id) # CSV хранит все как строки
-    output_filename = '/home/lopatin/Neymark_LabTracker/analysis_results.csv'
+    user_id = message.from_user.id
 
     try:
-        with open(output_filename, 'r', encoding='utf-8') as file:
-            # Используем DictReader для удобного доступа к колонкам по имени
-            reader = csv.DictReader(file)
-            user_analyses = [
-                row for row in reader 
-                if row.get('user_id') == user_id_to_find
-            ]
-            
-            if not user_analyses:
-                await message.answer("В вашей истории пока нет записей.")
-                await cmd_start(message)
-                return
+        date_range = AnalysisService.get_date_range(user_id)
+        if date_range is None:
+            await message.answer("В вашей истории пока нет записей.")
+            await cmd_start(message)
+            return
+
+        # Определяем границы периода для вывода
+        min_date, max_date = date_range
+        actual_start = start_date if start_date else min_date
+        actual_end = end_date if end_date else max_date
+
+        # Первая страница читается из хранилища по индексу (user_id, date), остальные — по кнопкам
+        page = build_results_page(user_id, start_date, end_date)
+
+        if page is not None:
+            text, keyboard = page
+            await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+        else:
+            await message.answer(f"Не найдено результатов за период с {actual_start} по {actual_end}.")
 
-            # Определяем границы периода для фильтрации
-            min_date = min(datetime.strptime(row['date'], '%Y-%m-%d').date() for row in user_analyses if row.get('date'))
-            max_date = max(datetime.strptime(row['date'], '%Y-%m-%d').date() for row in user_analyses if row.get('date'))
-            
-            actual_start = start_date if start_date else min_date
-            actual_end = end_date if end_date else max_date
-            
-            # Фильтруем анализы по дате
-            filtered_analyses = []
-            for row in user_analyses:
-                try:
-                    analysis_date = datetime.strptime(row['date'], '%Y-%m-%d').date()
-                    if actual_start <= analysis_date <= actual_end:
-                        filtered_analyses.append(row)
-                except (ValueError, TypeError):
-                    # Пропускаем строки с некорректной датой
-                    continue
-            
-            # Формируем красивое сообщение
-            if filtered_analyses:
-                # Сортируем по дате для красивого вывода
-                filtered_analyses.sort(key=lambda x: x['date'])
-
-                result_message = f"📊 *Ваши результаты за период с {actual_start} по {actual_end}:*\n\n"
-                for analysis in filtered_analyses:
-                    # Используем Markdown для форматирования
-                    result_message += f"📅 *Дата:* `{analysis.get('date', 'N/A')}`\n"
-                    result_message += f"🔬 *Анализ:* {analysis.get('analysis', 'N/A')}\n"
-                    result_message += f"📈 *Результат:* `{analysis.get('result', 'N/A')}`\n"
-                    result_message += f"🩺 *Статус:* {analysis.get('status', 'N/A')}\n"
-                    result_message += "─" * 20 + "\n"
-                
-                # Отправка длинных сообщений частями
-                if len(result_message) > 4096:
-                    for i in range(0, len(result_message), 4096):
-                        await message.answer(result_message[i:i+4096], parse_mode="Markdown")
-                else:
-                    await message.answer(result_message, parse_mode="Markdown")
-            else:
-                await message.answer(f"Не найдено результатов за период с {actual_start} по {actual_end}.")
-    
-    except FileNotFoundError:
-        await message.answer("Файл с историей анализов еще не создан. Загрузите свой первый скан.")
     except Exception as e:
         await message.answer(f"Произошла ошибка при чтении истории: {str(e)}")
-    
+
     # Возвращаем пользователя в главное меню
-    await cmd_start(message)
\ No newline at end of file
+    await cmd_start(message)
@@ -0,0 +1,26 @@
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from ..config import settings
+from ..utils.metrics import request_trace
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware роутера: меряет время каждого хендлера целиком,
+    считает исключения и собирает разбивку по этапам для лога запросов.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", type(event).__name__)
+        user = data.get("event_from_user")
+        with request_trace(name, user.id if user else None, log=settings.log_request_timings):
+            return await handler(event, data)
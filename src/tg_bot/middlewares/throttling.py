@@ -0,0 +1,100 @@
+import math
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message, TelegramObject
+
+from ..utils.metrics import registry
+
+THROTTLED = registry.counter(
+    "labtracker_throttled_total", "Запросы, отклонённые лимитом частоты", ("command_class",)
+)
+
+
+class TokenBucket:
+    """Ведро токенов: capacity запросов подряд, затем rate запросов в секунду."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """Списывает токен; если токенов нет — возвращает, через сколько секунд он появится."""
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Лимит частоты тяжёлых команд на пользователя.
+
+    Хендлер помечается флагом rate_limit с классом команды
+    (@router.message(..., flags={"rate_limit": "scan"})); у каждого
+    пользователя своё ведро токенов на класс. Сверх лимита хендлер не
+    вызывается, а пользователь получает ответ, через сколько секунд повторить.
+    """
+
+    def __init__(self, limits: dict[str, tuple[float, float]], max_buckets: int = 10000):
+        # класс команды → (burst, запросов в минуту)
+        self.limits = limits
+        self.max_buckets = max_buckets
+        self._buckets: dict[tuple[int, str], TokenBucket] = {}
+        # До какого момента пользователь уже предупреждён — не отвечаем на каждый лишний запрос
+        self._warned_until: dict[tuple[int, str], float] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        command_class = get_flag(data, "rate_limit")
+        user = data.get("event_from_user")
+        if command_class not in self.limits or user is None:
+            return await handler(event, data)
+
+        key = (user.id, command_class)
+        retry_after = self._bucket(key).take()
+        if not retry_after:
+            return await handler(event, data)
+
+        THROTTLED.inc(command_class=command_class)
+        now = time.monotonic()
+        if isinstance(event, Message) and self._warned_until.get(key, 0) <= now:
+            self._warned_until[key] = now + retry_after
+            await event.reply(
+                f"⏳ Слишком много запросов подряд. Повторите через {math.ceil(retry_after)} с."
+            )
+        return None
+
+    def _bucket(self, key: tuple[int, str]) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_buckets:
+                self._prune()
+            burst, per_minute = self.limits[key[1]]
+            bucket = self._buckets[key] = TokenBucket(burst, per_minute / 60)
+        return bucket
+
+    def _prune(self):
+        # Полное ведро ничем не отличается от нового — такие можно забыть
+        for key in [key for key, bucket in self._buckets.items() if bucket.is_full()]:
+            del self._buckets[key]
+            self._warned_until.pop(key, None)
+
@@ -0,0 +1,328 @@
+"""
+Пакетная переобработка сканов: дозагрузка архива и перепарсинг сохранённых результатов.
+
+    uv run -m src.tg_bot.reprocess files --user-id 123 scans/ [more.pdf ...]
+    uv run -m src.tg_bot.reprocess archive [--user-id 123] [--scan-id ID ...]
+    uv run -m src.tg_bot.reprocess statuses [--user-id 123]
+
+files — изображения (png/jpg) и PDF из файлов и каталогов: OCR Surya и разбор,
+OCR сохраняется в архив, после прохода архив сжимается (compact): строки
+прежних версий заново распознанных сканов удаляются. archive — сканы из ocr_archive: только разбор заново,
+без моделей OCR (например, после правки промпта в utils/ocr_to_csv.py или
+правил статусов); сюда же подходят выходы OCR в формате ocr_results.json.
+statuses — только пересчёт статусов по сохранённым значениям и референсам
+(utils/status_engine), без разбора сканов.
+
+Сканы обрабатываются пулом процессов (--processes, по умолчанию — все ядра),
+строки записываются идемпотентным upsert по (user_id, date, analysis).
+Готовые сканы отмечаются в файле --checkpoint, и повторный запуск продолжает
+с места остановки; новый проход по тем же сканам — с --restart.
+--dry-run только разбирает сканы, ничего не записывая.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+PDF_EXTENSIONS = ('.pdf',)
+
+
+@dataclass
+class Item:
+    # Стабильный ключ скана: id в архиве или sha1 содержимого файла
+    scan_id: str
+    kind: str  # image | pdf | json | archive
+    path: str | None
+    user_id: int | None
+
+
+@dataclass
+class Outcome:
+    scan_id: str
+    user_id: int | None
+    csv_text: str | None = None
+    error: str | None = None
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def collect_files(inputs: list[str], user_id: int) -> list[Item]:
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                paths.extend(os.path.join(root, name) for name in sorted(names))
+        else:
+            paths.append(path)
+
+    items = []
+    for path in sorted(paths):
+        extension = os.path.splitext(path)[1].lower()
+        if extension in IMAGE_EXTENSIONS:
+            kind = 'image'
+        elif extension in PDF_EXTENSIONS:
+            kind = 'pdf'
+        elif extension == '.json':
+            kind = 'json'
+        else:
+            continue
+        items.append(Item(scan_id=file_digest(path), kind=kind, path=path, user_id=user_id))
+    return items
+
+
+def collect_archive(scan_ids: list[str] | None, user_id: int | None) -> list[Item]:
+    from .services.ocr_archive import get_ocr_archive
+
+    reader = get_ocr_archive().reader()
+    items = []
+    for scan_id in scan_ids or reader.scan_ids():
+        row = reader.get(scan_id)
+        if row is None:
+            logger.warning("Скана %s нет в архиве", scan_id)
+            continue
+        items.append(Item(scan_id=scan_id, kind='archive', path=None,
+                          user_id=user_id if user_id is not None else row.user_id))
+    return items
+
+
+# Состояние процесса пула: свой event loop (клиенты SDK к нему привязаны) и снимок архива
+_loop: asyncio.AbstractEventLoop | None = None
+_archive_reader = None
+
+
+def _init_process(needs_ocr: bool, needs_archive: bool):
+    global _loop, _archive_reader
+    logging.basicConfig(level=settings.log_level)
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+    if needs_ocr:
+        from .services.ocr_worker import ocr_worker
+
+        _loop.run_until_complete(ocr_worker.start())
+    if needs_archive:
+        from .services.ocr_archive import get_ocr_archive
+
+        _archive_reader = get_ocr_archive().reader()
+
+
+def _process(item: Item) -> Outcome:
+    try:
+        return _loop.run_until_complete(_process_async(item))
+    except Exception as e:
+        return Outcome(item.scan_id, item.user_id, error=f"{type(e).__name__}: {e}")
+
+
+async def _process_async(item: Item) -> Outcome:
+    from PIL import Image
+
+    from .services.analysis_service import AnalysisService
+    from .utils.ocr_to_csv import ocr_results_to_csv
+    from .utils.pdf_reader import TextLine
+
+    if item.kind == 'archive':
+        pages = _archive_reader.get(item.scan_id).pages
+    elif item.kind == 'json':
+        with open(item.path, encoding='utf-8') as file:
+            recorded = json.load(file)
+        pages = [
+            SimpleNamespace(text_lines=[
+                TextLine(text=line['text'], bbox=line['bbox'], confidence=line.get('confidence'))
+                for line in page['text_lines']
+            ])
+            for page in recorded
+        ]
+    else:
+        if item.kind == 'image':
+            image = Image.open(item.path)
+            image.load()
+            pages = [await AnalysisService.recognize_image(image, item.user_id)]
+        else:
+            with open(item.path, 'rb') as file:
+                pages = await AnalysisService.recognize_pdf(file.read(), item.user_id)
+        # Архивируем OCR, чтобы следующий перепарсинг обходился без моделей
+        await AnalysisService.archive_ocr(item.scan_id, pages, item.user_id, None)
+
+    return Outcome(item.scan_id, item.user_id, csv_text=await ocr_results_to_csv(pages))
+
+
+class Checkpoint:
+    """Файл с id готовых сканов, по строке на скан; дописывается после записи в базу."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: set[str] = set()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                self.done = {line.strip() for line in file if line.strip()}
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def mark(self, scan_id: str):
+        self._file.write(f"{scan_id}\n")
+        self._file.flush()
+        self.done.add(scan_id)
+
+    def close(self):
+        self._file.close()
+
+
+def csv_rows(outcome: Outcome) -> list[list]:
+    reader = csv.reader(io.StringIO(outcome.csv_text or ''))
+    return [[outcome.user_id, *row] for row in reader if row]
+
+
+class Progress:
+    def __init__(self, total: int, stream=sys.stderr):
+        self.total = total
+        self.stream = stream
+        self.started = time.monotonic()
+        self.done = self.failed = self.parsed = self.inserted = self.updated = 0
+
+    def report(self, final: bool = False):
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        eta = (self.total - self.done) / rate if rate else 0.0
+        self.stream.write(
+            f"\r[{self.done}/{self.total}] ошибок {self.failed}, строк разобрано {self.parsed}, "
+            f"добавлено {self.inserted}, обновлено {self.updated}, "
+            f"{rate:.1f} скан/с, осталось ~{eta:.0f} с"
+        )
+        if final:
+            self.stream.write("\n")
+        self.stream.flush()
+
+
+def run(items: list[Item], processes: int, checkpoint: Checkpoint, dry_run: bool) -> Progress:
+    from .services.chart_cache import get_chart_cache
+    from .services.storage import get_storage
+    from .services.summary_cache import get_summary_cache
+
+    pending = [item for item in items if item.scan_id not in checkpoint.done]
+    progress = Progress(len(pending))
+    if not pending:
+        progress.report(final=True)
+        return progress
+
+    needs_ocr = any(item.kind in ('image', 'pdf') for item in pending)
+    needs_archive = any(item.kind == 'archive' for item in pending)
+    changed_users = set()
+    # Пользователи с обновлёнными (не только добавленными) строками: версия их истории не изменилась
+    updated_users = set()
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_process,
+        initargs=(needs_ocr, needs_archive),
+    ) as pool:
+        futures = [pool.submit(_process, item) for item in pending]
+        for future in as_completed(futures):
+            outcome = future.result()
+            progress.done += 1
+            if outcome.error is not None:
+                # Неудачный скан не отмечаем — следующий запуск попробует снова
+                progress.failed += 1
+                logger.warning("Скан %s: %s", outcome.scan_id, outcome.error)
+            else:
+                rows = csv_rows(outcome)
+                progress.parsed += len(rows)
+                if rows and not dry_run:
+                    inserted, updated = get_storage().upsert_rows(rows)
+                    progress.inserted += inserted
+                    progress.updated += updated
+                    if inserted or updated:
+                        changed_users.add(outcome.user_id)
+                    if updated:
+                        updated_users.add(outcome.user_id)
+                if not dry_run:
+                    checkpoint.mark(outcome.scan_id)
+            progress.report()
+
+    # Строки изменились — сводки и графики по прежней истории больше не актуальны
+    for user_id in changed_users:
+        get_summary_cache().invalidate(user_id, rows_updated=user_id in updated_users)
+        get_chart_cache().invalidate(user_id)
+    progress.report(final=True)
+    return progress
+
+
+def recompute_statuses(user_id: int | None) -> int:
+    from .services.chart_cache import get_chart_cache
+    from .services.storage import get_storage
+    from .services.summary_cache import get_summary_cache
+
+    changed_users = get_storage().recompute_statuses(user_id)
+    for changed_user in changed_users:
+        get_summary_cache().invalidate(changed_user, rows_updated=True)
+        get_chart_cache().invalidate(changed_user)
+    sys.stderr.write(f"Статусы изменились у пользователей: {len(changed_users)}\n")
+    return len(changed_users)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', choices=('files', 'archive', 'statuses'))
+    parser.add_argument('inputs', nargs='*', help='файлы и каталоги для files')
+    parser.add_argument('--user-id', type=int, help='владелец строк (для archive — вместо сохранённого)')
+    parser.add_argument('--scan-id', action='append', help='только эти сканы архива')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help='процессов пула; для files каждый держит свои модели Surya')
+    parser.add_argument('--checkpoint', help='по умолчанию reprocess-<source>.checkpoint')
+    parser.add_argument('--restart', action='store_true', help='новый проход: забыть checkpoint')
+    parser.add_argument('--dry-run', action='store_true', help='только разобрать, ничего не записывая')
+    # Опции могут стоять и между позиционными аргументами: files --user-id 1 scans/
+    args = parser.parse_intermixed_args()
+
+    logging.basicConfig(level=settings.log_level)
+    if args.source == 'statuses':
+        recompute_statuses(args.user_id)
+        return
+    if args.source == 'files':
+        if args.user_id is None or not args.inputs:
+            parser.error('для files нужны --user-id и хотя бы один файл или каталог')
+        items = collect_files(args.inputs, args.user_id)
+    else:
+        items = collect_archive(args.scan_id, args.user_id)
+        missing = [item.scan_id for item in items if item.user_id is None]
+        if missing:
+            parser.error(f'у {len(missing)} сканов архива нет user_id — укажите --user-id')
+
+    checkpoint_path = args.checkpoint or f'reprocess-{args.source}.checkpoint'
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = Checkpoint(checkpoint_path)
+    try:
+        progress = run(items, max(1, args.processes), checkpoint, args.dry_run)
+    finally:
+        checkpoint.close()
+    if args.source == 'files' and settings.ocr_archive_enabled:
+        from .services.ocr_archive import get_ocr_archive
+
+        freed = get_ocr_archive().compact()
+        if freed:
+            sys.stderr.write(f"Архив OCR сжат: освобождено строк {freed}\n")
+    if progress.failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,38 +1,47 @@
-import json
+import asyncio
+import logging
 import csv
 import io
-import os
 
 from datetime import datetime, timedelta
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from typing import Awaitable, Callable, List
 
 import pandas as pd
 
-from typing import List
-from PIL import Image
-from yandex_cloud_ml_sdk import YCloudML
-
-from surya.foundation import FoundationPredictor
-from surya.recognition import RecognitionPredictor
-from surya.detection import DetectionPredictor
+from PIL import ImageOps
 
 from src.tg_bot.utils.ocr_to_csv import ocr_results_to_csv
 
-os.environ["RECOGNITION_BATCH_SIZE"]="256"
-os.environ["FOUNDATION_MODEL_QUANTIZE"]="False"
-
-from ..models.analysis_models import AnalysisScan, AnalysisResult, AnalysisHistory, AnalysesQuery
-from ..utils.ycloud_client import get_ycloud_sdk
+from ..models.analysis_models import AnalysisScan, AnalysisResult
+from ..utils.llm_client import llm_client
+from ..utils.image_preprocessing import enhance_crop, preprocess_image, PreprocessedImage
+from ..utils.pdf_reader import iter_pdf_pages
+from ..utils.prompt_context import build_history_context, encode_history
+from ..utils.analyte_index import analyte_code, analyte_index, normalize
+from ..utils.charts import TrendSeries
+from ..utils.table_extractor import table_line_indices
+from ..utils.metrics import record_cache, stage
+from ..config import settings
+from .ocr_worker import ocr_worker
+from .storage import get_storage
+from .result_writer import result_writer
+from .scan_cache import get_scan_cache
+from .ocr_archive import get_ocr_archive
+from .summary_cache import get_summary_cache
+from .analytics import answer_locally
+from .fair_scheduler import llm_scheduler, ocr_scheduler
+from .chart_cache import CachedChart, get_chart_cache
+from .chart_renderer import chart_renderer
+
+GPT_ERROR_PREFIX = "⚠️ Error during GPT call"
+
+# Получает накопленный текст ответа по мере генерации
+PartialCallback = Callable[[str], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
 
 # Dummy in-memory storage
 scans_db: List[AnalysisScan] = []
-results_db: List[AnalysisResult] = []
-
-sdk = YCloudML(
-    folder_id="b1g08sdauols3um0k8qc",
-    auth="y0__xCU55f0AhjB3RMg0Lrc2BTCzRuzRQUc4ah05BqajttLTaVqQQ",
-)
 
 def parse_surya_prediciton(prediction_list: list) -> list:
     '''
@@ -55,15 +64,44 @@ def parse_surya_prediciton(prediction_list: list) -> list:
 
 
 
-class AnalysisService:
-    foundation_predictor = FoundationPredictor()
-    recognition_predictor = RecognitionPredictor(foundation_predictor)
-    detection_predictor = DetectionPredictor()
+def _restore_coordinates(ocr_result, prepared: PreprocessedImage):
+    """Возвращает bbox строк Surya в координаты исходного фото."""
+    for line in ocr_result.text_lines:
+        if getattr(line, "polygon", None) is not None:
+            # bbox у Surya вычисляется из polygon
+            line.polygon = prepared.to_original(line.polygon)
+        else:
+            line.bbox = prepared.bbox_to_original(line.bbox)
 
+
+def _text_lines_to_dicts(pages: list) -> list[dict]:
+    return [
+        {
+            "page": number,
+            "text": line.text,
+            "bbox": list(line.bbox),
+            "confidence": getattr(line, "confidence", None),
+        }
+        for number, page in enumerate(pages)
+        for line in page.text_lines
+    ]
+
+
+class AnalysisService:
     @staticmethod
-    def analyse_by_prompt(user_id: int, user_prompt: str) -> AnalysisResult:
-        df = pd.read_csv('analysis_results.csv', names=['user_id', 'date', 'analysis', 'result', 'status'])
-        user_df = df[df["user_id"] == user_id]
+    async def analyse_by_prompt(user_id: int, user_prompt: str, on_partial: PartialCallback | None = None) -> AnalysisResult:
+        version = get_storage().get_user_version(user_id)
+        cached = get_summary_cache().get(user_id, "ask", prompt=user_prompt)
+        hit = cached is not None and cached.version == version
+        record_cache("summary_ask", hit)
+        if hit:
+            return cached.result
+
+        with stage("history_load"):
+            user_df = get_storage().get_user_rows(user_id)
+            # История изменилась между чтением версии и строк — сводку не к чему привязать, не кэшируем
+            if get_storage().get_user_version(user_id) != version:
+                version = None
 
         if user_df.empty:
             # Если нет текста для анализа, создаем специальный результат
@@ -74,18 +112,29 @@ class AnalysisService:
             )
             # Не добавляем его в основную базу, так как это не реальный анализ
             return result
+
+        # Типовые вопросы (последние значения, тренд, выходы из нормы, даты) считаем локально
+        with stage("local_answer"):
+            local_answer = answer_locally(user_df, user_prompt)
+        if local_answer is not None:
+            return AnalysisResult(user_id=user_id, summary=local_answer, generated_at=datetime.utcnow())
         
-        previous_texts = user_df.to_string()
+        previous_texts = build_history_context(
+            user_df,
+            question=user_prompt,
+            token_budget=settings.llm_history_token_budget,
+            latest_points=settings.llm_history_latest_points,
+        )
 
         prompt = (
             '''Ты — ассистент по истории меданализов (RU). Дано:
-                1) CSV (UTF-8), строки формата: date,analysis,result,status (status ∈ {ok, attention, abnormal, invalid})
+                1) История анализов, по строке на показатель: «analysis: date=result; date=result (status)» (status ∈ {ok, attention, abnormal, invalid}; если статус не указан — ok)
                 2) Текстовый запрос пользователя.
 
-                Требуется: понять запрос и дать краткую оценку состояния, опираясь ТОЛЬКО на CSV (внешние источники и домыслы запрещены). Диагнозы и рекомендации препаратов/витаминов — ЗАПРЕЩЕНЫ; при необходимости советуй обратиться к врачу.
+                Требуется: понять запрос и дать краткую оценку состояния, опираясь ТОЛЬКО на историю (внешние источники и домыслы запрещены). Диагнозы и рекомендации препаратов/витаминов — ЗАПРЕЩЕНЫ; при необходимости советуй обратиться к врачу.
 
                 Правила:
-                - Нормализуй сопоставление показателей (регистр+простые синонимы: «ЛПВП»~«HDL», «глюкоза»~«glucose»), в ответе сохраняй оригинальные названия из CSV.
+                - Нормализуй сопоставление показателей (регистр+простые синонимы: «ЛПВП»~«HDL», «глюкоза»~«glucose»), в ответе сохраняй оригинальные названия из истории.
                 - Если есть дата/период в запросе — фильтруй по date (YYYY-MM-DD); иначе бери последние значения по каждому показателю.
                 - Поддерживаемые намерения: последние значения; тренд (покажи 3–6 последних точек, опиши «рост/падение/стабильно» с допуском ~2–3%); что выходило из нормы; даты сдачи; сводка за дату/период; сравнение показателей.
                 - Интерпретация status: ok — «в норме»; attention — «в норме, но есть пометки/наблюдение»; abnormal — «есть отклонения»; invalid — «результат недостоверен/сомнителен».
@@ -94,29 +143,27 @@ class AnalysisService:
                 - Никогда не используй блоки кода/ограждения '''+ "( / ''' /" + '""") в ответе.' +
 
                 f"""Вход:
-                CSV: {previous_texts}
+                История: {previous_texts}
                 Запрос: {user_prompt}"""
         )
 
-        response = AnalysisService._summarize_with_yandexgpt(prompt)
-
-        result = AnalysisResult(
-            user_id=user_id,
-            summary=response,
-            generated_at=datetime.utcnow(),
+        return await AnalysisService._summarize_and_cache(
+            user_id, prompt, "ask", version, user_prompt=user_prompt, on_partial=on_partial
         )
-        
-        return result
 
     @staticmethod
-    def save_scan_to_csv(raw_csv_text: str):
+    async def save_scan_to_csv(raw_csv_text: str) -> int:
         """
-        Парсит строку с CSV-данными и добавляет их в файл analysis_results.csv.
-        Корректно обрабатывает заголовок.
+        Парсит строку с CSV-данными (user_id,date,analysis,result,status[,reference])
+        и добавляет их в хранилище результатов. При записи даты приводятся
+        к ISO, результат раскладывается на value/unit/qualifier, референс —
+        на ref_low/ref_high/ref_unit, а статус пересчитывается по ним. Запись
+        идёт через result_writer: скан попадает в групповую транзакцию вместе
+        с соседними. Уже сохранённые строки пропускаются; возвращает число
+        добавленных строк.
         """
-        output_filename = 'analysis_results.csv'
-        print("Saving\n", raw_csv_text)
-        
+        logger.debug("Saving scan rows:\n%s", raw_csv_text)
+
         lines = raw_csv_text.strip().split('\n')
 
         csv_content = "\n".join(lines)
@@ -125,37 +172,223 @@ class AnalysisService:
         reader = csv.reader(string_io)
         data_rows = list(reader)
 
-        file_exists = os.path.exists(output_filename)
-
-        with open(output_filename, 'a', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            
-            # Затем дописываем новые строки с данными
-            writer.writerows(data_rows)
+        with stage("persist"):
+            saved_rows = await result_writer.submit(data_rows)
+        if saved_rows:
+            # История изменилась — кэшированные ответы по ней больше не актуальны
+            for user_id in {row[0] for row in data_rows if row}:
+                get_summary_cache().invalidate(int(user_id))
+        return saved_rows
     
     @staticmethod
-    def run_ocr_on_image(image):
-        ocr_result = AnalysisService.recognition_predictor([image], det_predictor=AnalysisService.detection_predictor)
-        text = ocr_results_to_csv(ocr_result)
+    def get_cached_scan(file_unique_id: str, image=None) -> str | None:
+        """CSV ранее распознанного скана: по file_unique_id, а при наличии изображения — и по его хэшу."""
+        cached = get_scan_cache().get(file_unique_id, image)
+        return cached.csv_text if cached else None
+
+    @staticmethod
+    async def run_ocr_on_image(image, file_unique_id: str | None = None, user_id: int | None = None):
+        """
+        Распознаёт фото. Подготовка и OCR идут через ocr_scheduler: при нагрузке
+        слоты делятся между пользователями по кругу (работы без user_id — общая очередь).
+        """
+        if file_unique_id is not None:
+            cached = get_scan_cache().get(file_unique_id, image)
+            if cached is not None:
+                return cached.csv_text
+
+        ocr_result = await AnalysisService.recognize_image(image, user_id)
+        with stage("parse"):
+            text = await ocr_results_to_csv([ocr_result])
+
+        if file_unique_id is not None and text:
+            with stage("scan_cache_store"):
+                get_scan_cache().put(file_unique_id, image, _text_lines_to_dicts([ocr_result]), text)
+        await AnalysisService.archive_ocr(file_unique_id, [ocr_result], user_id, text)
+        return text
+
+    @staticmethod
+    async def recognize_image(image, user_id: int | None = None):
+        """Предсказание Surya для фото (без кэша и разбора): подготовка, OCR, второй проход."""
+        # Распознавание идёт в общем батчинг-воркере, хендлер только ждёт свой результат
+        async with ocr_scheduler.slot(user_id):
+            if settings.ocr_preprocess:
+                with stage("preprocess"):
+                    prepared = await asyncio.to_thread(
+                        preprocess_image,
+                        image,
+                        max_side=settings.ocr_max_side,
+                        target_dpi=settings.ocr_target_dpi,
+                        crop_page=settings.ocr_crop_page,
+                        deskew=settings.ocr_deskew,
+                    )
+                # Этап ocr включает ожидание в очереди воркера и сам батч
+                with stage("ocr"):
+                    ocr_result = await ocr_worker.recognize(prepared.image)
+                _restore_coordinates(ocr_result, prepared)
+            else:
+                with stage("ocr"):
+                    ocr_result = await ocr_worker.recognize(image)
+            # После _restore_coordinates bbox заданы на фото после EXIF-поворота, без подготовки — на исходном
+            await AnalysisService._refine_low_confidence(image, ocr_result, transpose=settings.ocr_preprocess)
+        return ocr_result
+
+    @staticmethod
+    async def run_ocr_on_pdf(data: bytes, file_unique_id: str | None = None, user_id: int | None = None):
+        """
+        Распознаёт многостраничный PDF. Страницы растеризуются по одной и уходят
+        в OCR-воркер, одновременно в обработке не больше ocr_max_batch_size
+        страниц. Страницы с текстовым слоем берутся как есть, без OCR.
+        Каждая страница занимает слот ocr_scheduler, так что длинный PDF
+        не задерживает фото других пользователей.
+        """
+        if file_unique_id is not None:
+            cached = get_scan_cache().get(file_unique_id)
+            if cached is not None:
+                return cached.csv_text
+
+        results = await AnalysisService.recognize_pdf(data, user_id)
+        with stage("parse"):
+            text = await ocr_results_to_csv(results)
+
+        if file_unique_id is not None and text:
+            with stage("scan_cache_store"):
+                get_scan_cache().put(file_unique_id, None, _text_lines_to_dicts(results), text)
+        await AnalysisService.archive_ocr(file_unique_id, results, user_id, text)
         return text
 
     @staticmethod
-    def _summarize_with_yandexgpt(prompt: str) -> str:
-        """Run YandexGPT model for summarization."""
-        sdk = get_ycloud_sdk()
-        model = sdk.models.completions("yandexgpt")
+    async def recognize_pdf(data: bytes, user_id: int | None = None) -> list:
+        """Страницы PDF в виде предсказаний Surya (текстовый слой — как есть), без кэша и разбора."""
+        pages = iter_pdf_pages(data, dpi=settings.pdf_dpi, max_pages=settings.pdf_max_pages)
+        slots = asyncio.Semaphore(settings.ocr_max_batch_size)
+        results: list = []
+        tasks = []
+
+        async def recognize(index: int, image):
+            try:
+                async with ocr_scheduler.slot(user_id):
+                    with stage("ocr"):
+                        results[index] = await ocr_worker.recognize(image)
+                    await AnalysisService._refine_low_confidence(image, results[index])
+            finally:
+                slots.release()
 
         try:
-            result = model.run(prompt)
-            return result.alternatives[0].text.strip()
+            while True:
+                await slots.acquire()
+                # Растеризация — CPU-работа PyMuPDF, выполняем её вне event loop
+                with stage("pdf_render"):
+                    page = await asyncio.to_thread(next, pages, None)
+                if page is None:
+                    slots.release()
+                    break
+                results.append(page)
+                if page.image is None:
+                    slots.release()
+                else:
+                    tasks.append(asyncio.create_task(recognize(len(results) - 1, page.image)))
+                    page.image = None
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            pages.close()
+        return results
+
+    @staticmethod
+    async def archive_ocr(scan_id: str | None, pages: list, user_id: int | None, csv_text: str | None):
+        """Сохраняет выход OCR в архив (даже если CSV не получился — его можно перепарсить позже)."""
+        if scan_id is None or not settings.ocr_archive_enabled:
+            return
+        try:
+            with stage("ocr_archive_store"):
+                await asyncio.to_thread(get_ocr_archive().put, scan_id, pages, user_id, csv_text)
+        except Exception:
+            # Архив вспомогательный: его сбой не должен ломать распознавание
+            logger.exception("Не удалось сохранить OCR скана %s в архив", scan_id)
+
+    @staticmethod
+    async def _refine_low_confidence(image, ocr_result, transpose: bool = False):
+        """
+        Второй проход OCR: строки таблицы анализов с уверенностью ниже
+        ocr_min_confidence вырезаются из исходного изображения, увеличиваются
+        с автоконтрастом и распознаются заново одним небольшим батчем.
+        Новый текст берётся, только если Surya в нём увереннее.
+        transpose — bbox заданы в координатах фото после EXIF-поворота
+        (как после preprocess_image), вырезки берутся из повёрнутого фото.
+        """
+        lines = ocr_result.text_lines
+        low = [
+            i for i in table_line_indices(lines)
+            if (getattr(lines[i], "confidence", None) or 0) < settings.ocr_min_confidence
+        ]
+        if not low or not settings.ocr_refine_max_lines:
+            return
+        # Сначала самые сомнительные строки
+        low = sorted(low, key=lambda i: lines[i].confidence or 0)[:settings.ocr_refine_max_lines]
+
+        def crop_lines():
+            source = ImageOps.exif_transpose(image) if transpose else image
+            return [enhance_crop(source, lines[i].bbox, scale=settings.ocr_refine_scale) for i in low]
+
+        with stage("ocr_refine"):
+            crops = await asyncio.to_thread(crop_lines)
+            refined = await ocr_worker.recognize_crops(crops)
+        for i, line in zip(low, refined):
+            if line is None or not line.text.strip():
+                continue
+            if (line.confidence or 0) > (lines[i].confidence or 0):
+                lines[i].text = line.text
+                lines[i].confidence = line.confidence
+
+    @staticmethod
+    async def _summarize_with_yandexgpt(prompt: str, on_partial: PartialCallback | None = None) -> str:
+        """Run YandexGPT model for summarization; with on_partial the answer is streamed as it is generated."""
+        try:
+            with stage("llm_summary"):
+                if on_partial is None:
+                    text = await llm_client.complete(prompt)
+                else:
+                    text = ""
+                    async for text in llm_client.stream(prompt):
+                        await on_partial(text.strip())
+            return text.strip()
         except Exception as e:
-            return f"⚠️ Error during GPT call: {e}"
+            return f"{GPT_ERROR_PREFIX}: {e}"
 
     @staticmethod
-    def analyse_history(user_id: int) -> AnalysisResult:
-        # Retrieve dummy data (you can extend with real DB query)
-        df = pd.read_csv('analysis_results.csv', names=['user_id', 'date', 'analysis', 'result', 'status'])
-        user_df = df[df["user_id"] == user_id]
+    async def analyse_history(user_id: int, on_partial: PartialCallback | None = None) -> AnalysisResult:
+        version = get_storage().get_user_version(user_id)
+        cached = get_summary_cache().get(user_id, "analyse")
+        hit = cached is not None and cached.version == version
+        record_cache("summary_analyse", hit)
+        if hit:
+            return cached.result
+
+        if cached is not None and version is not None and cached.max_row_id < version[1]:
+            # Строки только дописывались — обновляем прошлую сводку по дельте
+            with stage("history_load"):
+                delta_df = get_storage().get_user_rows(user_id, after_id=cached.max_row_id)
+            if cached.row_count + len(delta_df) == version[0]:
+                prompt = (
+                    "Ты — ассистент врача. Ниже твоя прошлая сводка по медицинским анализам пользователя "
+                    "и новые результаты, полученные после неё. Обнови сводку с учётом новых результатов: "
+                    "выдели ключевые отклонения от нормы, укажи возможные тенденции (например, 'холестерин растет'). "
+                    "Сводка должна быть краткой, структурированной и понятной. Не ставь диагноз, но посоветуй обратиться к врачу при наличии отклонений.\n\n"
+                    "Прошлая сводка:\n"
+                    + cached.result.summary
+                    + "\n\nНовые результаты (показатель: дата=результат (статус, если не ok)):\n"
+                    + encode_history(delta_df)
+                )
+                return await AnalysisService._summarize_and_cache(user_id, prompt, "analyse", version,
+                                                                  on_partial=on_partial)
+
+        with stage("history_load"):
+            user_df = get_storage().get_user_rows(user_id)
+            # История изменилась между чтением версии и строк — сводку не к чему привязать, не кэшируем
+            if get_storage().get_user_version(user_id) != version:
+                version = None
 
         if user_df.empty:
             # Если нет текста для анализа, создаем специальный результат
@@ -167,38 +400,123 @@ class AnalysisService:
             # Не добавляем его в основную базу, так как это не реальный анализ
             return result
         
-        previous_texts = user_df.to_string()
+        previous_texts = build_history_context(
+            user_df,
+            token_budget=settings.llm_history_token_budget,
+            latest_points=settings.llm_history_latest_points,
+        )
 
         prompt = (
             "Ты — ассистент врача. Проанализируй таблицу с медицинскими анализами пользователя. "
             "Выдели ключевые отклонения от нормы, укажи возможные тенденции (например, 'холестерин растет'). "
             "Дай краткую, структурированную и понятную сводку по состоянию здоровья. Не ставь диагноз, но посоветуй обратиться к врачу при наличии отклонений.\n\n"
-            "История анализов:\n"
+            "История анализов (показатель: дата=результат (статус, если не ok)):\n"
             + previous_texts
         )
 
-        summary = AnalysisService._summarize_with_yandexgpt(prompt)
+        return await AnalysisService._summarize_and_cache(user_id, prompt, "analyse", version, on_partial=on_partial)
+
+    @staticmethod
+    async def _summarize_and_cache(user_id: int, prompt: str, kind: str, version: tuple[int, int] | None,
+                                   user_prompt: str | None = None,
+                                   on_partial: PartialCallback | None = None) -> AnalysisResult:
+        # Очередь к YandexGPT общая: при нагрузке запросы пользователей чередуются
+        async with llm_scheduler.slot(user_id):
+            summary = await AnalysisService._summarize_with_yandexgpt(prompt, on_partial)
 
         result = AnalysisResult(
             user_id=user_id,
             summary=summary,
             generated_at=datetime.utcnow(),
         )
-        results_db.append(result)
+        # Ошибки вызова не кэшируем, чтобы следующий запрос повторил попытку; без версии — тоже
+        if version is not None and not summary.startswith(GPT_ERROR_PREFIX):
+            get_summary_cache().put(result, kind, version, prompt=user_prompt)
         return result
 
     @staticmethod
-    
+    def get_history(user_id: int, last_days: int | None, statuses: list[str] | None = None) -> pd.DataFrame:
+        start = None
+        if last_days is not None:
+            start = (datetime.now() - timedelta(days=last_days)).date()
+        # Даты нормализуются в ISO при записи, повторно их не разбираем
+        return get_storage().get_user_rows(user_id, start=start, statuses=statuses)
 
     @staticmethod
-    def get_history(user_id: int, last_days: int | None) -> pd.DataFrame:
-        df = pd.read_csv('analysis_results.csv', names=['user_id', 'date', 'analysis', 'result', 'status'])
-        user_df = df[df["user_id"] == user_id]
-        user_df.drop('user_id', axis=1, inplace=True)
-        user_df["date"] = pd.to_datetime(user_df["date"], errors="coerce", dayfirst=True)
-        if last_days is not None:
-            cutoff = pd.Timestamp.now() - pd.Timedelta(days=last_days)
-            filtered = df[df["date"] >= cutoff]
-            return filtered
-        return user_df
-    
\ No newline at end of file
+    def get_period(user_id: int, start_date=None, end_date=None, statuses: list[str] | None = None) -> pd.DataFrame:
+        """
+        Анализы пользователя за период; None означает самую раннюю/позднюю дату.
+        statuses отбирает строки по сохранённому статусу, например ABNORMAL_STATUSES —
+        все отклонения за период.
+        """
+        return get_storage().get_user_rows(user_id, start=start_date, end=end_date, statuses=statuses)
+
+    @staticmethod
+    def get_results_page(user_id: int, start_date=None, end_date=None, after: int | None = None,
+                         before: int | None = None, limit: int = 10,
+                         statuses: list[str] | None = None) -> tuple[pd.DataFrame, bool]:
+        """Одна страница анализов за период по курсору (id строки), см. AnalysisStorage.get_user_page."""
+        return get_storage().get_user_page(user_id, start=start_date, end=end_date, after=after, before=before,
+                                     limit=limit, statuses=statuses)
+
+    @staticmethod
+    def get_date_range(user_id: int) -> tuple[str, str] | None:
+        """Самая ранняя и самая поздняя дата анализов пользователя (YYYY-MM-DD)."""
+        return get_storage().get_user_date_range(user_id)
+
+    @staticmethod
+    async def get_chart(user_id: int, query: str) -> CachedChart | None:
+        """
+        График динамики показателя query (название или синоним из справочника)
+        с полосой референса. Кэшируется по (пользователь, показатель, версия
+        истории); None — в истории нет числовых результатов этого показателя.
+        """
+        code = analyte_code(query)
+        key = code or normalize(query)
+        version = get_storage().get_user_version(user_id)
+        if not key or version is None:
+            return None
+
+        cached = get_chart_cache().get(user_id, key, version)
+        record_cache("chart", cached is not None)
+        if cached is not None:
+            return cached
+
+        if code is not None:
+            rows = get_storage().get_user_rows(user_id, codes=[code])
+        else:
+            rows = get_storage().get_user_rows(user_id)
+            rows = rows[rows['analysis'].map(lambda name: normalize(str(name))) == key]
+        # На оси времени — только строки с числом и распознанной датой (нераспознанные даты не в ISO)
+        rows = rows[rows['value'].notna() & rows['date'].astype(str).str.fullmatch(r'\d{4}-\d{2}-\d{2}')]
+        if rows.empty:
+            return None
+
+        # Значения в других единицах (другая лаборатория) на одной оси не сравнить — берём единицу последнего
+        unit = rows['unit'].dropna().iloc[-1] if rows['unit'].notna().any() else None
+        if unit is not None:
+            rows = rows[rows['unit'].isna() | (rows['unit'] == unit)]
+
+        def optional(values: pd.Series) -> list:
+            return [None if pd.isna(value) else float(value) for value in values]
+
+        title = analyte_index.display_name(code) if code is not None else str(rows['analysis'].iloc[-1])
+        series = TrendSeries(
+            title=title,
+            unit=unit or (rows['ref_unit'].dropna().iloc[-1] if rows['ref_unit'].notna().any() else None),
+            dates=rows['date'].astype(str).tolist(),
+            values=rows['value'].astype(float).tolist(),
+            ref_low=optional(rows['ref_low']),
+            ref_high=optional(rows['ref_high']),
+            abnormal=(rows['status'] == 'abnormal').tolist(),
+        )
+        png = await chart_renderer.render(series)
+
+        chart = CachedChart(user_id, key, version, title=title, png=png)
+        get_chart_cache().put(chart)
+        return chart
+
+    @staticmethod
+    def remember_chart_file_id(chart: CachedChart, file_id: str | None):
+        """file_id отправленного графика: следующий запрос той же версии уйдёт без загрузки PNG."""
+        get_chart_cache().set_file_id(chart, file_id)
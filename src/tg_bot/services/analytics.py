@@ -0,0 +1,172 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from ..utils.prompt_context import indicator_key, relevant_mask, STOP_WORDS
+
+DISCLAIMER = "Это не медицинский диагноз. Для интерпретации обратитесь к врачу."
+
+STATUS_TEXT = {
+    'ok': 'в норме',
+    'attention': 'в норме, но есть пометки',
+    'abnormal': 'есть отклонения',
+    'invalid': 'результат недостоверен',
+}
+
+# Ключевые слова намерений в порядке проверки
+INTENTS = (
+    ('out_of_range', ('вне нормы', 'не в норме', 'из нормы', 'отклонен', 'плохие', 'превыш')),
+    ('trend', ('динамик', 'тренд', 'растет', 'растёт', 'падает', 'снижа', 'изменил', 'изменен')),
+    ('compare', ('сравни', 'сравнен')),
+    ('dates', ('когда', 'даты', 'дату', 'дата сдачи')),
+    ('latest', ('последн', 'текущ', 'сейчас', 'какой у меня', 'какое у меня', 'какая у меня')),
+)
+
+# Вопросы, которые должен разбирать LLM: советы, причины, даты/периоды в запросе
+FREE_FORM_MARKERS = ('почему', 'что делать', 'лечить', 'принимать', 'посоветуй', 'означает', 'опасно')
+_DATE_IN_QUESTION_RE = re.compile(r'\d{1,2}[./]\d{1,2}|\d{4}')
+_NUMBER_RE = r'([-+]?\d+(?:[.,]\d+)?)'
+_WORD_RE = re.compile(r'\w+')
+
+
+def detect_intent(question: str) -> str | None:
+    text = question.lower()
+    if any(marker in text for marker in FREE_FORM_MARKERS) or _DATE_IN_QUESTION_RE.search(text):
+        return None
+    for intent, keywords in INTENTS:
+        if any(keyword in text for keyword in keywords):
+            return intent
+    return None
+
+
+def mentions_unknown_indicator(question: str) -> bool:
+    """В вопросе есть содержательные слова помимо намерения — вероятно, показатель, которого нет в истории."""
+    keywords = [keyword for _, intent_keywords in INTENTS for keyword in intent_keywords]
+    for word in _WORD_RE.findall(question.lower()):
+        if len(word) < 3 or word in STOP_WORDS or word.isdigit():
+            continue
+        if any(word.startswith(keyword) or keyword.startswith(word) for keyword in keywords):
+            continue
+        return True
+    return False
+
+
+def numeric_values(user_df: pd.DataFrame) -> pd.Series:
+    """Числовое значение результата, NaN для нечисловых. Берётся из колонки value, заполненной при записи."""
+    if 'value' in user_df:
+        return user_df['value'].astype(float)
+    extracted = user_df['result'].astype(str).str.extract(_NUMBER_RE, expand=False)
+    return pd.to_numeric(extracted.str.replace(',', '.', regex=False), errors='coerce')
+
+
+def latest_values(user_df: pd.DataFrame) -> pd.DataFrame:
+    df = user_df.sort_values('date', kind='stable')
+    return df.groupby(indicator_key(df), sort=False).tail(1).sort_values('date', ascending=False, kind='stable')
+
+
+def trends(user_df: pd.DataFrame, max_points: int = 6, tolerance: float = 0.025) -> pd.DataFrame:
+    """
+    Тренд по каждому показателю за последние max_points точек: сравнение последнего
+    значения с первым в окне, изменение в пределах tolerance считается стабильным.
+    """
+    df = user_df.assign(
+        value=numeric_values(user_df),
+        point=user_df['date'].astype(str) + ' — ' + user_df['result'].astype(str),
+    ).dropna(subset=['value'])
+    df = df.sort_values('date', kind='stable')
+    df = df.groupby(indicator_key(df), sort=False).tail(max_points)
+
+    grouped = df.groupby(indicator_key(df), sort=False)
+    summary = pd.DataFrame({
+        'name': grouped['analysis'].last(),
+        'points': grouped['value'].size(),
+        'first': grouped['value'].first(),
+        'last': grouped['value'].last(),
+        'series': grouped['point'].agg('; '.join),
+    })
+    summary = summary[summary['points'] >= 2]
+    base = summary['first'].abs().replace(0, np.nan)
+    summary['change'] = ((summary['last'] - summary['first']) / base).fillna(0.0)
+    summary['direction'] = np.select(
+        [summary['change'] > tolerance, summary['change'] < -tolerance],
+        ['рост', 'падение'],
+        default='стабильно',
+    )
+    return summary
+
+
+def out_of_range(user_df: pd.DataFrame) -> pd.DataFrame:
+    return user_df[user_df['status'].isin(['abnormal', 'attention'])].sort_values('date', kind='stable')
+
+
+def answer_locally(user_df: pd.DataFrame, question: str) -> str | None:
+    """
+    Отвечает на типовые вопросы /ask (последние значения, тренд, выходы из нормы,
+    даты сдачи, сравнение) прямо по истории. None — вопрос нужно отдать LLM.
+    """
+    intent = detect_intent(question)
+    if intent is None or user_df.empty:
+        return None
+
+    mask = relevant_mask(user_df, question)
+    if mask is None and intent != 'out_of_range' and mentions_unknown_indicator(question):
+        return None
+    df = user_df if mask is None else user_df[mask]
+
+    if intent == 'latest':
+        latest = latest_values(df)
+        lead = "Последние значения показателей:" if mask is None else "Последние значения:"
+        return _format(lead, _cards(latest))
+
+    if intent == 'out_of_range':
+        flagged = out_of_range(df)
+        if flagged.empty:
+            return _format("Результатов вне нормы или с пометками в истории не найдено.")
+        abnormal_count = int((flagged['status'] == 'abnormal').sum())
+        lead = (
+            f"Найдено результатов с отклонениями: {abnormal_count}, "
+            f"с пометками: {len(flagged) - abnormal_count}."
+        )
+        return _format(lead, _cards(flagged))
+
+    if intent == 'dates':
+        grouped = df.groupby(indicator_key(df), sort=False)
+        dates = pd.DataFrame({
+            'name': grouped['analysis'].last(),
+            'dates': grouped['date'].agg(lambda values: ', '.join(sorted(set(values)))),
+        })
+        all_dates = sorted(set(df['date']))
+        lead = f"Анализы сданы {len(all_dates)} раз(а): с {all_dates[0]} по {all_dates[-1]}."
+        return _format(lead, [f"{row.name} — {row.dates}" for row in dates.itertuples(index=False)])
+
+    if intent in ('trend', 'compare'):
+        if mask is None and intent == 'compare':
+            return None
+        summary = trends(df, max_points=6 if intent == 'trend' else 2)
+        if summary.empty:
+            return _format("Для оценки динамики нужно хотя бы два числовых результата одного показателя.")
+        lines = [
+            f"{row.name}: {row.direction} ({row.change:+.1%}) — {row.series}"
+            for row in summary.itertuples(index=False)
+        ]
+        lead = "Динамика по последним результатам (допуск ±2.5%):" if intent == 'trend' \
+            else "Сравнение двух последних результатов:"
+        return _format(lead, lines)
+
+    return None
+
+
+def _cards(df: pd.DataFrame) -> list[str]:
+    return [
+        f"{row.date} — {row.analysis} — {row.result} — {STATUS_TEXT.get(row.status, row.status)}"
+        for row in df.itertuples(index=False)
+    ]
+
+
+def _format(lead: str, lines: list[str] | None = None) -> str:
+    parts = [lead]
+    if lines:
+        parts.append('\n'.join(f"• {line}" for line in lines))
+    parts.append(DISCLAIMER)
+    return '\n\n'.join(parts)
@@ -0,0 +1,110 @@
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+from ..config import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS charts (
+    user_id INTEGER NOT NULL,
+    analyte TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    max_row_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    png BLOB NOT NULL,
+    file_id TEXT,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (user_id, analyte)
+);
+CREATE INDEX IF NOT EXISTS ix_charts_last_used ON charts(last_used);
+"""
+
+
+@dataclass
+class CachedChart:
+    user_id: int
+    # Канонический код показателя или нормализованное название, если кода нет
+    analyte: str
+    version: tuple[int, int]
+    title: str
+    png: bytes
+    # file_id фото в Telegram после первой отправки: повторно график не загружается
+    file_id: str | None = None
+
+
+class ChartCache:
+    """
+    Постоянный кэш графиков /chart по (пользователь, показатель).
+
+    Запись действительна для версии истории (row_count, max_row_id), по
+    которой построена; у пары хранится только последняя версия. После
+    первой отправки запоминается file_id, и повтор уходит без загрузки PNG.
+    Вытеснение — по числу записей (давно не использованные первыми).
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def get(self, user_id: int, analyte: str, version: tuple[int, int]) -> CachedChart | None:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT title, png, file_id FROM charts "
+                "WHERE user_id = ? AND analyte = ? AND row_count = ? AND max_row_id = ?",
+                (user_id, analyte, *version),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE charts SET last_used = ? WHERE user_id = ? AND analyte = ?", (time.time(), user_id, analyte)
+            )
+        return CachedChart(user_id, analyte, version, title=row[0], png=row[1], file_id=row[2])
+
+    def put(self, chart: CachedChart):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO charts "
+                "(user_id, analyte, row_count, max_row_id, title, png, file_id, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (chart.user_id, chart.analyte, *chart.version, chart.title, chart.png, chart.file_id, time.time()),
+            )
+            self._evict()
+
+    def set_file_id(self, chart: CachedChart, file_id: str | None):
+        """Запоминает file_id отправленного фото; None — file_id больше не принимается Telegram."""
+        chart.file_id = file_id
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE charts SET file_id = ? "
+                "WHERE user_id = ? AND analyte = ? AND row_count = ? AND max_row_id = ?",
+                (file_id, chart.user_id, chart.analyte, *chart.version),
+            )
+
+    def invalidate(self, user_id: int):
+        """Сбрасывает графики пользователя, если строки изменились без смены версии (UPDATE)."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM charts WHERE user_id = ?", (user_id,))
+
+    def _evict(self):
+        self._conn.execute(
+            "DELETE FROM charts WHERE rowid IN ("
+            "SELECT rowid FROM charts ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+# Кэш открывается при первом обращении: импорт модуля не создаёт базу
+_chart_cache: ChartCache | None = None
+_init_lock = threading.Lock()
+
+
+def get_chart_cache() -> ChartCache:
+    global _chart_cache
+    with _init_lock:
+        if _chart_cache is None:
+            _chart_cache = ChartCache(settings.db_path, max_entries=settings.chart_cache_max_entries)
+        return _chart_cache
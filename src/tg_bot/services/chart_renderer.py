@@ -0,0 +1,42 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from ..config import settings
+from ..utils.charts import TrendSeries, render_trend_chart
+from ..utils.metrics import stage
+
+
+class ChartRenderer:
+    """
+    Отрисовка графиков /chart в пуле процессов: matplotlib (Agg) держит GIL
+    на всё время рендера, поэтому в потоке он тормозил бы и диспетчер бота.
+    До start() и после stop() график рисуется в потоке — для скриптов и тестов.
+    """
+
+    def __init__(self, processes: int):
+        self.processes = processes
+        self._pool: ProcessPoolExecutor | None = None
+
+    async def start(self):
+        if self._pool is not None or self.processes <= 0:
+            return
+        # spawn: у бота уже работают потоки и event loop, fork их не копирует корректно
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=multiprocessing.get_context('spawn')
+        )
+
+    async def stop(self):
+        if self._pool is None:
+            return
+        pool, self._pool = self._pool, None
+        await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+
+    async def render(self, series: TrendSeries) -> bytes:
+        with stage("chart_render"):
+            if self._pool is None:
+                return await asyncio.to_thread(render_trend_chart, series)
+            return await asyncio.get_running_loop().run_in_executor(self._pool, render_trend_chart, series)
+
+
+chart_renderer = ChartRenderer(settings.chart_render_processes)
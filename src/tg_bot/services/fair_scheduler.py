@@ -0,0 +1,118 @@
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Hashable
+
+from ..config import settings
+from ..utils.metrics import registry, stage
+
+
+class FairScheduler:
+    """
+    Справедливая очередь к тяжёлому ресурсу (OCR, YandexGPT).
+
+    Одновременно выполняется не больше concurrency работ. Ожидающие работы
+    лежат в отдельной очереди каждого пользователя, а освободившийся слот
+    достаётся пользователям по кругу (weighted round-robin): за один обход
+    пользователь получает не больше weight слотов. Поэтому время ожидания
+    пользователя зависит от числа активных пользователей, а не от того,
+    сколько работ поставил в очередь самый активный из них.
+    """
+
+    def __init__(self, name: str, concurrency: int, weights: dict[int, int] | None = None):
+        self.name = name
+        self.concurrency = concurrency
+        self.weights = weights or {}
+
+        self._active = 0
+        # Пользователи в порядке обхода → их ожидающие работы
+        self._queues: OrderedDict[Hashable, deque[asyncio.Future]] = OrderedDict()
+        # Сколько слотов пользователь ещё может получить в текущем обходе
+        self._credits: dict[Hashable, int] = {}
+
+    @property
+    def waiting(self) -> int:
+        return sum(not future.cancelled() for queue in self._queues.values() for future in queue)
+
+    def weight(self, user_id: Hashable) -> int:
+        return max(1, self.weights.get(user_id, 1))
+
+    @asynccontextmanager
+    async def slot(self, user_id: Hashable):
+        await self.acquire(user_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, user_id: Hashable):
+        if self._active < self.concurrency and not self._queues:
+            self._active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(user_id)
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+            self._credits[user_id] = self.weight(user_id)
+        queue.append(future)
+
+        with stage(f"{self.name}_queue_wait"):
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Слот уже выдан, но ждущий отменён — возвращаем слот следующему
+                    self.release()
+                else:
+                    self._discard(user_id, future)
+                raise
+
+    def _discard(self, user_id: Hashable, future: asyncio.Future):
+        """Убирает из очереди работу, отменённую до получения слота."""
+        queue = self._queues.get(user_id)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        if not queue:
+            del self._queues[user_id], self._credits[user_id]
+
+    def release(self):
+        self._active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._active < self.concurrency and self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            if future.cancelled():
+                # Отменённая работа слот не получает и долю пользователя в обходе не расходует
+                if not queue:
+                    del self._queues[user_id], self._credits[user_id]
+                continue
+            self._credits[user_id] -= 1
+
+            if not queue:
+                del self._queues[user_id], self._credits[user_id]
+            elif self._credits[user_id] <= 0:
+                # Пользователь исчерпал свою долю в этом обходе — в конец круга
+                self._queues.move_to_end(user_id)
+                self._credits[user_id] = self.weight(user_id)
+
+            self._active += 1
+            future.set_result(None)
+
+
+ocr_scheduler = FairScheduler(
+    "ocr", settings.fair_ocr_concurrency, weights=settings.fair_user_weights
+)
+llm_scheduler = FairScheduler(
+    "llm", settings.llm_max_concurrency, weights=settings.fair_user_weights
+)
+
+registry.gauge(
+    "labtracker_ocr_fair_waiting", "Работ OCR, ожидающих слота в справедливой очереди"
+).set_function(lambda: ocr_scheduler.waiting)
+registry.gauge(
+    "labtracker_llm_fair_waiting", "Запросов к YandexGPT, ожидающих слота в справедливой очереди"
+).set_function(lambda: llm_scheduler.waiting)
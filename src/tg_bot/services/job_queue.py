@@ -0,0 +1,329 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from ..config import settings
+from ..utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    input_path TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    worker TEXT,
+    result TEXT,
+    error TEXT,
+    delivered INTEGER NOT NULL DEFAULT 0,
+    user_id INTEGER,
+    claimed_at REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_claim ON jobs(status, available_at);
+CREATE INDEX IF NOT EXISTS ix_jobs_delivery ON jobs(delivered, status);
+"""
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    payload: dict
+    input_path: str | None
+    status: str
+    attempts: int
+    max_attempts: int
+    result: str | None = None
+    error: str | None = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        return cls(
+            id=row["id"],
+            kind=row["kind"],
+            payload=json.loads(row["payload"]),
+            input_path=row["input_path"],
+            status=row["status"],
+            attempts=row["attempts"],
+            max_attempts=row["max_attempts"],
+            result=row["result"],
+            error=row["error"],
+        )
+
+
+class JobQueue:
+    """
+    Надёжная очередь заданий на распознавание в отдельной SQLite-базе.
+
+    Бот кладёт задание (файл — в spool-каталог), воркеры в других процессах
+    забирают его с арендой (lease): пока воркер жив, он продлевает аренду;
+    если процесс упал, аренда истекает и задание достаётся другому воркеру.
+    Неудачные попытки повторяются с задержкой до max_attempts, готовые
+    результаты остаются в базе, пока бот их не доставит.
+
+    Задания выдаются по кругу между пользователями (как слоты ocr_scheduler
+    в процессе бота): следующим идёт пользователь, чьё задание забирали
+    давнее всех, так что пачка сканов одного не задерживает остальных.
+    """
+
+    def __init__(self, path: str, spool_dir: str, max_attempts: int = 3, retry_delay: float = 5.0):
+        self.spool_dir = spool_dir
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        os.makedirs(spool_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Транзакции открываем сами (BEGIN IMMEDIATE), чтобы захват задания был атомарным между процессами
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "user_id" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN user_id INTEGER")
+            self._conn.execute("UPDATE jobs SET user_id = json_extract(payload, '$.user_id')")
+        if "claimed_at" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN claimed_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_user_claimed ON jobs(user_id, claimed_at)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def enqueue(self, kind: str, payload: dict, data: bytes | None = None) -> int:
+        input_path = None
+        if data is not None:
+            input_path = os.path.join(self.spool_dir, f"{uuid.uuid4().hex}.bin")
+            tmp_path = f"{input_path}.tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(data)
+            os.replace(tmp_path, input_path)
+
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, payload, input_path, status, max_attempts, available_at, user_id, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload), input_path, QUEUED, self.max_attempts, now, payload.get("user_id"),
+                 now, now),
+            )
+        return cursor.lastrowid
+
+    def claim(self, worker: str, lease: float) -> Job | None:
+        """
+        Забирает следующее задание: новое или брошенное упавшим воркером (истекла аренда).
+        Из готовых к выдаче берётся старейшее задание пользователя, которого обслуживали
+        давнее всех (задания без user_id — как один общий пользователь).
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Задание, на котором воркеры падали max_attempts раз, больше не выдаём
+                for row in self._conn.execute(
+                    "SELECT id, input_path FROM jobs WHERE status = ? AND lease_until < ? AND attempts >= max_attempts",
+                    (RUNNING, now),
+                ).fetchall():
+                    self._finish(row["id"], FAILED, error="Воркер не завершил задание", input_path=row["input_path"])
+
+                row = self._conn.execute(
+                    "SELECT * FROM jobs AS j WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_until < ?) "
+                    "ORDER BY IFNULL((SELECT MAX(claimed_at) FROM jobs WHERE user_id IS j.user_id), 0), "
+                    "available_at, id LIMIT 1",
+                    (QUEUED, now, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, lease_until = ?, claimed_at = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    (RUNNING, worker, now + lease, now, now, row["id"]),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        job = Job.from_row(row)
+        job.status = RUNNING
+        job.attempts += 1
+        return job
+
+    def extend_lease(self, job_id: int, worker: str, lease: float) -> bool:
+        """Продлевает аренду; False — задание уже забрал другой воркер."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (time.time() + lease, time.time(), job_id, worker, RUNNING),
+            )
+        return cursor.rowcount > 0
+
+    def complete(self, job: Job, worker: str, result: str | None):
+        with self._lock:
+            self._finish(job.id, DONE, result=result, input_path=job.input_path, worker=worker)
+
+    def fail(self, job: Job, worker: str, error: str):
+        """Неудачная попытка: задание вернётся в очередь с задержкой или будет помечено failed."""
+        with self._lock:
+            if job.attempts < job.max_attempts:
+                delay = self.retry_delay * 2 ** (job.attempts - 1)
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, available_at = ?, lease_until = NULL, error = ?, updated_at = ? "
+                    "WHERE id = ? AND worker = ?",
+                    (QUEUED, time.time() + delay, error, time.time(), job.id, worker),
+                )
+            else:
+                self._finish(job.id, FAILED, error=error, input_path=job.input_path, worker=worker)
+
+    def _finish(self, job_id: int, status: str, result: str | None = None, error: str | None = None,
+                input_path: str | None = None, worker: str | None = None):
+        query = "UPDATE jobs SET status = ?, result = ?, error = ?, lease_until = NULL, updated_at = ? WHERE id = ?"
+        params = [status, result, error, time.time(), job_id]
+        if worker is not None:
+            query += " AND worker = ?"
+            params.append(worker)
+        cursor = self._conn.execute(query, params)
+        # Задание могло уже перейти к другому воркеру — тогда его входной файл ещё нужен
+        if input_path is not None and cursor.rowcount > 0:
+            try:
+                os.remove(input_path)
+            except FileNotFoundError:
+                pass
+
+    def read_input(self, job: Job) -> bytes | None:
+        if job.input_path is None:
+            return None
+        with open(job.input_path, "rb") as file:
+            return file.read()
+
+    def finished(self, limit: int = 50) -> list[Job]:
+        """Завершённые задания, результат которых ещё не доставлен."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE delivered = 0 AND status IN (?, ?) ORDER BY updated_at LIMIT ?",
+                (DONE, FAILED, limit),
+            ).fetchall()
+        return [Job.from_row(row) for row in rows]
+
+    def mark_delivered(self, job_id: int):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET delivered = 1, result = NULL WHERE id = ?", (job_id,))
+
+    def purge(self, older_than: float):
+        """Удаляет доставленные задания старше older_than секунд."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE delivered = 1 AND updated_at < ?", (time.time() - older_than,)
+            )
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchone()[0]
+
+
+ResultCallback = Callable[[Job], Awaitable[None]]
+
+
+class JobResultPoller:
+    """
+    Доставка результатов в процессе бота: периодически читает завершённые
+    задания и вызывает колбэк, зарегистрированный для их вида. Результаты,
+    готовые во время перезапуска бота, доставляются после старта.
+    """
+
+    def __init__(self, queue: JobQueue, interval: float = 0.5, retention: float = 7 * 24 * 3600):
+        self.queue = queue
+        self.interval = interval
+        self.retention = retention
+        self._callbacks: dict[str, ResultCallback] = {}
+        self._task: asyncio.Task | None = None
+
+    def register(self, kind: str, callback: ResultCallback):
+        self._callbacks[kind] = callback
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="job-result-poller")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        polls = 0
+        while True:
+            for job in await asyncio.to_thread(self.queue.finished):
+                callback = self._callbacks.get(job.kind)
+                try:
+                    if callback is not None:
+                        await callback(job)
+                except Exception:
+                    # Доставка — не более одного раза: упавший колбэк не должен зацикливать опрос
+                    logger.exception("Не удалось доставить результат задания %s", job.id)
+                await asyncio.to_thread(self.queue.mark_delivered, job.id)
+
+            polls += 1
+            if polls % 1000 == 0:
+                await asyncio.to_thread(self.queue.purge, self.retention)
+            await asyncio.sleep(self.interval)
+
+
+# Очередь и поллер создаются при первом обращении: без scan_queue_enabled
+# бот не открывает jobs.db и не создаёт spool-каталог
+_job_queue: JobQueue | None = None
+_job_results: JobResultPoller | None = None
+_init_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _job_queue
+    with _init_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(
+                settings.jobs_db_path,
+                settings.jobs_spool_dir,
+                max_attempts=settings.jobs_max_attempts,
+                retry_delay=settings.jobs_retry_delay,
+            )
+            registry.gauge(
+                "labtracker_scan_jobs_pending", "Заданий на распознавание в очереди и в работе"
+            ).set_function(_job_queue.depth)
+        return _job_queue
+
+
+def get_job_results() -> JobResultPoller:
+    global _job_results
+    queue = get_job_queue()
+    with _init_lock:
+        if _job_results is None:
+            _job_results = JobResultPoller(queue, interval=settings.jobs_poll_interval)
+        return _job_results
@@ -0,0 +1,137 @@
+import asyncio
+import gc
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable
+
+
+class ModelRegistry:
+    """
+    Ленивый реестр тяжёлых моделей.
+
+    Модель создаётся фабрикой при первом обращении, а не при импорте модуля,
+    поэтому бот начинает отвечать сразу после старта. Модели можно прогреть в
+    фоне после запуска поллинга и выгрузить, если ими не пользовались дольше
+    idle_timeout секунд (0 — никогда не выгружать).
+    """
+
+    def __init__(self, idle_timeout: float = 0, check_interval: float = 60.0):
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+
+        self._factories: dict[str, Callable[[], Any]] = {}
+        self._models: dict[str, Any] = {}
+        self._last_used: dict[str, float] = {}
+        self._in_use: dict[str, int] = {}
+        # Общий замок защищает только словари; загрузка идёт под замком своей модели
+        self._lock = threading.RLock()
+        self._load_locks: dict[str, threading.Lock] = {}
+        self._reaper_task: asyncio.Task | None = None
+        self._warmup_task: asyncio.Task | None = None
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        with self._lock:
+            self._factories[name] = factory
+            self._load_locks.setdefault(name, threading.Lock())
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def get(self, name: str) -> Any:
+        """
+        Возвращает модель, загружая её при первом обращении (блокирующий вызов).
+        Загрузка одной модели не мешает обращаться к уже загруженным и выгружать их:
+        фабрика вызывается вне общего замка, один раз на модель.
+        """
+        with self._lock:
+            model = self._models.get(name)
+            if model is not None:
+                self._last_used[name] = time.monotonic()
+                return model
+            factory, load_lock = self._factories[name], self._load_locks[name]
+
+        with load_lock:
+            # Пока ждали замок, модель мог загрузить другой поток
+            with self._lock:
+                model = self._models.get(name)
+            if model is None:
+                model = factory()
+            with self._lock:
+                self._models[name] = model
+                self._last_used[name] = time.monotonic()
+            return model
+
+    @contextmanager
+    def using(self, name: str):
+        """Выдаёт модель и не даёт выгрузить её, пока блок не завершится."""
+        while True:
+            model = self.get(name)
+            with self._lock:
+                # Между загрузкой и отметкой модель могли выгрузить — тогда загружаем заново
+                if self._models.get(name) is model:
+                    self._in_use[name] = self._in_use.get(name, 0) + 1
+                    break
+        try:
+            yield model
+        finally:
+            with self._lock:
+                self._in_use[name] -= 1
+                self._last_used[name] = time.monotonic()
+
+    def unload(self, name: str) -> bool:
+        with self._lock:
+            if self._in_use.get(name) or name not in self._models:
+                return False
+            del self._models[name]
+            self._last_used.pop(name, None)
+        _free_memory()
+        return True
+
+    def unload_idle(self) -> list[str]:
+        if not self.idle_timeout:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                name for name, last_used in self._last_used.items()
+                if now - last_used >= self.idle_timeout and not self._in_use.get(name)
+            ]
+        return [name for name in idle if self.unload(name)]
+
+    async def warmup(self, *names: str):
+        """Загружает модели в отдельном потоке, не блокируя event loop."""
+        for name in names or tuple(self._factories):
+            await asyncio.to_thread(self.get, name)
+
+    async def start(self, warmup: bool = True):
+        if warmup and self._warmup_task is None:
+            self._warmup_task = asyncio.create_task(self.warmup(), name="models-warmup")
+        if self.idle_timeout and self._reaper_task is None:
+            self._reaper_task = asyncio.create_task(self._reap(), name="models-reaper")
+
+    async def stop(self):
+        for task in (self._warmup_task, self._reaper_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._warmup_task = None
+        self._reaper_task = None
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            self.unload_idle()
+
+
+def _free_memory():
+    gc.collect()
+    try:
+        import torch
+    except ImportError:
+        return
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
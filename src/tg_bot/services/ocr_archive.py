@@ -0,0 +1,366 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Iterator
+
+import numpy as np
+
+from ..config import settings
+from ..utils.pdf_reader import TextLine
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    scan_id TEXT PRIMARY KEY,
+    user_id INTEGER,
+    line_start INTEGER NOT NULL,
+    line_count INTEGER NOT NULL,
+    page_count INTEGER NOT NULL,
+    csv TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_scans_user ON scans(user_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Колонки строк OCR: файл → (dtype, значений на строку)
+COLUMNS = {
+    'bbox': (np.float32, 4),
+    'confidence': (np.float32, 1),
+    'page': (np.uint16, 1),
+    # [начало, конец) текста строки в text.bin
+    'text_span': (np.int64, 2),
+}
+# Общая таблица текстов строк
+TEXT = 'text'
+# Файлы архива: колонка или text, номер поколения (у нулевого номера в имени нет)
+_FILE_RE = re.compile(rf"^({'|'.join([*COLUMNS, TEXT])})(?:\.(\d+))?\.bin$")
+
+
+def _file_name(name: str, generation: int) -> str:
+    return f"{name}.{generation}.bin" if generation else f"{name}.bin"
+
+
+def _read_column(directory: str, name: str, generation: int, start: int, count: int) -> np.ndarray:
+    """Строки [start, start + count) колонки, отображённые в память."""
+    dtype, width = COLUMNS[name]
+    shape = (count, width) if width > 1 else (count,)
+    if not count:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(
+        os.path.join(directory, _file_name(name, generation)), dtype=dtype, mode='r',
+        offset=start * width * np.dtype(dtype).itemsize, shape=shape,
+    )
+
+
+@dataclass
+class ArchivedScan:
+    scan_id: str
+    user_id: int | None
+    csv_text: str | None
+    # Страницы в том же виде, что предсказания Surya: объекты с text_lines
+    pages: list
+
+
+class OcrArchive:
+    """
+    Постоянный архив выходов OCR в колоночном виде.
+
+    Строки всех сканов дописываются в общие файлы-колонки (bbox, confidence,
+    page, смещения текста) и общую таблицу строк text.bin; SQLite-индекс
+    хранит для scan_id диапазон его строк и итоговый CSV. Запись атомарна
+    и безопасна между процессами (BEGIN IMMEDIATE); недописанный хвост
+    после сбоя обрезается при следующей записи. Читатели отображают файлы
+    в память (np.memmap), так что парсеры можно прогонять по тысячам сканов
+    без моделей OCR и без разбора JSON.
+
+    Повторная запись скана с теми же строками только обновляет индекс.
+    Если строки изменились (например, скан распознан заново), прежний
+    диапазон остаётся в файлах мусором до compact(): он переписывает живые
+    строки в файлы следующего поколения и переключает индекс на них одной
+    транзакцией.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, 'index.sqlite'), check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def put(self, scan_id: str, pages: list, user_id: int | None = None, csv_text: str | None = None):
+        """
+        Сохраняет text_lines всех страниц скана; повторная запись того же scan_id
+        заменяет прежнюю (если строки не изменились — без дозаписи в файлы).
+        """
+        lines = [(number, line) for number, page in enumerate(pages) for line in page.text_lines]
+        texts = [str(line.text or '').encode('utf-8') for _, line in lines]
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+
+        columns = {
+            'bbox': np.array([list(line.bbox) for _, line in lines], dtype=np.float32).reshape(-1, 4),
+            'confidence': np.array(
+                [np.nan if getattr(line, 'confidence', None) is None else line.confidence for _, line in lines],
+                dtype=np.float32,
+            ),
+            'page': np.array([number for number, _ in lines], dtype=np.uint16),
+        }
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                generation = self._generation()
+                existing = self._conn.execute(
+                    "SELECT line_start, line_count, page_count FROM scans WHERE scan_id = ?", (scan_id,)
+                ).fetchone()
+                if existing is not None and self._same_lines(existing, generation, columns, texts, len(pages)):
+                    self._conn.execute(
+                        "UPDATE scans SET user_id = ?, csv = ?, created_at = ? WHERE scan_id = ?",
+                        (user_id, csv_text, time.time(), scan_id),
+                    )
+                    self._conn.execute("COMMIT")
+                    return
+
+                line_start, text_end = self._high_water(generation)
+                ends = text_end + np.cumsum(lengths)
+                columns['text_span'] = np.stack([ends - lengths, ends], axis=1) if len(lines) else \
+                    np.empty((0, 2), dtype=np.int64)
+
+                # Всё, что лежит за последней зафиксированной записью, — хвост оборванной записи
+                for name, (dtype, width) in COLUMNS.items():
+                    self._append(
+                        _file_name(name, generation), line_start * width * np.dtype(dtype).itemsize,
+                        columns[name].astype(dtype),
+                    )
+                self._append_bytes(_file_name(TEXT, generation), text_end, b''.join(texts))
+
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO scans (scan_id, user_id, line_start, line_count, page_count, csv, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (scan_id, user_id, line_start, len(lines), len(pages), csv_text, time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def compact(self) -> int:
+        """
+        Переписывает архив без строк заменённых записей и возвращает число
+        освобождённых строк. Живые строки копируются в файлы следующего
+        поколения, индекс переключается на них в той же транзакции, после
+        чего файлы прежнего поколения удаляются; сбой до COMMIT оставляет
+        архив прежним.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                generation = self._generation()
+                line_end, _ = self._high_water(generation)
+                rows = self._conn.execute(
+                    "SELECT scan_id, line_start, line_count FROM scans ORDER BY line_start"
+                ).fetchall()
+                freed = line_end - sum(count for _, _, count in rows)
+                if not freed:
+                    self._conn.execute("COMMIT")
+                    return 0
+                moves = self._copy_live(rows, generation, generation + 1)
+                self._conn.executemany("UPDATE scans SET line_start = ? WHERE scan_id = ?", moves)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)", (generation + 1,)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._remove_stale(generation + 1)
+        return freed
+
+    def _copy_live(self, rows: list[tuple], generation: int, target: int) -> list[tuple[int, str]]:
+        """Копирует строки сканов подряд в файлы поколения target; возвращает новые line_start."""
+        files = {name: open(self._path(name, target), 'wb') for name in [*COLUMNS, TEXT]}
+        try:
+            moves = []
+            line_start = text_start = 0
+            with open(self._path(TEXT, generation), 'rb') as text:
+                for scan_id, start, count in rows:
+                    moves.append((line_start, scan_id))
+                    if not count:
+                        continue
+                    for name in COLUMNS:
+                        if name != 'text_span':
+                            files[name].write(_read_column(self.directory, name, generation, start, count).tobytes())
+                    spans = np.array(_read_column(self.directory, 'text_span', generation, start, count))
+                    base, end = int(spans[0, 0]), int(spans[-1, 1])
+                    text.seek(base)
+                    files[TEXT].write(text.read(end - base))
+                    files['text_span'].write((spans - base + text_start).tobytes())
+                    line_start += count
+                    text_start += end - base
+            for file in files.values():
+                file.flush()
+                os.fsync(file.fileno())
+        finally:
+            for file in files.values():
+                file.close()
+        return moves
+
+    def _remove_stale(self, generation: int):
+        """Удаляет файлы других поколений: прежнего и недописанного при сбое compact()."""
+        for name in os.listdir(self.directory):
+            match = _FILE_RE.match(name)
+            if match is not None and int(match.group(2) or 0) != generation:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def _generation(self) -> int:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def _same_lines(self, existing: tuple, generation: int, columns: dict, texts: list[bytes], page_count: int) -> bool:
+        """Совпадают ли сохранённые строки скана с новыми."""
+        line_start, line_count, stored_pages = existing
+        if stored_pages != page_count or line_count != len(texts):
+            return False
+        if not line_count:
+            return True
+
+        def stored(name: str) -> np.ndarray:
+            return _read_column(self.directory, name, generation, line_start, line_count)
+
+        spans = stored('text_span')
+        with open(self._path(TEXT, generation), 'rb') as file:
+            file.seek(int(spans[0, 0]))
+            text = file.read(int(spans[-1, 1] - spans[0, 0]))
+        return (
+            np.array_equal(stored('bbox'), columns['bbox'])
+            and np.array_equal(stored('confidence'), columns['confidence'], equal_nan=True)
+            and np.array_equal(stored('page'), columns['page'])
+            and np.array_equal(spans[:, 1] - spans[:, 0], [len(line) for line in texts])
+            and text == b''.join(texts)
+        )
+
+    def _high_water(self, generation: int) -> tuple[int, int]:
+        """Первая свободная строка и первый свободный байт text.bin по зафиксированным записям."""
+        line_end = self._conn.execute("SELECT COALESCE(MAX(line_start + line_count), 0) FROM scans").fetchone()[0]
+        if not line_end:
+            return 0, 0
+        span = _read_column(self.directory, 'text_span', generation, line_end - 1, 1)
+        return line_end, int(span[-1, 1])
+
+    def _append(self, file_name: str, offset: int, values: np.ndarray):
+        self._append_bytes(file_name, offset, values.tobytes())
+
+    def _append_bytes(self, file_name: str, offset: int, data: bytes):
+        path = os.path.join(self.directory, file_name)
+        with open(path, 'ab') as file:
+            file.truncate(offset)
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _path(self, name: str, generation: int) -> str:
+        return os.path.join(self.directory, _file_name(name, generation))
+
+    def reader(self) -> "OcrArchiveReader":
+        """Снимок архива для чтения: записи, появившиеся позже, в него не попадут."""
+        for attempt in range(2):
+            with self._lock:
+                # Строки индекса и поколение файлов — из одного снимка базы
+                self._conn.execute("BEGIN")
+                try:
+                    rows = self._conn.execute(
+                        "SELECT scan_id, user_id, line_start, line_count, page_count, csv FROM scans ORDER BY created_at"
+                    ).fetchall()
+                    generation = self._generation()
+                finally:
+                    self._conn.execute("COMMIT")
+            try:
+                return OcrArchiveReader(self.directory, rows, generation)
+            except FileNotFoundError:
+                # compact() в другом процессе успел удалить файлы этого поколения — берём новый снимок
+                if attempt:
+                    raise
+
+
+class OcrArchiveReader:
+    """Чтение архива через np.memmap: строки сканов не копируются, пока их не запросят."""
+
+    def __init__(self, directory: str, rows: list[tuple], generation: int = 0):
+        self._index = {row[0]: row for row in rows}
+        line_end = max((row[2] + row[3] for row in rows), default=0)
+
+        self.columns: dict[str, np.ndarray] = {
+            name: _read_column(directory, name, generation, 0, line_end) for name in COLUMNS
+        }
+        text_end = int(self.columns['text_span'][-1, 1]) if line_end else 0
+        self.text = (
+            np.memmap(os.path.join(directory, _file_name(TEXT, generation)), dtype=np.uint8, mode='r',
+                      shape=(text_end,))
+            if text_end else np.empty(0, dtype=np.uint8)
+        )
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, scan_id: str) -> bool:
+        return scan_id in self._index
+
+    def scan_ids(self) -> list[str]:
+        return list(self._index)
+
+    def get(self, scan_id: str) -> ArchivedScan | None:
+        row = self._index.get(scan_id)
+        if row is None:
+            return None
+        _, user_id, line_start, line_count, page_count, csv_text = row
+        rows = slice(line_start, line_start + line_count)
+        bboxes = self.columns['bbox'][rows].tolist()
+        confidences = self.columns['confidence'][rows].tolist()
+        page_numbers = self.columns['page'][rows].tolist()
+
+        spans = self.columns['text_span'][rows]
+        # Текст скана лежит одним куском — копируем его из отображения один раз
+        base = int(spans[0, 0]) if line_count else 0
+        blob = bytes(self.text[base:int(spans[-1, 1])]) if line_count else b''
+
+        pages = [SimpleNamespace(text_lines=[]) for _ in range(page_count)]
+        for (start, end), bbox, confidence, number in zip((spans - base).tolist(), bboxes, confidences, page_numbers):
+            text = blob[start:end].decode('utf-8')
+            pages[number].text_lines.append(
+                TextLine(text=text, bbox=bbox, confidence=None if np.isnan(confidence) else confidence)
+            )
+        return ArchivedScan(scan_id=scan_id, user_id=user_id, csv_text=csv_text, pages=pages)
+
+    def __iter__(self) -> Iterator[ArchivedScan]:
+        for scan_id in self._index:
+            yield self.get(scan_id)
+
+
+# Архив открывается при первом обращении: импорт модуля не создаёт каталог
+_ocr_archive: OcrArchive | None = None
+_init_lock = threading.Lock()
+
+
+def get_ocr_archive() -> OcrArchive:
+    global _ocr_archive
+    with _init_lock:
+        if _ocr_archive is None:
+            _ocr_archive = OcrArchive(settings.ocr_archive_dir)
+        return _ocr_archive
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import threading
+import time
+
+os.environ["RECOGNITION_BATCH_SIZE"]="256"
+os.environ["FOUNDATION_MODEL_QUANTIZE"]="False"
+
+from ..config import settings
+from ..utils.metrics import OCR_BATCH_SIZE, OCR_QUEUE_DEPTH, STAGE_SECONDS, stage
+from .model_registry import ModelRegistry
+
+
+class OcrQueueFullError(Exception):
+    """Очередь распознавания переполнена — новое изображение не принято."""
+
+
+class OcrWorker:
+    """
+    Отдельный воркер распознавания, работающий с моделями Surya из model_registry.
+
+    Хендлеры кладут изображения в asyncio-очередь и ждут свой future.
+    Воркер собирает запросы, пришедшие в течение max_wait секунд (но не больше
+    max_batch_size), в один батч и прогоняет его одним вызовом
+    recognition_predictor(images, det_predictor=...) в отдельном потоке,
+    поэтому event loop бота не блокируется.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 8,
+        max_wait: float = 0.05,
+        max_queue_size: int = 32,
+        enqueue_timeout: float = 10.0,
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue_size = max_queue_size
+        self.enqueue_timeout = enqueue_timeout
+
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        # Основной батч и повторное распознавание строк не гоняют модель одновременно
+        self._model_lock = threading.Lock()
+
+    async def start(self):
+        if self._task is not None:
+            return
+        # Модели не грузим: они поднимутся при первом батче или фоновом прогреве
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run(), name="ocr-worker")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        # Те, кто ещё ждёт в очереди, не должны висеть вечно
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("OCR worker остановлен"))
+
+    async def recognize(self, image):
+        """Ставит изображение в очередь и возвращает предсказание Surya для него."""
+        if self._task is None:
+            raise RuntimeError("OCR worker не запущен")
+
+        future = asyncio.get_running_loop().create_future()
+        # Backpressure: если очередь заполнена, ждём место не дольше enqueue_timeout
+        try:
+            await asyncio.wait_for(self._queue.put((image, future)), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            raise OcrQueueFullError("Слишком много изображений в очереди на распознавание")
+        return await future
+
+    async def recognize_crops(self, crops: list) -> list:
+        """
+        Распознаёт вырезанные строки одним небольшим батчем без детекции:
+        каждое изображение — ровно одна строка. Возвращает TextLine (или None) на каждое.
+        """
+        if not crops:
+            return []
+        predictions = await asyncio.to_thread(self._predict_crops, crops)
+        return [prediction.text_lines[0] if prediction.text_lines else None for prediction in predictions]
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _predict(self, images: list) -> list:
+        OCR_BATCH_SIZE.observe(len(images))
+        with self._model_lock, model_registry.using("recognition") as recognition_predictor, \
+                model_registry.using("detection") as detection_predictor:
+            detection = _TimedPredictor(detection_predictor)
+            started = time.perf_counter()
+            with stage("ocr_batch"):
+                predictions = recognition_predictor(images, det_predictor=detection)
+            # Детекция вызывается изнутри распознавания — остальное время батча приходится на распознавание
+            STAGE_SECONDS.observe(time.perf_counter() - started - detection.elapsed, stage="ocr_recognition")
+            return predictions
+
+    def _predict_crops(self, crops: list) -> list:
+        with self._model_lock, model_registry.using("recognition") as recognition_predictor:
+            with stage("ocr_refine_batch"):
+                # Готовые bbox на весь кадр — Surya пропускает детекцию
+                return recognition_predictor(crops, bboxes=[[[0, 0, crop.width, crop.height]] for crop in crops])
+
+    async def _collect_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # Хендлер мог уже отменить ожидание — такие изображения не распознаём
+        return [(image, future) for image, future in batch if not future.done()]
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            if not batch:
+                continue
+
+            images = [image for image, _ in batch]
+            try:
+                predictions = await asyncio.to_thread(self._predict, images)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(prediction)
+
+
+class _TimedPredictor:
+    """Обёртка детектора: меряет его вызовы, остальное делегирует исходному объекту."""
+
+    def __init__(self, predictor):
+        self._predictor = predictor
+        self.elapsed = 0.0
+
+    def __call__(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            with stage("ocr_detection"):
+                return self._predictor(*args, **kwargs)
+        finally:
+            self.elapsed += time.perf_counter() - started
+
+    def __getattr__(self, name):
+        return getattr(self._predictor, name)
+
+
+def _load_recognition_predictor():
+    # surya тянет за собой torch, поэтому импортируем его только при загрузке модели
+    from surya.foundation import FoundationPredictor
+    from surya.recognition import RecognitionPredictor
+
+    return RecognitionPredictor(FoundationPredictor())
+
+
+def _load_detection_predictor():
+    from surya.detection import DetectionPredictor
+
+    return DetectionPredictor()
+
+
+model_registry = ModelRegistry(idle_timeout=settings.models_idle_unload)
+model_registry.register("recognition", _load_recognition_predictor)
+model_registry.register("detection", _load_detection_predictor)
+
+ocr_worker = OcrWorker(
+    max_batch_size=settings.ocr_max_batch_size,
+    max_wait=settings.ocr_max_wait,
+    max_queue_size=settings.ocr_queue_size,
+)
+OCR_QUEUE_DEPTH.set_function(lambda: ocr_worker.queue_size)
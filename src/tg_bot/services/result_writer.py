@@ -0,0 +1,127 @@
+import asyncio
+import logging
+
+from ..config import settings
+from ..utils.metrics import registry, stage
+from .storage import AnalysisStorage, get_storage
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_ROWS = registry.histogram(
+    "labtracker_write_batch_rows", "Строк в одной групповой транзакции записи",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+# Сигнал воркеру записи: дописать собранное и завершиться
+_STOP = object()
+
+
+class ResultWriter:
+    """
+    Отложенная запись результатов сканов (write-behind).
+
+    Хендлеры отдают строки скана и ждут future; воркер собирает сканы,
+    пришедшие за max_delay секунд (или пока не наберётся max_batch_rows строк),
+    и пишет их одной транзакцией через AnalysisStorage.add_scans. Скан
+    попадает в базу целиком, при остановке очередь дописывается до конца.
+    Без target пишет в общее хранилище get_storage().
+    """
+
+    def __init__(self, target: AnalysisStorage | None = None, max_batch_rows: int = 500, max_delay: float = 0.05):
+        self._target = target
+        self.max_batch_rows = max_batch_rows
+        self.max_delay = max_delay
+
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def storage(self) -> AnalysisStorage:
+        return self._target if self._target is not None else get_storage()
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="result-writer")
+
+    async def stop(self):
+        """Дописывает всё, что уже принято, и останавливает воркер."""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        # Новые сканы после этого пишутся напрямую, очередь дочитывается до _STOP
+        await self._queue.put(_STOP)
+        await task
+
+    async def submit(self, rows: list[list]) -> int:
+        """Сохраняет строки одного скана; возвращает число реально добавленных строк."""
+        if not rows:
+            return 0
+        if self._task is None:
+            return await asyncio.to_thread(self.storage.add_rows, rows, True)
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((rows, future))
+        return await future
+
+    async def _collect_batch(self) -> tuple[list, bool]:
+        loop = asyncio.get_running_loop()
+        item = await self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        batch_rows = len(item[0])
+        deadline = loop.time() + self.max_delay
+
+        while batch_rows < self.max_batch_rows:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            batch_rows += len(item[0])
+        return batch, False
+
+    async def _run(self):
+        while True:
+            batch, stopping = await self._collect_batch()
+            if batch:
+                await self._write(batch)
+            if stopping:
+                return
+
+    async def _write(self, batch: list):
+        scans = [rows for rows, _ in batch]
+        WRITE_BATCH_ROWS.observe(sum(len(rows) for rows in scans))
+        try:
+            with stage("persist_batch"):
+                counts = await asyncio.to_thread(self.storage.add_scans, scans, True)
+        except Exception:
+            # Групповая транзакция откатилась — пишем сканы по одному, чтобы ошибка одного не задела остальные
+            logger.exception("Групповая запись %s сканов не удалась, пишу по одному", len(batch))
+            for rows, future in batch:
+                try:
+                    count = await asyncio.to_thread(self.storage.add_rows, rows, True)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(count)
+            return
+
+        for (_, future), count in zip(batch, counts):
+            if not future.done():
+                future.set_result(count)
+
+
+result_writer = ResultWriter(
+    max_batch_rows=settings.write_batch_max_rows,
+    max_delay=settings.write_batch_max_delay,
+)
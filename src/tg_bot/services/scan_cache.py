@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+from ..config import settings
+from ..utils.metrics import record_cache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    file_unique_id TEXT,
+    phash TEXT,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_entries_file ON entries(file_unique_id);
+CREATE INDEX IF NOT EXISTS ix_entries_phash ON entries(phash);
+CREATE INDEX IF NOT EXISTS ix_entries_last_used ON entries(last_used);
+"""
+
+
+@dataclass
+class CachedScan:
+    text_lines: list[dict]
+    csv_text: str | None
+
+
+def perceptual_hash(image: Image.Image, hash_size: int = 16) -> str:
+    """
+    dHash размером hash_size² бит в hex: устойчив к пережатию и масштабированию
+    одного и того же фото. Бланки одного шаблона дают близкие и даже равные
+    хэши, поэтому хэш — только часть ключа рядом с file_unique_id.
+    """
+    size = (hash_size + 1, hash_size)
+    pixels = np.asarray(image.convert('L').resize(size, Image.Resampling.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return np.packbits(bits).tobytes().hex()
+
+
+class ScanCache:
+    """
+    Дисковый кэш результатов распознавания.
+
+    Ключ — пара (file_unique_id из Telegram, перцептивный хэш изображения);
+    до скачивания файла ищем только по file_unique_id. По одному хэшу
+    записи не ищутся: бланки одного шаблона с другими значениями дают тот
+    же dHash, и чужой CSV попал бы в историю пользователя. Хранит text_lines
+    Surya и итоговый CSV, вытесняет давно не использованные записи, когда
+    суммарный размер превышает max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, hash_size: int = 16):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hash_size = hash_size
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    def get(self, file_unique_id: str, image: Image.Image | None = None) -> CachedScan | None:
+        cached = self._lookup(file_unique_id, image)
+        record_cache("scan", cached is not None)
+        return cached
+
+    def _lookup(self, file_unique_id: str, image: Image.Image | None) -> CachedScan | None:
+        if image is None:
+            query, params = "SELECT key FROM entries WHERE file_unique_id = ?", (file_unique_id,)
+        else:
+            query = "SELECT key FROM entries WHERE file_unique_id = ? AND phash = ?"
+            params = (file_unique_id, perceptual_hash(image, self.hash_size))
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+        if row is None:
+            return None
+        key = row[0]
+
+        try:
+            with open(self._path(key), encoding='utf-8') as file:
+                payload = json.load(file)
+        except (OSError, ValueError):
+            self._remove(key)
+            return None
+
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return CachedScan(text_lines=payload['text_lines'], csv_text=payload['csv'])
+
+    def put(self, file_unique_id: str, image: Image.Image | None, text_lines: list[dict], csv_text: str | None):
+        # Для документов (PDF) хэша изображения нет — ищем только по file_unique_id
+        phash = perceptual_hash(image, self.hash_size) if image is not None else None
+        key = hashlib.sha1(f"{file_unique_id}:{phash}".encode()).hexdigest()
+        data = json.dumps({'text_lines': text_lines, 'csv': csv_text}, ensure_ascii=False).encode('utf-8')
+
+        tmp_path = self._path(key) + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, self._path(key))
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, file_unique_id, phash, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, file_unique_id, phash, len(data), time.time()),
+            )
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+                if total <= self.max_bytes:
+                    break
+                victims.append(key)
+                total -= size
+        for key in victims:
+            self._remove(key)
+
+    def _remove(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+
+# Кэш создаётся при первом обращении: импорт модуля не создаёт каталог scan_cache
+_scan_cache: ScanCache | None = None
+_init_lock = threading.Lock()
+
+
+def get_scan_cache() -> ScanCache:
+    global _scan_cache
+    with _init_lock:
+        if _scan_cache is None:
+            _scan_cache = ScanCache(
+                settings.scan_cache_dir,
+                max_bytes=settings.scan_cache_max_bytes,
+            )
+        return _scan_cache
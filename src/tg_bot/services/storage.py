@@ -0,0 +1,425 @@
+import csv
+import os
+import sqlite3
+import sys
+import threading
+from datetime import date
+
+import pandas as pd
+
+from ..config import settings
+from ..utils.analyte_index import analyte_code
+from ..utils.result_normalization import normalize_results
+from ..utils.status_engine import compute_status
+
+RESULT_COLUMNS = [
+    'date', 'analysis', 'result', 'status', 'analyte_code', 'value', 'unit', 'qualifier',
+    'ref_low', 'ref_high', 'ref_unit', 'raw_date',
+]
+INSERT_COLUMNS = ['user_id', *RESULT_COLUMNS]
+_INSERT_SQL = (
+    f"INSERT INTO results ({', '.join(INSERT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(INSERT_COLUMNS))})"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    date TEXT,
+    analysis TEXT,
+    result TEXT,
+    status TEXT,
+    analyte_code TEXT,
+    value REAL,
+    unit TEXT,
+    qualifier TEXT,
+    ref_low REAL,
+    ref_high REAL,
+    ref_unit TEXT,
+    raw_date TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_results_user_date ON results(user_id, date);
+CREATE INDEX IF NOT EXISTS ix_results_user_analysis ON results(user_id, analysis);
+
+CREATE TABLE IF NOT EXISTS imports (
+    path TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    imported_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# Дата приведена к ISO (YYYY-MM-DD)
+_ISO_DATE_SQL = "date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"
+
+# Дата строки-курсора для постраничного чтения (курсор в callback data — только id строки)
+_CURSOR_DATE_SQL = "(SELECT date FROM results WHERE id = ? AND user_id = ?)"
+
+
+class AnalysisStorage:
+    """
+    Хранилище результатов анализов в SQLite (WAL).
+
+    Все выборки идут по одному пользователю через индексы (user_id, date),
+    (user_id, analysis) и (user_id, analyte_code), так что стоимость запроса
+    зависит от истории этого пользователя, а не от общего числа строк.
+
+    Рядом с исходным названием показателя хранится канонический код из
+    справочника (analyte_code), по нему группируются история и тренды.
+    Даты хранятся в ISO, а результат дополнительно разложен на value (REAL),
+    unit и qualifier («<», «>»), так что при чтении ничего не разбирается заново.
+    Нераспознанная дата хранится в raw_date при пустой date; такие строки
+    не попадают в выборки по датам (история, периоды, диапазон дат).
+    Референсный интервал хранится границами ref_low/ref_high и единицей
+    ref_unit: статус строки вычисляется по ним (utils/status_engine), его можно
+    пересчитать для всей истории (recompute_statuses) и фильтровать по нему.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        changed_users = self.backfill_analyte_codes()
+        if changed_users:
+            # Версия истории от UPDATE не меняется: сводки и графики по старым кодам сбрасываем явно
+            from .chart_cache import get_chart_cache
+            from .summary_cache import get_summary_cache
+            for user_id in changed_users:
+                get_summary_cache().invalidate(user_id, rows_updated=True)
+                get_chart_cache().invalidate(user_id)
+
+    def _migrate(self):
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(results)")}
+        with self._conn:
+            if 'raw_date' not in columns:
+                # Даты, не приведённые к ISO, уводим из date, чтобы не путать сравнение строк
+                self._conn.execute("ALTER TABLE results ADD COLUMN raw_date TEXT")
+                self._conn.execute(
+                    f"UPDATE results SET raw_date = date, date = NULL WHERE date IS NOT NULL AND NOT ({_ISO_DATE_SQL})"
+                )
+            if 'analyte_code' not in columns:
+                self._conn.execute("ALTER TABLE results ADD COLUMN analyte_code TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_results_user_code ON results(user_id, analyte_code, date)"
+            )
+            if 'value' not in columns:
+                self._conn.execute("ALTER TABLE results ADD COLUMN value REAL")
+                self._conn.execute("ALTER TABLE results ADD COLUMN unit TEXT")
+                self._conn.execute("ALTER TABLE results ADD COLUMN qualifier TEXT")
+                self._normalize_existing()
+            if 'ref_low' not in columns:
+                # Старые строки без референса: статус у них остаётся тем, что был при записи
+                self._conn.execute("ALTER TABLE results ADD COLUMN ref_low REAL")
+                self._conn.execute("ALTER TABLE results ADD COLUMN ref_high REAL")
+                self._conn.execute("ALTER TABLE results ADD COLUMN ref_unit TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_results_user_status ON results(user_id, status, date)"
+            )
+
+    def _normalize_existing(self):
+        """Однократно приводит строки, записанные до появления типизированных колонок."""
+        df = pd.read_sql_query("SELECT id, COALESCE(date, raw_date) AS date, result FROM results", self._conn)
+        if df.empty:
+            return
+        df = normalize_results(df)
+        self._conn.executemany(
+            "UPDATE results SET date = ?, raw_date = ?, value = ?, unit = ?, qualifier = ? WHERE id = ?",
+            _records(df[['date', 'raw_date', 'value', 'unit', 'qualifier', 'id']]),
+        )
+
+    def backfill_analyte_codes(self) -> set[int]:
+        """
+        Сверяет коды строк со справочником: проставляет их старым записям и
+        тем, чьи названия стали распознаваться, и исправляет коды, от которых
+        справочник теперь отказывается (более строгое сопоставление).
+        Возвращает пользователей, у которых коды изменились.
+        """
+        with self._lock:
+            pairs = self._conn.execute(
+                "SELECT DISTINCT analysis, analyte_code FROM results WHERE analysis IS NOT NULL"
+            ).fetchall()
+            updates = [(code, name) for name, old in pairs if (code := analyte_code(name)) != old]
+            users = set()
+            if updates:
+                with self._conn:
+                    for code, name in updates:
+                        users.update(row[0] for row in self._conn.execute(
+                            "SELECT DISTINCT user_id FROM results WHERE analysis = ? AND analyte_code IS NOT ?",
+                            (name, code),
+                        ))
+                    self._conn.executemany(
+                        "UPDATE results SET analyte_code = ? WHERE analysis = ? AND analyte_code IS NOT ?",
+                        [(code, name, code) for code, name in updates],
+                    )
+        return users
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def add_rows(self, rows: list[list], skip_existing: bool = False) -> int:
+        """
+        Добавляет строки вида [user_id, date, analysis, result, status(, reference)] одной транзакцией,
+        предварительно нормализуя их (см. _prepare_rows).
+        С skip_existing=True строки, уже сохранённые у пользователя
+        (та же дата, анализ и результат), повторно не записываются.
+        """
+        return self.add_scans([rows], skip_existing=skip_existing)[0]
+
+    def add_scans(self, scans: list[list[list]], skip_existing: bool = False) -> list[int]:
+        """
+        Записывает несколько сканов одной транзакцией (group commit) и
+        возвращает число добавленных строк каждого. Читатели видят либо
+        все строки скана, либо ни одной.
+        """
+        prepared_scans = [_prepare_rows(rows) for rows in scans]
+        counts = []
+        with self._lock, self._conn:
+            for prepared in prepared_scans:
+                if skip_existing and prepared:
+                    prepared = self._new_rows(prepared)
+                if prepared:
+                    self._conn.executemany(_INSERT_SQL, prepared)
+                counts.append(len(prepared))
+        return counts
+
+    def upsert_rows(self, rows: list[list]) -> tuple[int, int]:
+        """
+        Идемпотентная запись перепарсенных строк: ключ — (user_id, date, analysis).
+        Строки с тем же ключом обновляются (результат, статус и производные
+        колонки), остальные добавляются; повторы ключа внутри пакета и в базе
+        сопоставляются по порядку id. Возвращает (добавлено, обновлено);
+        повторный прогон с тем же результатом ничего не меняет.
+        """
+        groups: dict[tuple, list[tuple]] = {}
+        for row in _prepare_rows(rows):
+            groups.setdefault(row[:3], []).append(row)
+
+        inserted = updated = 0
+        value_columns = INSERT_COLUMNS[3:]
+        with self._lock, self._conn:
+            for key, new_rows in groups.items():
+                existing = self._conn.execute(
+                    f"SELECT id, {', '.join(value_columns)} FROM results "
+                    "WHERE user_id = ? AND date IS ? AND analysis = ? ORDER BY id",
+                    key,
+                ).fetchall()
+                for index, row in enumerate(new_rows):
+                    if index >= len(existing):
+                        self._conn.execute(_INSERT_SQL, row)
+                        inserted += 1
+                    elif tuple(existing[index][1:]) != row[3:]:
+                        self._conn.execute(
+                            f"UPDATE results SET {', '.join(f'{name} = ?' for name in value_columns)} WHERE id = ?",
+                            (*row[3:], existing[index][0]),
+                        )
+                        updated += 1
+        return inserted, updated
+
+    def recompute_statuses(self, user_id: int | None = None) -> set[int]:
+        """
+        Пересчитывает status по сохранённым значениям и референсам для всей
+        истории пользователя (или всех пользователей) одним проходом и
+        обновляет только изменившиеся строки. Возвращает пользователей,
+        у которых что-то изменилось: версия истории от UPDATE не меняется,
+        поэтому их кэш сводок нужно сбросить вызывающему.
+        """
+        query = "SELECT id, user_id, status, value, unit, qualifier, ref_low, ref_high, ref_unit FROM results"
+        params: list = []
+        if user_id is not None:
+            query += " WHERE user_id = ?"
+            params.append(user_id)
+
+        with self._lock:
+            df = pd.read_sql_query(query, self._conn, params=params)
+            if df.empty:
+                return set()
+            status = compute_status(df)
+            changed = df.assign(status=status)[status != df['status'].fillna('')]
+            if not changed.empty:
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE results SET status = ? WHERE id = ?", _records(changed[['status', 'id']])
+                    )
+        return {int(value) for value in changed['user_id'].unique()}
+
+    def _new_rows(self, rows: list[tuple]) -> list[tuple]:
+        seen = set()
+        new_rows = []
+        for row in rows:
+            key = row[:4]
+            if key in seen:
+                continue
+            seen.add(key)
+            exists = self._conn.execute(
+                "SELECT 1 FROM results WHERE user_id = ? AND date IS ? AND analysis = ? AND result = ? LIMIT 1",
+                key,
+            ).fetchone()
+            if not exists:
+                new_rows.append(row)
+        return new_rows
+
+    def get_user_rows(self, user_id: int, start: date | None = None, end: date | None = None,
+                      after_id: int | None = None, codes: list[str] | None = None,
+                      statuses: list[str] | None = None) -> pd.DataFrame:
+        """
+        Строки пользователя с датой за период [start, end] (границы включительно), по возрастанию даты.
+        after_id оставляет только строки, добавленные после строки с этим id,
+        codes — только показатели с этими каноническими кодами,
+        statuses — только строки с этими статусами (например, все отклонения за период).
+        """
+        query = f"SELECT {', '.join(RESULT_COLUMNS)} FROM results WHERE user_id = ? AND date IS NOT NULL"
+        params: list = [user_id]
+        if statuses is not None:
+            query += f" AND status IN ({', '.join('?' * len(statuses))})"
+            params.extend(statuses)
+        if codes is not None:
+            query += f" AND analyte_code IN ({', '.join('?' * len(codes))})"
+            params.extend(codes)
+        if after_id is not None:
+            query += " AND id > ?"
+            params.append(after_id)
+        if start is not None:
+            query += " AND date >= ?"
+            params.append(start.isoformat())
+        if end is not None:
+            query += " AND date <= ?"
+            params.append(end.isoformat())
+        query += " ORDER BY date, id"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+    def get_user_page(self, user_id: int, start: date | None = None, end: date | None = None,
+                      after: int | None = None, before: int | None = None,
+                      limit: int = 10, statuses: list[str] | None = None) -> tuple[pd.DataFrame, bool]:
+        """
+        Страница истории по курсору (date, id) без OFFSET: строки сразу после строки
+        с id after или непосредственно перед строкой before, всегда по возрастанию даты.
+        Курсор передаётся только id, дата строки берётся из базы.
+        Второй элемент — есть ли ещё строки в направлении листания.
+        statuses — как в get_user_rows.
+        """
+        query = f"SELECT id, {', '.join(RESULT_COLUMNS)} FROM results WHERE user_id = ? AND date IS NOT NULL"
+        params: list = [user_id]
+        if statuses is not None:
+            query += f" AND status IN ({', '.join('?' * len(statuses))})"
+            params.extend(statuses)
+        if start is not None:
+            query += " AND date >= ?"
+            params.append(start.isoformat())
+        if end is not None:
+            query += " AND date <= ?"
+            params.append(end.isoformat())
+        if before is not None:
+            query += f" AND (date, id) < ({_CURSOR_DATE_SQL}, ?) ORDER BY date DESC, id DESC"
+            params.extend([before, user_id, before])
+        else:
+            if after is not None:
+                query += f" AND (date, id) > ({_CURSOR_DATE_SQL}, ?)"
+                params.extend([after, user_id, after])
+            query += " ORDER BY date, id"
+        query += " LIMIT ?"
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if before is not None:
+            rows.reverse()
+        return pd.DataFrame(rows, columns=['id', *RESULT_COLUMNS]), has_more
+
+    def get_user_version(self, user_id: int) -> tuple[int, int] | None:
+        """Версия истории пользователя: (число строк, максимальный id); None, если строк нет."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), MAX(id) FROM results WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return None if row[0] == 0 else (row[0], row[1])
+
+    def get_user_date_range(self, user_id: int) -> tuple[str, str] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(date), MAX(date) FROM results WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return None if row[0] is None else row
+
+    def import_csv(self, path: str) -> int:
+        """
+        Однократно переносит строки из старого analysis_results.csv.
+        Повторный вызов для того же файла ничего не делает.
+        """
+        path = os.path.abspath(path)
+        if not os.path.exists(path):
+            return 0
+        with self._lock:
+            done = self._conn.execute("SELECT 1 FROM imports WHERE path = ?", (path,)).fetchone()
+        if done:
+            return 0
+
+        with open(path, newline='', encoding='utf-8') as file:
+            rows = [row for row in csv.reader(file) if row and row[0] != 'user_id']
+
+        prepared = _prepare_rows(rows)
+        with self._lock, self._conn:
+            self._conn.executemany(_INSERT_SQL, prepared)
+            self._conn.execute("INSERT INTO imports (path, rows) VALUES (?, ?)", (path, len(prepared)))
+        return len(prepared)
+
+
+def _prepare_row(row: list) -> tuple | None:
+    if len(row) < 5:
+        return None
+    try:
+        user_id = int(row[0])
+    except (TypeError, ValueError):
+        return None
+    reference = str(row[5]).strip() if len(row) > 5 and row[5] is not None else ''
+    return (user_id, *(str(value).strip() for value in row[1:5]), reference)
+
+
+def _prepare_rows(rows: list[list]) -> list[tuple]:
+    """
+    Стадия нормализации перед записью, одна на весь пакет: даты в ISO,
+    результат → value/unit/qualifier, референс → ref_low/ref_high/ref_unit,
+    статус — по референсу (compute_status), название → канонический код.
+    """
+    prepared = [row for row in map(_prepare_row, rows) if row is not None]
+    if not prepared:
+        return []
+    df = normalize_results(pd.DataFrame(
+        prepared, columns=['user_id', 'date', 'analysis', 'result', 'status', 'reference']
+    ))
+    df['status'] = compute_status(df)
+    df['analyte_code'] = df['analysis'].map(analyte_code)
+    return _records(df[INSERT_COLUMNS])
+
+
+def _records(df: pd.DataFrame) -> list[tuple]:
+    # NaN → NULL, numpy-скаляры → встроенные типы Python
+    return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+
+# Хранилище открывается при первом обращении: импорт модуля не создаёт базу
+_storage: AnalysisStorage | None = None
+_init_lock = threading.Lock()
+
+
+def get_storage() -> AnalysisStorage:
+    global _storage
+    with _init_lock:
+        if _storage is None:
+            _storage = AnalysisStorage(settings.db_path)
+        return _storage
+
+
+if __name__ == "__main__":
+    # python -m src.tg_bot.services.storage analysis_results.csv
+    for csv_path in sys.argv[1:] or [settings.legacy_csv_path]:
+        print(f"{csv_path}: импортировано строк — {get_storage().import_csv(csv_path)}")
@@ -0,0 +1,136 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from ..config import settings
+from ..models.analysis_models import AnalysisResult
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    user_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    max_row_id INTEGER NOT NULL,
+    summary TEXT NOT NULL,
+    generated_at TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (user_id, kind, prompt_hash)
+);
+CREATE INDEX IF NOT EXISTS ix_summaries_last_used ON summaries(last_used);
+"""
+
+
+@dataclass
+class CachedSummary:
+    result: AnalysisResult
+    # Версия истории, по которой построена сводка: число строк и максимальный id строки
+    row_count: int
+    max_row_id: int
+
+    @property
+    def version(self) -> tuple[int, int]:
+        return self.row_count, self.max_row_id
+
+
+def prompt_key(prompt: str | None) -> str:
+    if not prompt:
+        return ''
+    normalized = ' '.join(prompt.lower().split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+class SummaryCache:
+    """
+    Постоянный кэш сводок /analyse и ответов /ask.
+
+    Запись привязана к версии истории пользователя (row_count, max_row_id):
+    если история не менялась, сводка возвращается без обращения к YandexGPT,
+    а при дописанных строках сводку /analyse можно обновить по дельте.
+    Вытеснение — по TTL и по числу записей (давно не использованные первыми).
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def get(self, user_id: int, kind: str, prompt: str | None = None) -> CachedSummary | None:
+        key = (user_id, kind, prompt_key(prompt))
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT row_count, max_row_id, summary, generated_at, last_used FROM summaries "
+                "WHERE user_id = ? AND kind = ? AND prompt_hash = ?",
+                key,
+            ).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[4] > self.ttl_seconds:
+                self._conn.execute(
+                    "DELETE FROM summaries WHERE user_id = ? AND kind = ? AND prompt_hash = ?", key
+                )
+                return None
+            self._conn.execute(
+                "UPDATE summaries SET last_used = ? WHERE user_id = ? AND kind = ? AND prompt_hash = ?",
+                (time.time(), *key),
+            )
+        result = AnalysisResult(user_id=user_id, summary=row[2], generated_at=datetime.fromisoformat(row[3]))
+        return CachedSummary(result=result, row_count=row[0], max_row_id=row[1])
+
+    def put(self, result: AnalysisResult, kind: str, version: tuple[int, int], prompt: str | None = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries "
+                "(user_id, kind, prompt_hash, row_count, max_row_id, summary, generated_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (result.user_id, kind, prompt_key(prompt), *version,
+                 result.summary, result.generated_at.isoformat(), time.time()),
+            )
+            self._evict()
+
+    def invalidate(self, user_id: int, rows_updated: bool = False):
+        """
+        Вызывается после записи новых строк пользователя. Ответы на вопросы
+        удаляются; сводка /analyse остаётся как база для инкрементального
+        обновления, но её версия уже не совпадёт с историей.
+
+        rows_updated — прежние строки изменились (UPDATE): версия истории
+        (row_count, max_row_id) от этого не меняется, и сводка /analyse
+        отдавалась бы устаревшей, поэтому удаляется и она.
+        """
+        with self._lock, self._conn:
+            if rows_updated:
+                self._conn.execute("DELETE FROM summaries WHERE user_id = ?", (user_id,))
+            else:
+                self._conn.execute("DELETE FROM summaries WHERE user_id = ? AND prompt_hash != ''", (user_id,))
+
+    def _evict(self):
+        self._conn.execute("DELETE FROM summaries WHERE last_used < ?", (time.time() - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM summaries WHERE rowid IN ("
+            "SELECT rowid FROM summaries ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+# Кэш открывается при первом обращении: импорт модуля не создаёт базу
+_summary_cache: SummaryCache | None = None
+_init_lock = threading.Lock()
+
+
+def get_summary_cache() -> SummaryCache:
+    global _summary_cache
+    with _init_lock:
+        if _summary_cache is None:
+            _summary_cache = SummaryCache(
+                settings.db_path,
+                max_entries=settings.summary_cache_max_entries,
+                ttl_seconds=settings.summary_cache_ttl_days * 24 * 3600,
+            )
+        return _summary_cache
@@ -0,0 +1,247 @@
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+# Канонический справочник: код → (название, синонимы). Синонимы нормализуются так же, как названия из OCR.
+ANALYTES = {
+    'HGB': ('Гемоглобин', ('гемоглобин', 'hgb', 'hemoglobin', 'hb общий')),
+    'HCT': ('Гематокрит', ('гематокрит', 'hct')),
+    'RBC': ('Эритроциты', ('эритроциты', 'rbc')),
+    'WBC': ('Лейкоциты', ('лейкоциты', 'wbc')),
+    'PLT': ('Тромбоциты', ('тромбоциты', 'plt')),
+    'NEUT': ('Нейтрофилы', ('нейтрофилы', 'neut')),
+    'LYMPH': ('Лимфоциты', ('лимфоциты', 'lymph')),
+    'MONO': ('Моноциты', ('моноциты', 'mono')),
+    'EOS': ('Эозинофилы', ('эозинофилы', 'eos')),
+    'BASO': ('Базофилы', ('базофилы', 'baso')),
+    'ESR': ('СОЭ', ('соэ', 'esr', 'скорость оседания эритроцитов')),
+    'MCV': ('Средний объём эритроцита', ('mcv', 'средний объем эритроцита')),
+    'MCH': ('Среднее содержание гемоглобина в эритроците', ('mch', 'среднее содержание гемоглобина')),
+    'MCHC': ('Средняя концентрация гемоглобина в эритроците', ('mchc', 'средняя концентрация гемоглобина')),
+    'GLU': ('Глюкоза', ('глюкоза', 'glucose', 'glu', 'сахар крови')),
+    'HBA1C': ('Гликированный гемоглобин', ('hba1c', 'гликированный гемоглобин', 'гликированный hb', 'гликогемоглобин')),
+    'INS': ('Инсулин', ('инсулин', 'insulin')),
+    'CHOL': ('Холестерин общий', ('холестерин', 'холестерин общий', 'общий холестерин', 'cholesterol', 'chol')),
+    'HDL': ('Холестерин ЛПВП', ('лпвп', 'холестерин лпвп', 'hdl', 'hdl cholesterol', 'липопротеины высокой плотности')),
+    'LDL': ('Холестерин ЛПНП', ('лпнп', 'холестерин лпнп', 'ldl', 'ldl cholesterol', 'липопротеины низкой плотности')),
+    'TG': ('Триглицериды', ('триглицериды', 'tg', 'triglycerides')),
+    'TSH': ('ТТГ', ('ттг', 'tsh', 'тиреотропный гормон')),
+    'FT3': ('Свободный Т3', ('ft3', 'свободный т3', 'т3 свободный', 'трийодтиронин свободный')),
+    'FT4': ('Свободный Т4', ('ft4', 'свободный т4', 'т4 свободный', 'тироксин свободный')),
+    'ATPO': ('Антитела к ТПО', ('ат тпо', 'ат к тпо', 'антитела к тпо', 'anti tpo', 'антитела к тиреопероксидазе')),
+    'FERR': ('Ферритин', ('ферритин', 'ferritin')),
+    'FE': ('Железо', ('железо', 'железо сывороточное', 'iron')),
+    'B12': ('Витамин B12', ('витамин в12', 'витамин b12', 'b12', 'цианокобаламин', 'кобаламин')),
+    'FOL': ('Фолиевая кислота', ('фолиевая кислота', 'фолаты', 'витамин в9', 'витамин b9', 'folate')),
+    'VITD': ('Витамин D', ('витамин d', 'витамин д', '25 он витамин d', '25 oh витамин d', '25 oh vitamin d', 'vitamin d', 'кальцидиол')),
+    'MG': ('Магний', ('магний', 'magnesium', 'mg')),
+    'CA': ('Кальций общий', ('кальций', 'кальций общий', 'calcium')),
+    'CA_ION': ('Кальций ионизированный', ('кальций ионизированный', 'ионизированный кальций', 'ca2', 'ca ion')),
+    'K': ('Калий', ('калий', 'potassium')),
+    'NA': ('Натрий', ('натрий', 'sodium')),
+    'ZN': ('Цинк', ('цинк', 'zinc', 'zn')),
+    'CREA': ('Креатинин', ('креатинин', 'creatinine', 'crea')),
+    'UREA': ('Мочевина', ('мочевина', 'urea')),
+    'UA': ('Мочевая кислота', ('мочевая кислота', 'uric acid')),
+    'ALT': ('АЛТ', ('алт', 'alt', 'аланинаминотрансфераза')),
+    'AST': ('АСТ', ('аст', 'ast', 'аспартатаминотрансфераза')),
+    'GGT': ('ГГТ', ('ггт', 'ggt', 'гамма гт', 'гамма глутамилтрансфераза')),
+    'ALP': ('Щелочная фосфатаза', ('щелочная фосфатаза', 'alp')),
+    'TBIL': ('Билирубин общий', ('билирубин', 'билирубин общий', 'bilirubin')),
+    'TP': ('Общий белок', ('общий белок', 'белок общий', 'total protein')),
+    'ALB': ('Альбумин', ('альбумин', 'albumin')),
+    'CK': ('Креатинкиназа', ('креатинкиназа', 'креатинкиназа общая', 'кфк', 'ck')),
+    'CRP': ('С-реактивный белок', ('срб', 'с реактивный белок', 'crp')),
+    'PTI': ('Протромбиновый индекс', ('протромбиновый индекс', 'пти', 'протромбин по квику', 'протромбиновый индекс по квику')),
+    'INR': ('МНО', ('мно', 'inr', 'международное нормализованное отношение')),
+    'APTT': ('АЧТВ', ('ачтв', 'aptt', 'активированное частичное тромбопластиновое время')),
+    'FIB': ('Фибриноген', ('фибриноген', 'fibrinogen')),
+    'TESTO': ('Тестостерон', ('тестостерон', 'testosterone')),
+    'PRL': ('Пролактин', ('пролактин', 'prolactin')),
+    'CORT': ('Кортизол', ('кортизол', 'cortisol')),
+    'E2': ('Эстрадиол', ('эстрадиол', 'estradiol')),
+}
+
+# Похожие по начертанию греческие и латинские буквы, которые OCR путает с кириллицей
+_GREEK_TO_CYRILLIC = str.maketrans('ΑΒΓΕΗΙΚΜΝΟΠΡΤΥΧαβγεηικμνοπρτυχ', 'АВГЕНІКМНОПРТУХавгенікмнопртух')
+_LATIN_TO_CYRILLIC = str.maketrans('ABCEHKMOPTXYaceopxy', 'АВСЕНКМОРТХУасеорху')
+
+# Слова, которые могут стоять рядом с названием, не меняя показатель: материал
+# «кровь/сыворотка/плазма» и уточнения вроде «общий». Всё остальное, что осталось
+# вне совпадения («в моче», «прямой», «МВ», другая буква или номер витамина), —
+# уже другой анализ, и такое название в справочник не попадает
+NOISE_TOKENS = {
+    'в', 'из', 'кровь', 'крови', 'сыворотка', 'сыворотке', 'сыворотки', 'плазма', 'плазме', 'плазмы',
+    'венозная', 'венозной', 'капиллярная', 'капиллярной', 'цельная', 'цельной', 'общий', 'общая', 'общее',
+}
+# Нечёткое сравнение только для названий не короче стольких символов
+FUZZY_MIN_LENGTH = 8
+
+_CYRILLIC_RE = re.compile('[а-яё]', re.IGNORECASE)
+_PARENS_RE = re.compile(r'\(([^)]*)\)')
+_LETTER_DIGIT_RE = re.compile(r'(?<=[^\W\d_])(?=\d)|(?<=\d)(?=[^\W\d_])')
+_TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+def normalize(name: str) -> str:
+    """
+    Нормализует название показателя: греческие/латинские двойники кириллицы,
+    регистр, ё→е, отделение цифр от букв («В12» → «в 12»), пунктуация → пробелы.
+    """
+    name = name.translate(_GREEK_TO_CYRILLIC)
+    tokens = []
+    for token in name.split():
+        if _CYRILLIC_RE.search(token):
+            token = token.translate(_LATIN_TO_CYRILLIC)
+        tokens.append(token)
+    name = ' '.join(tokens).lower().replace('ё', 'е')
+    name = _LETTER_DIGIT_RE.sub(' ', name)
+    return ' '.join(_TOKEN_RE.findall(name))
+
+
+def _is_noise(tokens: list[str]) -> bool:
+    """Только материал/уточнения или внутренний код лаборатории вроде «A2»."""
+    return all(
+        token in NOISE_TOKENS or (len(token) <= 2 and not _CYRILLIC_RE.search(token))
+        for token in tokens
+    )
+
+
+def _short_tokens(tokens: list[str]) -> list[str]:
+    # Короткие токены и числа различают показатели («витамин b 6» и «b 12», «ат тг» и «ат тпо»)
+    return sorted(token for token in tokens if len(token) <= 3 or any(char.isdigit() for char in token))
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AnalyteIndex:
+    """
+    Индекс канонических показателей: префиксное дерево по токенам синонимов
+    и триграммное сходство для названий с ошибками OCR.
+
+    Совпадение должно покрывать название целиком: вне синонима допускаются
+    только слова из NOISE_TOKENS, уточнение метода («по Вестергрену») и
+    другое написание того же показателя. Нечёткий поиск сравнивает названия
+    с тем же числом слов и теми же короткими токенами и выключен для
+    коротких названий.
+    """
+
+    def __init__(self, analytes: dict[str, tuple[str, tuple[str, ...]]], min_similarity: float = 0.7):
+        self.analytes = analytes
+        self.min_similarity = min_similarity
+        self._trie: dict = {}
+        self._synonyms: list[tuple[str, str]] = []
+        self._trigram_index: dict[str, list[int]] = defaultdict(list)
+
+        for code, (display_name, synonyms) in analytes.items():
+            for synonym in (display_name, *synonyms):
+                normalized = normalize(synonym)
+                if not normalized:
+                    continue
+                node = self._trie
+                for token in normalized.split():
+                    node = node.setdefault(token, {})
+                node.setdefault(None, code)
+
+                synonym_id = len(self._synonyms)
+                self._synonyms.append((normalized, code))
+                for gram in _trigrams(normalized):
+                    self._trigram_index[gram].append(synonym_id)
+
+    def display_name(self, code: str) -> str:
+        return self.analytes[code][0]
+
+    def lookup(self, name: str) -> str | None:
+        """Канонический код для названия показателя из бланка или None."""
+        code = self._covering_match(normalize(name).split())
+        if code is not None:
+            return code
+
+        # «FT3/Свободный Т3 (A2)»: части через «/» и текст в скобках должны назвать один показатель,
+        # части из одного материала или кода лаборатории пропускаем, любая другая часть («(в моче)») — отказ
+        without_parens = _PARENS_RE.sub(' ', name)
+        parts = [part for part in without_parens.split('/') if part.strip()] + _PARENS_RE.findall(name)
+        codes = set()
+        for part in parts:
+            tokens = normalize(part).split()
+            if not tokens or _is_noise(tokens):
+                continue
+            code = self._covering_match(tokens) or self._similar(tokens)
+            if code is None:
+                return None
+            codes.add(code)
+        return codes.pop() if len(codes) == 1 else None
+
+    def find_in_text(self, text: str) -> set[str]:
+        """Все коды показателей, упомянутые в свободном тексте (например, в вопросе /ask)."""
+        tokens = normalize(text).split()
+        codes = set()
+        for start in range(len(tokens)):
+            node = self._trie
+            for token in tokens[start:]:
+                node = node.get(token)
+                if node is None:
+                    break
+                if None in node:
+                    codes.add(node[None])
+        return codes
+
+    def _covering_match(self, tokens: list[str]) -> str | None:
+        """Самый длинный синоним, вне которого в названии остались только допустимые слова."""
+        best = None
+        for start in range(len(tokens)):
+            node = self._trie
+            length = 0
+            for end in range(start, len(tokens)):
+                node = node.get(tokens[end])
+                if node is None:
+                    break
+                length += len(tokens[end])
+                if None in node and (best is None or length > best[0]) \
+                        and self._allowed_rest(tokens[:start], tokens[end + 1:], node[None]):
+                    best = (length, node[None])
+        return best[1] if best else None
+
+    def _allowed_rest(self, before: list[str], after: list[str], code: str) -> bool:
+        # Уточнение метода в конце: «СОЭ по Вестергрену», «… по Квику»
+        if after and after[0] == 'по':
+            after = []
+        rest = [token for token in before + after if token not in NOISE_TOKENS]
+        # Остаток может быть другим написанием того же показателя: «Гемоглобин HGB»
+        return not rest or self._covering_match(rest) == code
+
+    def _similar(self, tokens: list[str]) -> str | None:
+        tokens = [token for token in tokens if token not in NOISE_TOKENS]
+        normalized = ' '.join(tokens)
+        if len(normalized) < FUZZY_MIN_LENGTH:
+            return None
+        short = _short_tokens(tokens)
+        grams = _trigrams(normalized)
+        overlaps: dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for synonym_id in self._trigram_index.get(gram, ()):
+                overlaps[synonym_id] += 1
+
+        best_code, best_score = None, 0.0
+        for synonym_id, overlap in overlaps.items():
+            synonym, code = self._synonyms[synonym_id]
+            synonym_tokens = synonym.split()
+            # OCR путает буквы, но не добавляет слов; короткие токены должны совпасть точно
+            if len(synonym_tokens) != len(tokens) or _short_tokens(synonym_tokens) != short:
+                continue
+            # коэффициент Дайса по триграммам
+            score = 2 * overlap / (len(grams) + len(_trigrams(synonym)))
+            if score > best_score:
+                best_code, best_score = code, score
+        return best_code if best_score >= self.min_similarity else None
+
+
+analyte_index = AnalyteIndex(ANALYTES)
+
+
+@lru_cache(maxsize=4096)
+def analyte_code(name: str) -> str | None:
+    return analyte_index.lookup(name)
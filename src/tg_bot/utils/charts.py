@@ -0,0 +1,86 @@
+import io
+from dataclasses import dataclass
+from datetime import date
+
+import matplotlib
+
+# Без дисплея и без глобального состояния pyplot: фигуры создаются напрямую через Figure
+matplotlib.use('Agg')
+
+import numpy as np
+from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+from matplotlib.figure import Figure
+
+# Цвета точек: в норме и с отклонением
+OK_COLOR = '#1f77b4'
+ABNORMAL_COLOR = '#d62728'
+BAND_COLOR = '#2ca02c'
+
+
+@dataclass
+class TrendSeries:
+    """Точки одного показателя для графика; только встроенные типы, чтобы передавать в процесс пула."""
+    title: str
+    unit: str | None
+    dates: list[str]
+    values: list[float]
+    # Границы референса у каждой точки (None — граница не указана)
+    ref_low: list[float | None]
+    ref_high: list[float | None]
+    abnormal: list[bool]
+
+
+def render_trend_chart(series: TrendSeries, width: float = 8.0, height: float = 4.5, dpi: int = 120) -> bytes:
+    """
+    PNG с динамикой показателя: значения по датам и закрашенная полоса
+    референса. Референс может меняться между точками (разные лаборатории) —
+    тогда полоса идёт ступеньками; открытая граница продолжается до края оси.
+    """
+    dates = np.array([date.fromisoformat(value) for value in series.dates], dtype='datetime64[D]')
+    values = np.array(series.values, dtype=float)
+    low = np.array([np.nan if value is None else value for value in series.ref_low], dtype=float)
+    high = np.array([np.nan if value is None else value for value in series.ref_high], dtype=float)
+    abnormal = np.array(series.abnormal, dtype=bool)
+
+    figure = Figure(figsize=(width, height), dpi=dpi)
+    axes = figure.add_subplot()
+
+    bounds = np.concatenate([values, low[np.isfinite(low)], high[np.isfinite(high)]])
+    bottom, top = float(bounds.min()), float(bounds.max())
+    margin = (top - bottom) * 0.1 or abs(top) * 0.1 or 1.0
+    bottom, top = bottom - margin, top + margin
+
+    has_band = np.isfinite(low) | np.isfinite(high)
+    if has_band.any():
+        band_low = np.where(np.isfinite(low), low, bottom)
+        band_high = np.where(np.isfinite(high), high, top)
+        if len(dates) == 1 or (np.unique(band_low[has_band]).size == 1 and np.unique(band_high[has_band]).size == 1
+                               and has_band.all()):
+            axes.axhspan(band_low[has_band][0], band_high[has_band][0], color=BAND_COLOR, alpha=0.15, label='норма')
+        else:
+            axes.fill_between(dates, band_low, band_high, where=has_band, step='mid',
+                              color=BAND_COLOR, alpha=0.15, label='норма')
+
+    axes.plot(dates, values, color=OK_COLOR, linewidth=1.5, zorder=2)
+    axes.scatter(dates, values, c=np.where(abnormal, ABNORMAL_COLOR, OK_COLOR), s=36, zorder=3)
+    if abnormal.any():
+        axes.scatter([], [], c=ABNORMAL_COLOR, s=36, label='вне нормы')
+
+    axes.set_ylim(bottom, top)
+    if len(dates) == 1:
+        # Одна точка: ось дат шириной в месяц вокруг неё
+        axes.set_xlim(dates[0] - np.timedelta64(15, 'D'), dates[0] + np.timedelta64(15, 'D'))
+    locator = AutoDateLocator()
+    axes.xaxis.set_major_locator(locator)
+    axes.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+    axes.set_title(series.title)
+    if series.unit:
+        axes.set_ylabel(series.unit)
+    axes.grid(True, alpha=0.3)
+    if axes.get_legend_handles_labels()[0]:
+        axes.legend(loc='best', fontsize='small')
+    figure.tight_layout()
+
+    output = io.BytesIO()
+    figure.savefig(output, format='png')
+    return output.getvalue()
@@ -0,0 +1,166 @@
+import math
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image, ImageOps
+
+
+@dataclass
+class PreprocessedImage:
+    """Подготовленное для OCR изображение и всё, что нужно для возврата bbox в исходные координаты."""
+    image: Image.Image
+    original_size: tuple[int, int]
+    scale: float = 1.0
+    crop_offset: tuple[int, int] = (0, 0)
+    angle: float = 0.0
+    # Аффинная матрица PIL (выход → вход) для поворота при deskew
+    rotation_matrix: tuple[float, ...] | None = None
+
+    def to_original(self, points: list[list[float]]) -> list[list[float]]:
+        """Переводит точки из координат подготовленного изображения в исходные (после EXIF-поворота)."""
+        result = []
+        for x, y in points:
+            if self.rotation_matrix is not None:
+                a, b, c, d, e, f = self.rotation_matrix
+                x, y = a * x + b * y + c, d * x + e * y + f
+            x = (x + self.crop_offset[0]) / self.scale
+            y = (y + self.crop_offset[1]) / self.scale
+            result.append([float(x), float(y)])
+        return result
+
+    def bbox_to_original(self, bbox: list[float]) -> list[float]:
+        x0, y0, x1, y1 = bbox
+        points = np.array(self.to_original([[x0, y0], [x1, y0], [x1, y1], [x0, y1]]))
+        return [*points.min(axis=0).tolist(), *points.max(axis=0).tolist()]
+
+
+def preprocess_image(
+    image: Image.Image,
+    max_side: int = 2048,
+    target_dpi: int | None = None,
+    grayscale: bool = True,
+    crop_page: bool = False,
+    deskew: bool = False,
+) -> PreprocessedImage:
+    """
+    Готовит фото бланка к OCR: EXIF-ориентация, оттенки серого с автоконтрастом,
+    уменьшение до target_dpi (если в файле есть DPI) и не больше max_side по
+    длинной стороне, по желанию — обрезка по листу и выравнивание наклона.
+    """
+    dpi = image.info.get('dpi')
+    image = ImageOps.exif_transpose(image)
+    original_size = image.size
+
+    if grayscale:
+        image = ImageOps.autocontrast(image.convert('L'), cutoff=1)
+
+    scale = 1.0
+    if target_dpi and dpi and dpi[0]:
+        scale = min(scale, target_dpi / float(dpi[0]))
+    if max_side:
+        scale = min(scale, max_side / max(image.size))
+    if scale < 1.0:
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.Resampling.LANCZOS)
+        # Фактический масштаб после округления размеров
+        scale = image.width / original_size[0]
+
+    prepared = PreprocessedImage(image=image, original_size=original_size, scale=scale)
+
+    if crop_page:
+        page_box = _detect_page(image)
+        if page_box is not None:
+            prepared.image = image = image.crop(page_box)
+            prepared.crop_offset = page_box[:2]
+
+    if deskew:
+        angle = _estimate_skew(image)
+        if angle:
+            fill = 255 if image.mode == 'L' else (255, 255, 255)
+            prepared.rotation_matrix = _rotation_matrix(image.size, angle)
+            prepared.image = image.rotate(angle, resample=Image.Resampling.BICUBIC, expand=True, fillcolor=fill)
+            prepared.angle = angle
+
+    prepared.image = prepared.image.convert('RGB')
+    return prepared
+
+
+def enhance_crop(image: Image.Image, bbox: list[float], scale: float = 2.0, padding: int = 4) -> Image.Image:
+    """
+    Вырезает строку по bbox (с полями padding px) для повторного OCR:
+    оттенки серого с автоконтрастом и увеличение в scale раз.
+    """
+    x0, y0, x1, y1 = bbox
+    box = (
+        max(0, math.floor(x0) - padding),
+        max(0, math.floor(y0) - padding),
+        min(image.width, math.ceil(x1) + padding),
+        min(image.height, math.ceil(y1) + padding),
+    )
+    crop = ImageOps.autocontrast(image.crop(box).convert('L'), cutoff=1)
+    if scale != 1.0:
+        size = (max(1, round(crop.width * scale)), max(1, round(crop.height * scale)))
+        crop = crop.resize(size, Image.Resampling.LANCZOS)
+    return crop.convert('RGB')
+
+
+def _otsu_threshold(pixels: np.ndarray) -> float:
+    histogram = np.bincount(pixels.ravel(), minlength=256).astype(float)
+    weights = np.cumsum(histogram)
+    means = np.cumsum(histogram * np.arange(256))
+    total_weight, total_mean = weights[-1], means[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (total_mean * weights - means * total_weight) ** 2 / (weights * (total_weight - weights))
+    return float(np.nanargmax(between))
+
+
+def _detect_page(image: Image.Image) -> tuple[int, int, int, int] | None:
+    """Ищет светлый лист на тёмном фоне по проекциям маски; None, если лист не выделяется."""
+    pixels = np.asarray(image.convert('L'))
+    mask = pixels > _otsu_threshold(pixels)
+    rows = np.flatnonzero(mask.mean(axis=1) > 0.5)
+    cols = np.flatnonzero(mask.mean(axis=0) > 0.5)
+    if rows.size == 0 or cols.size == 0:
+        return None
+    box = (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    # Слишком маленькая «страница» — скорее всего ошибка детекции
+    if area < 0.3 * image.width * image.height or box == (0, 0, image.width, image.height):
+        return None
+    return box
+
+
+def _estimate_skew(image: Image.Image, max_angle: float = 5.0, step: float = 0.25) -> float:
+    """Угол наклона текста по методу проекционного профиля (строки дают самые «резкие» суммы)."""
+    small = image.convert('L')
+    small.thumbnail((800, 800))
+    pixels = np.asarray(small)
+    ink = Image.fromarray(((pixels < _otsu_threshold(pixels)) * 255).astype(np.uint8))
+
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_angle, max_angle + step, step):
+        rotated = np.asarray(ink.rotate(float(angle), resample=Image.Resampling.NEAREST), dtype=np.float32)
+        score = float(np.var(rotated.sum(axis=1)))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def _rotation_matrix(size: tuple[int, int], angle: float) -> tuple[float, ...]:
+    # Та же матрица (выход → вход), что строит Image.rotate(angle, expand=True)
+    w, h = size
+    center_x, center_y = w / 2.0, h / 2.0
+    radians = -math.radians(angle)
+    a, b = round(math.cos(radians), 15), round(math.sin(radians), 15)
+    d, e = round(-math.sin(radians), 15), round(math.cos(radians), 15)
+    c = a * -center_x + b * -center_y + center_x
+    f = d * -center_x + e * -center_y + center_y
+
+    xs, ys = [], []
+    for x, y in ((0, 0), (w, 0), (w, h), (0, h)):
+        xs.append(a * x + b * y + c)
+        ys.append(d * x + e * y + f)
+    new_w = math.ceil(max(xs)) - math.floor(min(xs))
+    new_h = math.ceil(max(ys)) - math.floor(min(ys))
+    shift_x, shift_y = -(new_w - w) / 2.0, -(new_h - h) / 2.0
+    return a, b, a * shift_x + b * shift_y + c, d, e, d * shift_x + e * shift_y + f
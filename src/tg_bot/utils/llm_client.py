@@ -0,0 +1,238 @@
+import asyncio
+import random
+import time
+from typing import AsyncIterator
+
+from yandex_cloud_ml_sdk import AsyncYCloudML
+
+from ..config import settings
+from .metrics import LLM_REQUESTS, record_error, record_llm_usage, stage
+from .ycloud_client import get_async_ycloud_sdk
+
+
+class CircuitOpenError(Exception):
+    """Бэкенд LLM признан недоступным, запросы временно не отправляются."""
+
+
+class CircuitBreaker:
+    """
+    Простой предохранитель: после failure_threshold ошибок подряд размыкается
+    на reset_timeout секунд, затем пропускает один пробный запрос.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def before_call(self) -> bool:
+        """Пропускает вызов или бросает CircuitOpenError; True — вызов пробный (half-open)."""
+        if self._opened_at is None:
+            return False
+        if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+            raise CircuitOpenError("YandexGPT временно недоступен, попробуйте позже")
+        # half-open: пропускаем один пробный запрос
+        self._trial_in_flight = True
+        return True
+
+    def release_trial(self):
+        """Пробный вызов прерван без исхода (отмена) — следующий запрос снова сможет стать пробным."""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._trial_in_flight = False
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+
+class LLMClient:
+    """
+    Общий асинхронный клиент YandexGPT.
+
+    Переиспользует один экземпляр SDK и хендлы моделей, ограничивает число
+    одновременных запросов семафором, ставит таймаут на каждый вызов,
+    повторяет неудачные вызовы с экспоненциальной задержкой и джиттером
+    и размыкает предохранитель, если бэкенд стабильно падает.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        timeout: float = 60.0,
+        retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        breaker_threshold: int = 5,
+        breaker_reset: float = 30.0,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._sdk: AsyncYCloudML | None = None
+        self._models: dict[tuple, object] = {}
+
+    @property
+    def sdk(self) -> AsyncYCloudML:
+        if self._sdk is None:
+            self._sdk = get_async_ycloud_sdk()
+        return self._sdk
+
+    def model(self, name: str = "yandexgpt", temperature: float | None = None):
+        key = (name, temperature)
+        model = self._models.get(key)
+        if model is None:
+            model = self.sdk.models.completions(name)
+            if temperature is not None:
+                model = model.configure(temperature=temperature)
+            self._models[key] = model
+        return model
+
+    async def complete(self, prompt: str, model: str = "yandexgpt", temperature: float | None = None) -> str:
+        """Возвращает текст первой альтернативы ответа модели."""
+        result = await self.run(prompt, model=model, temperature=temperature)
+        return result.alternatives[0].text
+
+    async def run(self, prompt: str, model: str = "yandexgpt", temperature: float | None = None):
+        handle = self.model(model, temperature)
+
+        for attempt in range(self.retries + 1):
+            trial = self._before_call()
+            try:
+                async with self._semaphore:
+                    with stage("llm_call"):
+                        result = await asyncio.wait_for(
+                            handle.run(prompt, timeout=self.timeout), self.timeout
+                        )
+            except Exception as e:
+                LLM_REQUESTS.inc(outcome="timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+                self.breaker.record_failure()
+                if attempt >= self.retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+            except BaseException:
+                if trial:
+                    self.breaker.release_trial()
+                raise
+            else:
+                LLM_REQUESTS.inc(outcome="success")
+                record_llm_usage(result)
+                self.breaker.record_success()
+                return result
+
+    async def stream(self, prompt: str, model: str = "yandexgpt",
+                     temperature: float | None = None) -> AsyncIterator[str]:
+        """
+        Потоковый вызов (run_stream): отдаёт накопленный текст первой альтернативы
+        по мере генерации. Повтор с задержкой возможен только до первого фрагмента —
+        после него ошибка пробрасывается, чтобы не показывать ответ заново.
+
+        Поток читает отдельная задача (_pump) под семафором и замером llm_call;
+        потребитель получает текст вне семафора, так что медленный потребитель
+        (правки сообщения в Telegram) не держит слот и не попадает в метрику,
+        а промежуточные версии, которые он не успел забрать, схлопываются в последнюю.
+        """
+        handle = self.model(model, temperature)
+
+        for attempt in range(self.retries + 1):
+            trial = self._before_call()
+            received = False
+            updates: asyncio.Queue[str | None] = asyncio.Queue()
+            producer = asyncio.create_task(self._pump(handle, prompt, updates))
+            try:
+                try:
+                    finished = False
+                    while not finished:
+                        text = await updates.get()
+                        if text is None:
+                            break
+                        while not updates.empty():
+                            newer = updates.get_nowait()
+                            if newer is None:
+                                finished = True
+                                break
+                            text = newer
+                        received = True
+                        yield text
+                    result = await producer
+                finally:
+                    if not producer.done():
+                        producer.cancel()
+                        await asyncio.gather(producer, return_exceptions=True)
+            except Exception as e:
+                LLM_REQUESTS.inc(outcome="timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+                self.breaker.record_failure()
+                if received or attempt >= self.retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+            except BaseException:
+                # Отмена или брошенный потребителем генератор — исхода у вызова нет
+                if trial:
+                    self.breaker.release_trial()
+                raise
+            else:
+                LLM_REQUESTS.inc(outcome="success")
+                if result is not None:
+                    record_llm_usage(result)
+                self.breaker.record_success()
+                return
+
+    def _before_call(self) -> bool:
+        try:
+            return self.breaker.before_call()
+        except CircuitOpenError as e:
+            LLM_REQUESTS.inc(outcome="circuit_open")
+            record_error("llm", e)
+            raise
+
+    async def _pump(self, handle, prompt: str, updates: asyncio.Queue):
+        """Читает run_stream и кладёт накопленный текст в updates; в конце — None. Возвращает последний результат."""
+        loop = asyncio.get_running_loop()
+        try:
+            async with self._semaphore:
+                with stage("llm_call"):
+                    chunks = handle.run_stream(prompt, timeout=self.timeout)
+                    deadline = loop.time() + self.timeout
+                    result = None
+                    try:
+                        while True:
+                            try:
+                                result = await asyncio.wait_for(anext(chunks), deadline - loop.time())
+                            except StopAsyncIteration:
+                                break
+                            updates.put_nowait(result.alternatives[0].text)
+                    finally:
+                        await chunks.aclose()
+            return result
+        finally:
+            updates.put_nowait(None)
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter: случайная задержка от 0 до base * 2^attempt
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+llm_client = LLMClient(
+    max_concurrency=settings.llm_max_concurrency,
+    timeout=settings.llm_timeout,
+    retries=settings.llm_retries,
+    backoff_base=settings.llm_backoff_base,
+    backoff_max=settings.llm_backoff_max,
+    breaker_threshold=settings.llm_breaker_threshold,
+    breaker_reset=settings.llm_breaker_reset,
+)
@@ -0,0 +1,311 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+request_logger = logging.getLogger("tg_bot.requests")
+
+# Границы корзин гистограмм длительности, сек: от быстрых шагов парсинга до долгого OCR/LLM
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ожидались метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> dict:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + ''.join(f"{line}\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+        self._function = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function):
+        """Значение без меток вычисляется в момент чтения метрик (например, длина очереди)."""
+        self._function = function
+
+    def samples(self) -> list[str]:
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets: tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # ключ меток → (счётчики корзин, сумма, количество)
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        lines = []
+        for key, counts, total, count in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels({**labels, 'le': _format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets=buckets))
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus."""
+        return ''.join(metric.render() for metric in self._metrics.values())
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "labtracker_stage_seconds", "Длительность этапов обработки запроса", ("stage",)
+)
+HANDLER_SECONDS = registry.histogram(
+    "labtracker_handler_seconds", "Полное время обработки апдейта хендлером", ("handler",)
+)
+ERRORS = registry.counter(
+    "labtracker_errors_total", "Ошибки по источнику и типу исключения", ("source", "type")
+)
+CACHE_REQUESTS = registry.counter(
+    "labtracker_cache_requests_total", "Обращения к кэшам: hit/miss", ("cache", "result")
+)
+LLM_REQUESTS = registry.counter(
+    "labtracker_llm_requests_total", "Вызовы YandexGPT по исходу", ("outcome",)
+)
+LLM_TOKENS = registry.counter(
+    "labtracker_llm_tokens_total", "Токены YandexGPT: input — промпт, output — ответ", ("direction",)
+)
+OCR_QUEUE_DEPTH = registry.gauge(
+    "labtracker_ocr_queue_depth", "Изображений в очереди OCR-воркера"
+)
+OCR_BATCH_SIZE = registry.histogram(
+    "labtracker_ocr_batch_size", "Размер батча, отправленного в Surya", buckets=(1, 2, 4, 8, 16, 32)
+)
+
+
+@dataclass
+class RequestTrace:
+    """Разбивка времени одного апдейта по этапам для структурированного лога."""
+    handler: str
+    user_id: int | None
+    started: float = field(default_factory=time.perf_counter)
+    stages: dict[str, float] = field(default_factory=dict)
+    error: str | None = None
+
+    def add(self, stage_name: str, seconds: float):
+        self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+
+
+_current_trace: ContextVar[RequestTrace | None] = ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Замер этапа: наблюдение в гистограмме labtracker_stage_seconds, время в
+    разбивке текущего запроса и счётчик ошибок, если этап упал (для вложенных
+    этапов ошибка относится к самому внутреннему).
+    Контекст копируется в asyncio.to_thread, так что этапы в потоках тоже учитываются.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_error(name, e)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, elapsed)
+
+
+# Пометка на исключении: ошибка уже посчитана во внутреннем этапе, внешние этапы
+# и обработчик, через которые оно пробрасывается дальше, повторно её не считают
+_RECORDED_ATTR = "_labtracker_error_recorded"
+
+
+def record_error(source: str, error: BaseException):
+    """Считает ошибку один раз — в самом внутреннем месте, где её поймали."""
+    if getattr(error, _RECORDED_ATTR, False):
+        return
+    ERRORS.inc(source=source, type=type(error).__name__)
+    try:
+        setattr(error, _RECORDED_ATTR, True)
+    except AttributeError:
+        pass
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_llm_usage(result):
+    """Токены из ответа SDK (result.usage), если бэкенд их вернул."""
+    usage = getattr(result, "usage", None)
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, "input_text_tokens", 0) or 0, direction="input")
+    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, direction="output")
+
+
+@contextmanager
+def request_trace(handler: str, user_id: int | None, log: bool = False):
+    """Трассировка апдейта целиком; при log=True разбивка пишется JSON-строкой в лог tg_bot.requests."""
+    trace = RequestTrace(handler=handler, user_id=user_id)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    except Exception as e:
+        trace.error = type(e).__name__
+        record_error(f"handler:{handler}", e)
+        raise
+    finally:
+        _current_trace.reset(token)
+        total = time.perf_counter() - trace.started
+        HANDLER_SECONDS.observe(total, handler=handler)
+        if log:
+            request_logger.info(json.dumps({
+                "handler": handler,
+                "user_id": user_id,
+                "total_ms": round(total * 1000, 1),
+                "stages_ms": {name: round(seconds * 1000, 1) for name, seconds in trace.stages.items()},
+                "error": trace.error,
+            }, ensure_ascii=False))
+
+
+class MetricsServer:
+    """Локальный HTTP-эндпоинт /metrics в формате Prometheus."""
+
+    def __init__(self, host: str, port: int, metrics: MetricsRegistry = registry):
+        self.host = host
+        self.port = port
+        self.metrics = metrics
+        self._runner: web.AppRunner | None = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.metrics.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self):
+        if self._runner is not None or not self.port:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("Метрики доступны на http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self):
+        if self._runner is None:
+            return
+        await self._runner.cleanup()
+        self._runner = None
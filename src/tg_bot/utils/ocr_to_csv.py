@@ -1,12 +1,20 @@
+import csv
+import io
 import json
+import logging
 
-from .ycloud_client import get_ycloud_sdk
+from ..config import settings
+from .llm_client import llm_client
+from .metrics import stage
+from .table_extractor import extract_table
+
+logger = logging.getLogger(__name__)
 
 prompt = """
-Ты — парсер медбланков (RU). На входе JSON с ключом "text_lines": [{"text": str, "confidence": float, "bbox":[x0,y0,x1,y1]}].
+Ты — парсер медбланков (RU). На входе JSON с ключом "text_lines": [{"text": str, "bbox":[x0,y0,x1,y1], "low_confidence": true (только у ненадёжно распознанных)}].
 
 Задача: извлечь таблицу анализов и вернуть СТРОГО CSV-СТРОКИ (UTF-8) формата:
-date,analysis,result,status
+date,analysis,result,status,reference
 — без какого-либо заголовка и префиксов/пояснений.
 
 Правила:
@@ -24,7 +32,9 @@ date,analysis,result,status
 6) status ∈ {ok, attention, abnormal, invalid}:
    - Если есть числовой референс (напр. "3.0 - 11.0") и числовой result — сравни: внутри/на границе → ok, вне → abnormal.
    - Ключевые слова: «повышен/понижен/вне нормы/не соответствует» → abnormal; «см. примечание/следует контролировать/пограничное» → attention; «возможна лабораторная ошибка/может быть неверным» → invalid.
+   - Если у элемента названия или результата анализа "low_confidence": true — OCR прочитал его ненадёжно: не исправляй значение по догадке, ставь invalid.
    - Иначе при наличии результата → ok.
+   - reference — референсные значения строки как на бланке вместе с единицами (напр. "3.0 - 11.0 10^9/л", "< 5.2 ммоль/л"); нет референса — пустое поле.
 7) Вывод:
    - Верни ТОЛЬКО строки CSV без заголовка; одна строка = один анализ.
    - Поля с запятыми/кавычками бери в двойные кавычки, внутренние двойные кавычки удваивай.
@@ -35,22 +45,67 @@ date,analysis,result,status
 {ocr_json_here}
 """
 
-def ocr_results_to_csv(ocr_results: list) -> str | None:
-    sdk = get_ycloud_sdk()
-    model = sdk.models.completions("yandexgpt").configure(temperature=0.5)
+async def ocr_results_to_csv(ocr_results: list) -> str | None:
+    """
+    Превращает предсказания Surya в CSV-строки date,analysis,result,status,reference.
 
-    ocr_data = []
+    Таблица восстанавливается локально по геометрии bbox; YandexGPT вызывается
+    только для страниц без распознанного заголовка/даты и для строк,
+    которые экстрактор не смог разложить по колонкам. Строки с уверенностью
+    Surya ниже ocr_min_confidence не угадываются, а получают статус invalid.
+    Если YandexGPT недоступен, возвращаются строки, разобранные локально
+    (ошибка пробрасывается, только когда таких строк нет).
+    """
+    rows = []
+    llm_pages = []
+    # Дата бланка обычно только на первой странице — переносим её на следующие
+    form_date = None
     for page in ocr_results:
-        page_data = {
-            "text_lines": [
-                {
-                    "text": line.text,
-                    "bbox": line.bbox
-                } for line in page.text_lines
-            ]
-        }
-        ocr_data.append(page_data)
+        text_lines = [
+            {
+                "text": line.text,
+                "bbox": line.bbox,
+                "confidence": getattr(line, "confidence", None),
+            } for line in page.text_lines
+        ]
+
+        with stage("extract_table"):
+            table = extract_table(text_lines, default_date=form_date, min_confidence=settings.ocr_min_confidence)
+        if table is None or table.date is None:
+            llm_pages.append({"text_lines": text_lines})
+            continue
+        form_date = table.date
+
+        rows.extend(table.rows)
+        if table.unplaced:
+            llm_pages.append({"text_lines": table.context + table.unplaced})
+
+    output = io.StringIO()
+    csv.writer(output, lineterminator='\n').writerows(rows)
+    text = output.getvalue()
 
+    if llm_pages:
+        for line in (line for page in llm_pages for line in page["text_lines"]):
+            confidence = line.pop("confidence", None)
+            if confidence is not None and confidence < settings.ocr_min_confidence:
+                line["low_confidence"] = True
+        try:
+            with stage("llm_parse"):
+                llm_text = await _parse_with_llm(llm_pages)
+        except Exception:
+            if not text:
+                raise
+            # Строки, разобранные локально, не теряем из-за недоступного YandexGPT
+            logger.warning("LLM-разбор нераспознанных строк не удался, сохраняем %d строк таблицы",
+                           len(rows), exc_info=True)
+            llm_text = None
+        if llm_text:
+            text = f"{text}{llm_text.strip()}\n"
+
+    return text or None
+
+
+async def _parse_with_llm(ocr_data: list) -> str | None:
     # ocr_data может быть dict/list — превращаем в строку
     ocr_data_str = (
         ocr_data if isinstance(ocr_data, str)
@@ -59,7 +114,7 @@ def ocr_results_to_csv(ocr_results: list) -> str | None:
 
     payload = f"{prompt}\n{ocr_data_str}"
 
-    result = model.run(payload)
+    result = await llm_client.run(payload, temperature=0.5)
 
     text = result.alternatives[0].text
 
@@ -73,9 +128,4 @@ def ocr_results_to_csv(ocr_results: list) -> str | None:
     if 'JSON' in text or 'Я не могу' in text:
         return None
 
-    try:
-        return text
-    except Exception as e:
-        print("Full result object:", result)
-        raise
-
+    return text
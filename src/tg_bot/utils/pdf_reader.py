@@ -0,0 +1,59 @@
+from dataclasses import dataclass, field
+from typing import Iterator
+
+import pymupdf
+from PIL import Image
+
+
+@dataclass
+class TextLine:
+    """Строка текстового слоя PDF в том же виде, что и строка Surya."""
+    text: str
+    bbox: list[float]
+    confidence: float = 1.0
+
+
+@dataclass
+class PdfPage:
+    number: int
+    # Растр страницы для OCR; None, если у страницы есть текстовый слой
+    image: Image.Image | None = None
+    text_lines: list[TextLine] = field(default_factory=list)
+
+
+def iter_pdf_pages(data: bytes, dpi: int = 150, max_pages: int | None = None,
+                   min_text_chars: int = 20) -> Iterator[PdfPage]:
+    """
+    Лениво отдаёт страницы PDF по одной.
+
+    Если на странице есть текстовый слой (не меньше min_text_chars символов),
+    возвращаются его строки с bbox в пикселях при заданном dpi — OCR для неё
+    не нужен. Иначе страница растеризуется с этим dpi. В памяти одновременно
+    живёт только текущая страница.
+    """
+    scale = dpi / 72
+    with pymupdf.open(stream=data, filetype="pdf") as document:
+        for number, page in enumerate(document):
+            if max_pages is not None and number >= max_pages:
+                break
+
+            text_lines = _text_layer(page, scale)
+            if sum(len(line.text) for line in text_lines) >= min_text_chars:
+                yield PdfPage(number=number, text_lines=text_lines)
+                continue
+
+            pixmap = page.get_pixmap(dpi=dpi, colorspace=pymupdf.csRGB, alpha=False)
+            image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+            yield PdfPage(number=number, image=image)
+
+
+def _text_layer(page: pymupdf.Page, scale: float) -> list[TextLine]:
+    lines = []
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", []):
+            text = " ".join(span["text"].strip() for span in line["spans"] if span["text"].strip())
+            if not text:
+                continue
+            x0, y0, x1, y1 = line["bbox"]
+            lines.append(TextLine(text=text, bbox=[x0 * scale, y0 * scale, x1 * scale, y1 * scale]))
+    return lines
@@ -0,0 +1,137 @@
+import re
+
+import pandas as pd
+
+from .analyte_index import analyte_index
+
+# Статусы, строки с которыми попадают в контекст всегда, независимо от давности
+FLAGGED_STATUSES = ('abnormal', 'attention')
+
+# Простые синонимы для предварительного отбора показателей по вопросу
+QUESTION_SYNONYMS = {
+    'лпвп': ('hdl',),
+    'hdl': ('лпвп',),
+    'лпнп': ('ldl',),
+    'ldl': ('лпнп',),
+    'глюкоз': ('glucose',),
+    'glucose': ('глюкоз',),
+    'холестерин': ('cholesterol', 'лпвп', 'лпнп'),
+    'гемоглобин': ('hgb',),
+    'витамин': ('вит',),
+}
+
+# Слова вопроса, по которым показатели не отбираем
+STOP_WORDS = {
+    'какой', 'какая', 'какие', 'каким', 'был', 'была', 'были', 'мой', 'моя', 'мои', 'меня', 'у',
+    'покажи', 'показать', 'последний', 'последняя', 'последние', 'динамика', 'динамику',
+    'тренд', 'анализ', 'анализы', 'анализов', 'результат', 'результаты', 'норма', 'нормы',
+    'что', 'как', 'когда', 'сдавал', 'сдавала', 'это', 'для', 'все', 'всех',
+}
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов: для русского текста YandexGPT — около 3 символов на токен."""
+    return len(text) // 3 + 1
+
+
+def indicator_key(user_df: pd.DataFrame) -> pd.Series:
+    """Ключ группировки показателя: канонический код, для нераспознанных названий — само название."""
+    if 'analyte_code' not in user_df:
+        return user_df['analysis']
+    return user_df['analyte_code'].fillna(user_df['analysis'])
+
+
+def relevant_mask(user_df: pd.DataFrame, question: str) -> pd.Series | None:
+    """
+    Маска строк с показателями, упомянутыми в вопросе: по кодам справочника,
+    по основе слова и простым синонимам. None, если вопрос не называет ни
+    одного показателя из истории.
+    """
+    mask = pd.Series(False, index=user_df.index)
+    if 'analyte_code' in user_df:
+        codes = analyte_index.find_in_text(question)
+        if codes:
+            mask |= user_df['analyte_code'].isin(codes)
+
+    stems = set()
+    for word in _WORD_RE.findall(question.lower()):
+        if len(word) < 3 or word in STOP_WORDS:
+            continue
+        stem = word[:max(3, len(word) - 2)]
+        stems.add(stem)
+        for key, synonyms in QUESTION_SYNONYMS.items():
+            if word.startswith(key):
+                stems.update(synonyms)
+
+    names = user_df['analysis'].astype(str).str.lower()
+    for stem in stems:
+        mask |= names.str.contains(stem, regex=False)
+    return mask if mask.any() else None
+
+
+def select_relevant(user_df: pd.DataFrame, question: str) -> pd.DataFrame:
+    """Только показатели, упомянутые в вопросе; если ни один не найден — история целиком."""
+    mask = relevant_mask(user_df, question)
+    return user_df if mask is None else user_df[mask]
+
+
+def encode_history(user_df: pd.DataFrame) -> str:
+    """
+    Компактная запись истории: одна строка на показатель,
+    «показатель: дата=результат; дата=результат (статус)», статус ok опускается.
+    Показатели идут от недавно сданных к давним; написания одного показателя
+    из разных лабораторий объединяются по коду, подписью служит последнее.
+    """
+    if user_df.empty:
+        return ''
+    df = user_df.sort_values('date', kind='stable')
+    points = df['date'].astype(str) + '=' + df['result'].astype(str)
+    status = df['status'].astype(str)
+    points = points.where(status == 'ok', points + ' (' + status + ')')
+
+    grouped = df.groupby(indicator_key(df), sort=False)
+    series = points.groupby(indicator_key(df), sort=False).agg('; '.join)
+    names = grouped['analysis'].last()
+    order = grouped['date'].max().sort_values(ascending=False, kind='stable').index
+    return '\n'.join(f"{names[key]}: {series[key]}" for key in order)
+
+
+def build_history_context(user_df: pd.DataFrame, question: str | None = None,
+                          token_budget: int = 2000, latest_points: int = 6) -> str:
+    """
+    Готовит историю пользователя для промпта в пределах token_budget.
+
+    По каждому показателю остаются последние latest_points точек плюс все строки
+    со статусом abnormal/attention; если не помещается — число точек уменьшается,
+    а затем отбрасываются давно не сдававшиеся показатели.
+    """
+    df = user_df[[column for column in ('date', 'analysis', 'result', 'status', 'analyte_code')
+                  if column in user_df]]
+    if question:
+        df = select_relevant(df, question)
+    df = df.sort_values('date', kind='stable')
+
+    # 0 — самая свежая точка показателя
+    rank = df.groupby(indicator_key(df)).cumcount(ascending=False)
+    flagged = df['status'].isin(FLAGGED_STATUSES)
+
+    for points in range(latest_points, 0, -1):
+        text = encode_history(df[(rank < points) | flagged])
+        if estimate_tokens(text) <= token_budget:
+            return text
+
+    lines = encode_history(df[rank < 1]).split('\n')
+    kept = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > token_budget:
+            break
+        kept.append(line)
+        used += cost
+    omitted = len(lines) - len(kept)
+    if omitted:
+        kept.append(f"(ещё {omitted} показателей не показаны из-за ограничения длины)")
+    return '\n'.join(kept)
@@ -0,0 +1,82 @@
+import re
+
+import pandas as pd
+
+# Форматы дат в бланках и старых CSV: ISO (analysis_results.csv) и ДД.ММ.ГГГГ (data.csv)
+DATE_FORMATS = ('%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d.%m.%Y', '%d.%m.%y', '%d/%m/%Y')
+
+# «< 3.0», "4.9 %", «29.03 сек.», «≥ 60 мл/мин»: знак сравнения, число, остаток — единица измерения
+_RESULT_RE = r'^\s*(?P<qualifier><=|>=|≤|≥|<|>)?\s*(?P<value>[-+]?\d+(?:[.,]\d+)?)\s*(?P<unit>.*?)\s*$'
+_QUALIFIERS = {'≤': '<=', '≥': '>='}
+
+# Референс: «3.0 - 11.0 ммоль/л», «от 3 до 5», «< 5.2», «до 40 Ед/л», «> 60», «более 1.0»;
+# число, затем остаток — единица измерения
+_NUMBER = r'[-+]?\d+(?:[.,]\d+)?'
+_REFERENCE_RANGE_RE = rf'(?:от\s*)?(?P<low>{_NUMBER})\s*(?:[-–—]|до)\s*(?P<high>{_NUMBER})\s*(?P<unit>.*?)\s*$'
+_REFERENCE_UPPER_RE = rf'^\s*(?:<=|≤|<|до|менее)\s*(?P<high>{_NUMBER})\s*(?P<unit>.*?)\s*$'
+_REFERENCE_LOWER_RE = rf'^\s*(?:>=|≥|>|от|более)\s*(?P<low>{_NUMBER})\s*(?P<unit>.*?)\s*$'
+
+
+def normalize_dates(dates: pd.Series) -> pd.Series:
+    """
+    Даты в ISO (YYYY-MM-DD); нераспознанные значения — None: иначе строка вроде
+    «bad» при сравнении строк оказалась бы позже любой ISO-даты.
+    """
+    text = dates.astype(str).str.strip()
+    parsed = pd.Series(pd.NaT, index=dates.index, dtype='datetime64[ns]')
+    for date_format in DATE_FORMATS:
+        missing = parsed.isna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(text[missing], format=date_format, errors='coerce')
+    return parsed.dt.strftime('%Y-%m-%d').astype(object).where(parsed.notna(), None)
+
+
+def split_results(results: pd.Series) -> pd.DataFrame:
+    """
+    Раскладывает результат на числовое значение, единицу и знак сравнения
+    (value, unit, qualifier). Для нечисловых результатов все три поля пустые.
+    """
+    parts = results.astype(str).str.extract(_RESULT_RE)
+    value = pd.to_numeric(parts['value'].str.replace(',', '.', regex=False), errors='coerce')
+    unit = parts['unit'].where(parts['unit'].str.len() > 0)
+    qualifier = parts['qualifier'].replace(_QUALIFIERS)
+    return pd.DataFrame({'value': value, 'unit': unit, 'qualifier': qualifier}, index=results.index)
+
+
+def split_references(references: pd.Series) -> pd.DataFrame:
+    """
+    Раскладывает референсный интервал на границы и единицу (ref_low, ref_high, ref_unit).
+    Открытые интервалы («< 5.2», «> 60») дают одну границу; нераспознанный
+    или пустой референс — все три поля пустые.
+    """
+    text = references.fillna('').astype(str)
+    parts = text.str.extract(_REFERENCE_RANGE_RE, flags=re.IGNORECASE)
+    for pattern in (_REFERENCE_UPPER_RE, _REFERENCE_LOWER_RE):
+        missing = parts['low'].isna() & parts['high'].isna()
+        if not missing.any():
+            break
+        parts = parts.fillna(text[missing].str.extract(pattern, flags=re.IGNORECASE))
+
+    def number(column: str) -> pd.Series:
+        return pd.to_numeric(parts[column].str.replace(',', '.', regex=False), errors='coerce')
+
+    unit = parts['unit'].where(parts['unit'].str.len() > 0)
+    return pd.DataFrame(
+        {'ref_low': number('low'), 'ref_high': number('high'), 'ref_unit': unit}, index=references.index
+    )
+
+
+def normalize_results(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Нормализация строк перед записью: дата в ISO, типизированные value/unit/qualifier
+    и, если есть колонка reference, границы референса ref_low/ref_high/ref_unit.
+    Нераспознанная дата сохраняется как есть в raw_date, а date остаётся пустой.
+    """
+    date = normalize_dates(df['date'])
+    raw_date = df['date'].astype(object).where(date.isna() & df['date'].notna(), None)
+    df = df.assign(date=date, raw_date=raw_date)
+    df = df.join(split_results(df['result']))
+    if 'reference' in df:
+        df = df.drop(columns='reference').join(split_references(df['reference']))
+    return df
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+# «Результаты с отклонениями» для фильтров истории
+ABNORMAL_STATUSES = ('abnormal',)
+
+
+def _same_unit(unit: pd.Series, ref_unit: pd.Series) -> pd.Series:
+    """Единицы совпадают или одна из них не указана (тогда считаем, что они те же)."""
+    left = unit.fillna('').astype(str).str.lower().str.replace(' ', '', regex=False)
+    right = ref_unit.fillna('').astype(str).str.lower().str.replace(' ', '', regex=False)
+    return (left == '') | (right == '') | (left == right)
+
+
+def out_of_range(df: pd.DataFrame) -> pd.Series:
+    """
+    Выход значения за референс: -1 — ниже ref_low, 1 — выше ref_high,
+    0 — внутри или на границе, NaN — сравнить нельзя (нет числа, границ
+    или единицы разные).
+
+    Результат со знаком сравнения задаёт только полуинтервал: «< 0.5»
+    ниже нормы, лишь если и граница 0.5 не выше ref_low; выше ref_high
+    такой результат не бывает. Для «>» — симметрично.
+    """
+    value = df['value'].astype(float)
+    low = df['ref_low'].astype(float)
+    high = df['ref_high'].astype(float)
+    qualifier = df['qualifier'].fillna('').astype(str)
+    upper_bound = qualifier.isin(['<', '<='])
+    lower_bound = qualifier.isin(['>', '>='])
+
+    below = np.where(upper_bound, value <= low, value < low) & ~lower_bound.to_numpy()
+    above = np.where(lower_bound, value >= high, value > high) & ~upper_bound.to_numpy()
+
+    comparable = value.notna() & (low.notna() | high.notna()) & _same_unit(df['unit'], df['ref_unit'])
+    direction = pd.Series(np.select([below, above], [-1.0, 1.0], default=0.0), index=df.index)
+    return direction.where(comparable)
+
+
+def compute_status(df: pd.DataFrame) -> pd.Series:
+    """
+    Статус каждой строки по сохранённым колонкам value/unit/qualifier и
+    ref_low/ref_high/ref_unit, одним векторным проходом по всей истории.
+
+    Если значение можно сравнить с референсом, статус — abnormal или ok;
+    пометки бланка сохраняются: invalid всегда, attention — для значений
+    в пределах нормы. Несравнимые строки сохраняют прежний статус (пустой — ok).
+    """
+    status = df['status'].fillna('').astype(str).str.strip().str.lower()
+    direction = out_of_range(df)
+    computed = pd.Series(np.where(direction != 0, 'abnormal', 'ok'), index=df.index)
+
+    kept = direction.isna() | (status == 'invalid') | ((status == 'attention') & (direction == 0))
+    status = status.where(kept, computed)
+    return status.where(status != '', 'ok')
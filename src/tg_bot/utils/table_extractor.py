@@ -0,0 +1,270 @@
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# Синонимы заголовков колонок (те же, что перечислены в промпте ocr_to_csv)
+HEADER_SYNONYMS = {
+    'analysis': ('исследование', 'показатель', 'наименование'),
+    'result': ('результат',),
+    'unit': ('единицы', 'ед.', 'ед'),
+    'reference': ('референсные', 'референсные значения', 'норма', 'диапазон'),
+    'comment': ('комментарий', 'примечание'),
+}
+
+# Приоритет дат бланка: взятие образца > печать результата > поступление образца
+DATE_LABELS = ('дата взятия образца', 'дата печати результата', 'дата поступления образца')
+
+STATUS_KEYWORDS = {
+    'invalid': ('возможна лабораторная ошибка', 'может быть неверным', 'лабораторной ошибке'),
+    'abnormal': ('повышен', 'понижен', 'вне нормы', 'не соответствует'),
+    'attention': ('см. примечание', 'следует контролировать', 'пограничное'),
+}
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_DATE_RE = re.compile(r'(\d{2})[./](\d{2})[./](\d{4})')
+_NUMBER_RE = re.compile(r'[-+]?\d+(?:[.,]\d+)?')
+_RANGE_RE = re.compile(r'([-+]?\d+(?:[.,]\d+)?)\s*[-–—]\s*([-+]?\d+(?:[.,]\d+)?)')
+_UPPER_RE = re.compile(r'(?:<|≤|<=|до)\s*([-+]?\d+(?:[.,]\d+)?)')
+_LOWER_RE = re.compile(r'(?:>|≥|>=|от|более)\s*([-+]?\d+(?:[.,]\d+)?)')
+
+
+@dataclass
+class ExtractedTable:
+    date: str | None
+    rows: list[list[str]] = field(default_factory=list)
+    # Строки внутри таблицы, которые не удалось разложить по колонкам
+    unplaced: list[dict] = field(default_factory=list)
+    # Заголовок таблицы и строка с датой — контекст для LLM-фолбэка
+    context: list[dict] = field(default_factory=list)
+
+
+def clean_text(text: str) -> str:
+    text = _TAG_RE.sub(' ', text)
+    return ' '.join(text.split())
+
+
+def parse_number(text: str) -> float | None:
+    match = _NUMBER_RE.search(text)
+    if match is None:
+        return None
+    return float(match.group().replace(',', '.'))
+
+
+def parse_reference(text: str) -> tuple[float | None, float | None]:
+    """Разбирает референс вида "3.0 - 11.0", "< 5.2", "> 1" в границы (low, high)."""
+    text = clean_text(text).replace(',', '.')
+    match = _RANGE_RE.search(text)
+    if match:
+        return float(match.group(1)), float(match.group(2))
+    match = _UPPER_RE.search(text)
+    if match:
+        return None, float(match.group(1))
+    match = _LOWER_RE.search(text)
+    if match:
+        return float(match.group(1)), None
+    return None, None
+
+
+def classify_status(result: str, reference: str, comment: str) -> str:
+    """
+    Статус строки: пометка о возможной ошибке → invalid; выход за числовой
+    референс → abnormal; затем ключевые слова комментария; иначе ok.
+    """
+    comment = comment.lower()
+    if any(keyword in comment for keyword in STATUS_KEYWORDS['invalid']):
+        return 'invalid'
+
+    value = parse_number(result)
+    low, high = parse_reference(reference)
+    if value is not None and ((low is not None and value < low) or (high is not None and value > high)):
+        return 'abnormal'
+
+    for status in ('abnormal', 'attention'):
+        if any(keyword in comment for keyword in STATUS_KEYWORDS[status]):
+            return status
+    return 'ok'
+
+
+def extract_table(text_lines: list, default_date: str | None = None,
+                  min_confidence: float | None = None) -> ExtractedTable | None:
+    """
+    Восстанавливает таблицу анализов по геометрии bbox строк Surya.
+
+    Строки группируются по Y с допуском 0.5 медианной высоты (но не меньше 3 px),
+    колонки определяются по заголовкам. Возвращает None, если заголовок
+    таблицы не найден — тогда страницу целиком разбирает LLM. default_date
+    используется, если на странице нет своей даты (продолжение бланка).
+    Строка, у которой название или результат распознаны с уверенностью ниже
+    min_confidence, получает статус invalid. Строки таблицы — [date, analysis,
+    result, status, reference], где reference — референс вместе с единицами.
+    """
+    lines = _prepare_lines(text_lines)
+    if not lines:
+        return None
+
+    boxes, heights, rows = _group_rows(lines)
+    header = _find_header(lines, rows)
+    if header is None:
+        return None
+    header_row, columns = header
+
+    names = list(columns)
+    starts = np.array([columns[name] for name in names])
+    # Ячейка относится к колонке, чей заголовок начинается левее неё (с запасом в высоту строки)
+    slack = float(np.median(heights))
+    col_index = np.searchsorted(starts - slack, boxes[:, 0], side='right') - 1
+
+    date_line = _find_date_line(lines, rows)
+    table = ExtractedTable(date=date_line[1] if date_line else default_date)
+    table.context = [_public(lines[i]) for i in rows[header_row]]
+    if date_line:
+        table.context.append(_public(lines[date_line[0]]))
+
+    current = None
+    # Номера строк таблицы с ненадёжно распознанным названием или результатом
+    unreliable = set()
+    for row in rows[header_row + 1:]:
+        cells: dict[str, list[str]] = {}
+        low_confidence = False
+        for i in row:
+            if col_index[i] < 0:
+                continue
+            name = names[col_index[i]]
+            cells.setdefault(name, []).append(lines[i]['text'])
+            confidence = lines[i]['confidence']
+            if name in ('analysis', 'result') and min_confidence is not None and confidence is not None:
+                low_confidence = low_confidence or confidence < min_confidence
+        cell = {name: ' '.join(values) for name, values in cells.items()}
+
+        has_name = bool(cell.get('analysis'))
+        has_result = bool(cell.get('result'))
+
+        if has_name and has_result:
+            current = cell
+            if low_confidence:
+                unreliable.add(len(table.rows))
+            table.rows.append(current)
+        elif not has_name and not has_result and set(cell) <= {'comment'}:
+            # Продолжение многострочного комментария предыдущего анализа
+            if current is not None and cell.get('comment'):
+                current['comment'] = f"{current.get('comment', '')} {cell['comment']}".strip()
+        elif has_result or (has_name and (cell.get('unit') or cell.get('reference'))):
+            table.unplaced.extend(_public(lines[i]) for i in row)
+            current = None
+        # Строки только с названием (подписи, разделы, футер) пропускаем
+
+    table.rows = [
+        [
+            table.date or '',
+            row['analysis'],
+            row['result'].replace(',', '.'),
+            'invalid' if number in unreliable
+            else classify_status(row['result'], row.get('reference', ''), row.get('comment', '')),
+            _reference_with_unit(row.get('reference', ''), row.get('unit', '')),
+        ]
+        for number, row in enumerate(table.rows)
+    ]
+    return table
+
+
+def _reference_with_unit(reference: str, unit: str) -> str:
+    # Единицы обычно стоят в своей колонке — дописываем их к референсу, чтобы хранить вместе
+    reference = reference.replace(',', '.')
+    if reference and unit and unit not in reference:
+        reference = f"{reference} {unit}"
+    return reference
+
+
+def table_line_indices(text_lines: list) -> list[int]:
+    """Номера строк OCR (в исходном списке), лежащих в таблице анализов ниже заголовка."""
+    lines = _prepare_lines(text_lines)
+    if not lines:
+        return []
+    _, _, rows = _group_rows(lines)
+    header = _find_header(lines, rows)
+    if header is None:
+        return []
+    return sorted(lines[i]['index'] for row in rows[header[0] + 1:] for i in row)
+
+
+def _prepare_lines(text_lines: list) -> list[dict]:
+    lines = [
+        {
+            'text': clean_text(_line_text(line)),
+            'bbox': list(_line_bbox(line)),
+            'confidence': _line_confidence(line),
+            'index': index,
+        }
+        for index, line in enumerate(text_lines)
+    ]
+    return [line for line in lines if line['text']]
+
+
+def _public(line: dict) -> dict:
+    # Для LLM-фолбэка: служебный номер строки не нужен, отсутствующая уверенность — тоже
+    return {key: value for key, value in line.items() if key != 'index' and value is not None}
+
+
+def _group_rows(lines: list[dict]) -> tuple[np.ndarray, np.ndarray, list[list[int]]]:
+    boxes = np.array([line['bbox'] for line in lines], dtype=float)
+    heights = boxes[:, 3] - boxes[:, 1]
+    centers = (boxes[:, 1] + boxes[:, 3]) / 2
+    tolerance = max(3.0, 0.5 * float(np.median(heights)))
+
+    # Кластеризация по Y: новая строка начинается там, где скачок центра больше допуска
+    order = np.argsort(centers, kind='stable')
+    row_of_sorted = np.concatenate(([0], np.cumsum(np.diff(centers[order]) > tolerance)))
+    row_ids = np.empty(len(lines), dtype=int)
+    row_ids[order] = row_of_sorted
+    rows = [
+        sorted(np.flatnonzero(row_ids == row).tolist(), key=lambda i: boxes[i, 0])
+        for row in range(int(row_of_sorted[-1]) + 1)
+    ]
+    return boxes, heights, rows
+
+
+def _find_header(lines: list[dict], rows: list[list[int]]) -> tuple[int, dict[str, float]] | None:
+    for row_number, row in enumerate(rows):
+        columns: dict[str, float] = {}
+        for i in row:
+            text = lines[i]['text'].lower().strip(' :')
+            for name, synonyms in HEADER_SYNONYMS.items():
+                if name not in columns and any(text == s or text.startswith(s + ' ') for s in synonyms):
+                    columns[name] = lines[i]['bbox'][0]
+        if 'analysis' in columns and 'result' in columns:
+            return row_number, dict(sorted(columns.items(), key=lambda item: item[1]))
+    return None
+
+
+def _find_date_line(lines: list[dict], rows: list[list[int]]) -> tuple[int, str] | None:
+    found: dict[str, tuple[int, str]] = {}
+    for row in rows:
+        for position, i in enumerate(row):
+            text = lines[i]['text'].lower()
+            label = next((label for label in DATE_LABELS if label in text), None)
+            if label is None or label in found:
+                continue
+            # Дата может стоять в той же строке OCR или в соседней справа
+            for j in row[position:]:
+                match = _DATE_RE.search(lines[j]['text'])
+                if match:
+                    day, month, year = match.groups()
+                    found[label] = (i, f"{year}-{month}-{day}")
+                    break
+    for label in DATE_LABELS:
+        if label in found:
+            return found[label]
+    return None
+
+
+def _line_text(line) -> str:
+    return line['text'] if isinstance(line, dict) else line.text
+
+
+def _line_bbox(line):
+    return line['bbox'] if isinstance(line, dict) else line.bbox
+
+
+def _line_confidence(line) -> float | None:
+    return line.get('confidence') if isinstance(line, dict) else getattr(line, 'confidence', None)
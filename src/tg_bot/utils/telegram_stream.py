@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import time
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Максимальная длина текста одного сообщения Telegram
+MESSAGE_LIMIT = 4096
+# Признак того, что ответ ещё дописывается
+CURSOR = " ▌"
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Режет текст на части не длиннее limit, по возможности — по переводу строки."""
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut < limit // 2:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    chunks.append(text)
+    return chunks
+
+
+class MessageStream:
+    """
+    Прогрессивный вывод ответа в сообщение «Анализирую…».
+
+    update() принимает накопленный текст, но редактирует сообщение не чаще
+    раза в interval секунд: промежуточные версии схлопываются в последнюю.
+    Текст длиннее MESSAGE_LIMIT продолжается в следующих сообщениях, уже
+    заполненные части больше не редактируются. finish() выводит итог без
+    ограничения частоты.
+    """
+
+    def __init__(self, message: types.Message, interval: float = 1.0, limit: int = MESSAGE_LIMIT):
+        self.interval = interval
+        self.limit = limit
+        self.messages = [message]
+        self._shown = [message.text or ""]
+        self._next_edit = 0.0
+
+    async def update(self, text: str):
+        if not text or time.monotonic() < self._next_edit:
+            return
+        try:
+            await self._show(text + CURSOR)
+        except TelegramRetryAfter as e:
+            # Промежуточную версию не ждём — следующая правка просто придёт позже
+            self._next_edit = time.monotonic() + e.retry_after
+            return
+        self._next_edit = time.monotonic() + self.interval
+
+    async def finish(self, text: str):
+        while True:
+            try:
+                await self._show(text)
+                break
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+
+        # Итог короче показанного (например, ошибка вместо частичного ответа) — лишние части удаляем
+        chunks = len(split_message(text, self.limit))
+        for message in self.messages[chunks:]:
+            try:
+                await message.delete()
+            except TelegramBadRequest:
+                logger.debug("Не удалось удалить сообщение %s", message.message_id)
+        del self.messages[chunks:], self._shown[chunks:]
+
+    async def _show(self, text: str):
+        for index, chunk in enumerate(split_message(text, self.limit)):
+            if index >= len(self.messages):
+                self.messages.append(await self.messages[-1].answer(chunk))
+                self._shown.append(chunk)
+                continue
+            if self._shown[index] == chunk:
+                continue
+            try:
+                await self.messages[index].edit_text(chunk)
+            except TelegramBadRequest as e:
+                if "message is not modified" not in str(e):
+                    raise
+            self._shown[index] = chunk
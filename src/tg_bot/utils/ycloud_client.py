@@ -1,4 +1,4 @@
-from yandex_cloud_ml_sdk import YCloudML
+from yandex_cloud_ml_sdk import AsyncYCloudML, YCloudML
 from ..config import settings
 
 def get_ycloud_sdk() -> YCloudML:
@@ -6,4 +6,12 @@ def get_ycloud_sdk() -> YCloudML:
     return YCloudML(
         folder_id=settings.yc_folder_id,
         auth=settings.yc_auth_token,
-    )
\ No newline at end of file
+    )
+
+
+def get_async_ycloud_sdk() -> AsyncYCloudML:
+    """Initialize async Yandex Cloud ML SDK client."""
+    return AsyncYCloudML(
+        folder_id=settings.yc_folder_id,
+        auth=settings.yc_auth_token,
+    )
@@ -0,0 +1,142 @@
+"""
+Процессы-воркеры распознавания сканов.
+
+    uv run -m src.tg_bot.worker [--processes N]
+
+Каждый процесс держит свои модели Surya и OCR-воркер, забирает задания из
+job_queue, распознаёт изображение или PDF и сохраняет CSV как результат
+задания — бот доставит его пользователю. Супервизор перезапускает упавшие
+процессы; их задания возвращаются в очередь по истечении аренды.
+"""
+import argparse
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+async def process_job(job, data: bytes | None) -> str | None:
+    from PIL import Image
+
+    from .services.analysis_service import AnalysisService
+
+    file_unique_id = job.payload.get("file_unique_id")
+    user_id = job.payload.get("user_id")
+    if job.kind == "image":
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        return await AnalysisService.run_ocr_on_image(image, file_unique_id, user_id=user_id)
+    if job.kind == "pdf":
+        return await AnalysisService.run_ocr_on_pdf(data, file_unique_id, user_id=user_id)
+    raise ValueError(f"Неизвестный вид задания: {job.kind}")
+
+
+async def _keep_lease(job_queue, job, worker: str):
+    # Продлеваем аренду, пока задание выполняется: упавший процесс перестанет её продлевать
+    while True:
+        await asyncio.sleep(settings.jobs_lease / 3)
+        await asyncio.to_thread(job_queue.extend_lease, job.id, worker, settings.jobs_lease)
+
+
+async def run_worker(worker: str, stop: asyncio.Event):
+    from .services.job_queue import get_job_queue
+    from .services.ocr_worker import model_registry, ocr_worker
+
+    job_queue = get_job_queue()
+    await ocr_worker.start()
+    await model_registry.start(warmup=settings.models_warmup_on_start)
+    logger.info("Воркер %s запущен", worker)
+    try:
+        while not stop.is_set():
+            job = await asyncio.to_thread(job_queue.claim, worker, settings.jobs_lease)
+            if job is None:
+                try:
+                    await asyncio.wait_for(stop.wait(), settings.jobs_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            lease = asyncio.create_task(_keep_lease(job_queue, job, worker))
+            try:
+                data = await asyncio.to_thread(job_queue.read_input, job)
+                result = await process_job(job, data)
+            except Exception as e:
+                logger.exception("Задание %s (попытка %s) завершилось ошибкой", job.id, job.attempts)
+                await asyncio.to_thread(job_queue.fail, job, worker, f"{type(e).__name__}: {e}")
+            else:
+                await asyncio.to_thread(job_queue.complete, job, worker, result)
+            finally:
+                lease.cancel()
+    finally:
+        await ocr_worker.stop()
+        await model_registry.stop()
+        job_queue.close()
+
+
+def _run_process(index: int):
+    logging.basicConfig(level=settings.log_level)
+    worker = f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+        await run_worker(worker, stop)
+
+    asyncio.run(main())
+
+
+def supervise(processes: int, restart_delay: float = 5.0):
+    """Держит processes живых воркеров, перезапуская упавшие, пока не придёт SIGTERM/SIGINT."""
+    context = multiprocessing.get_context("spawn")
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    children: dict[int, multiprocessing.Process] = {}
+    while not stopping:
+        for index in range(processes):
+            child = children.get(index)
+            if child is not None and child.is_alive():
+                continue
+            if child is not None:
+                logger.warning("Воркер %s завершился с кодом %s, перезапускаю", index, child.exitcode)
+                time.sleep(restart_delay)
+            children[index] = context.Process(target=_run_process, args=(index,), name=f"scan-worker-{index}")
+            children[index].start()
+        time.sleep(1)
+
+    for child in children.values():
+        child.terminate()
+    for child in children.values():
+        child.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=settings.scan_worker_processes)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.log_level)
+    if args.processes <= 1:
+        _run_process(0)
+    else:
+        supervise(args.processes)
+
+
+if __name__ == "__main__":
+    main()
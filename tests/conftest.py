@@ -0,0 +1,14 @@
+import os
+
+import pytest
+
+# Обязательные настройки без значений по умолчанию: тесты не обращаются к Telegram и YandexGPT
+os.environ.setdefault("BOT_TOKEN", "123456:test")
+os.environ.setdefault("YC_FOLDER_ID", "test")
+os.environ.setdefault("YC_AUTH_TOKEN", "test")
+
+
+@pytest.fixture(autouse=True)
+def _isolated_cwd(tmp_path, monkeypatch):
+    # Пути по умолчанию в настройках относительные — файлы не должны попадать в репозиторий
+    monkeypatch.chdir(tmp_path)
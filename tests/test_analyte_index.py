@@ -0,0 +1,43 @@
+import pytest
+
+from src.tg_bot.utils.analyte_index import analyte_code
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("Гемоглобин", "HGB"),
+        ("Гемоглобин (HGB)", "HGB"),
+        ("Гемоглабин", "HGB"),
+        ("Холестирин", "CHOL"),
+        ("FT3/Свободный Т3 (A2)", "FT3"),
+        ("25(OH) витамин D", "VITD"),
+        ("Витамин D (25-OH)", "VITD"),
+        ("СОЭ по Вестергрену", "ESR"),
+    ],
+)
+def test_known_names(name, expected):
+    assert analyte_code(name) == expected
+
+
+@pytest.mark.parametrize(
+    "name, wrong",
+    [
+        # Другой витамин, не фолиевая кислота и не витамин D
+        ("Витамин B6", "FOL"),
+        ("Витамин Е", "VITD"),
+        # Показатели мочи — не показатели крови с тем же названием
+        ("Глюкоза в моче", "GLU"),
+        ("Глюкоза (в моче)", "GLU"),
+        ("Гемоглобин в моче", "HGB"),
+        ("Эритроциты в моче", "RBC"),
+        ("Альбумин в моче", "ALB"),
+        # Фракция или изофермент — не общий показатель
+        ("Билирубин прямой", "TBIL"),
+        ("Креатинкиназа-МВ", "CK"),
+        # Антитела к тиреоглобулину — не к ТПО
+        ("Антитела к ТГ", "ATPO"),
+    ],
+)
+def test_qualified_names_not_matched_to_base_analyte(name, wrong):
+    assert analyte_code(name) != wrong
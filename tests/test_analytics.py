@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+from src.tg_bot.services.analytics import DISCLAIMER, answer_locally, detect_intent, trends
+
+
+@pytest.fixture
+def history():
+    return pd.DataFrame([
+        ("2024-01-10", "Глюкоза", "5.0", "ok", "GLU", 5.0),
+        ("2024-02-10", "Глюкоза", "5.6", "ok", "GLU", 5.6),
+        ("2024-03-10", "Глюкоза", "6.4", "abnormal", "GLU", 6.4),
+        ("2024-01-10", "Гемоглобин", "140", "ok", "HGB", 140.0),
+        ("2024-03-10", "Гемоглобин", "141", "attention", "HGB", 141.0),
+    ], columns=["date", "analysis", "result", "status", "analyte_code", "value"])
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("Какие анализы вне нормы?", "out_of_range"),
+    ("Какая динамика глюкозы?", "trend"),
+    ("Сравни гемоглобин", "compare"),
+    ("Когда я сдавал глюкозу?", "dates"),
+    ("Какой у меня последний гемоглобин?", "latest"),
+    ("Почему глюкоза растёт?", None),
+    ("Какая глюкоза была 12.03?", None),
+    ("Расскажи про анализы", None),
+])
+def test_detect_intent(question, intent):
+    assert detect_intent(question) == intent
+
+
+def test_latest_value_of_mentioned_indicator(history):
+    answer = answer_locally(history, "Какой у меня последний гемоглобин?")
+
+    assert "2024-03-10 — Гемоглобин — 141 — в норме, но есть пометки" in answer
+    assert "Глюкоза" not in answer
+    assert answer.endswith(DISCLAIMER)
+
+
+def test_out_of_range_lists_abnormal_and_flagged_rows(history):
+    answer = answer_locally(history, "Какие результаты вне нормы?")
+
+    assert answer.startswith("Найдено результатов с отклонениями: 1, с пометками: 1.")
+    assert "Глюкоза — 6.4" in answer and "Гемоглобин — 141" in answer
+
+
+def test_trend_direction_per_indicator(history):
+    summary = trends(history)
+
+    assert summary.loc["GLU", "direction"] == "рост"
+    assert summary.loc["HGB", "direction"] == "стабильно"
+    assert "Глюкоза: рост (+28.0%)" in answer_locally(history, "Какая динамика глюкозы?")
+
+
+def test_dates_answer(history):
+    answer = answer_locally(history, "Когда сдавал глюкозу?")
+
+    assert "Анализы сданы 3 раз(а): с 2024-01-10 по 2024-03-10." in answer
+    assert "Глюкоза — 2024-01-10, 2024-02-10, 2024-03-10" in answer
+
+
+def test_compare_needs_an_indicator(history):
+    assert answer_locally(history, "Сравни") is None
+    assert "Гемоглобин: стабильно (+0.7%)" in answer_locally(history, "Сравни гемоглобин")
+
+
+def test_unknown_indicator_is_left_to_llm(history):
+    assert answer_locally(history, "Какой последний ферритин?") is None
+
+
+def test_free_form_question_is_left_to_llm(history):
+    assert answer_locally(history, "Что делать, если глюкоза вне нормы?") is None
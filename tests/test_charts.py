@@ -0,0 +1,122 @@
+import asyncio
+import os
+
+import pytest
+
+from src.tg_bot.services import analysis_service
+from src.tg_bot.services import chart_cache as chart_cache_module
+from src.tg_bot.services.analysis_service import AnalysisService
+from src.tg_bot.services.chart_cache import CachedChart, ChartCache
+from src.tg_bot.services.storage import AnalysisStorage
+from src.tg_bot.utils.charts import TrendSeries, render_trend_chart
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ChartCache(str(tmp_path / "results.db"), max_entries=2)
+
+
+def _chart(user_id=1, analyte="GLU", version=(1, 1)):
+    return CachedChart(user_id, analyte, version, title="Глюкоза", png=b"png")
+
+
+def test_chart_is_valid_only_for_its_history_version(cache):
+    cache.put(_chart(version=(1, 1)))
+
+    assert cache.get(1, "GLU", (1, 1)).png == b"png"
+    assert cache.get(1, "GLU", (2, 5)) is None
+
+
+def test_file_id_is_remembered_for_the_version(cache):
+    chart = _chart()
+    cache.put(chart)
+
+    cache.set_file_id(chart, "file-1")
+
+    assert cache.get(1, "GLU", (1, 1)).file_id == "file-1"
+
+
+def test_least_recently_used_charts_are_evicted(cache):
+    cache.put(_chart(analyte="GLU"))
+    cache.put(_chart(analyte="HGB"))
+    cache.get(1, "GLU", (1, 1))
+
+    cache.put(_chart(analyte="CHOL"))
+
+    assert cache.get(1, "HGB", (1, 1)) is None
+    assert cache.get(1, "GLU", (1, 1)) is not None
+
+
+def test_invalidate_drops_only_that_user(cache):
+    cache.put(_chart(user_id=1))
+    cache.put(_chart(user_id=2))
+
+    cache.invalidate(1)
+
+    assert cache.get(1, "GLU", (1, 1)) is None
+    assert cache.get(2, "GLU", (1, 1)) is not None
+
+
+def test_cache_is_opened_lazily(tmp_path, monkeypatch):
+    monkeypatch.setattr(chart_cache_module, "_chart_cache", None)
+    monkeypatch.setattr(chart_cache_module.settings, "db_path", str(tmp_path / "lazy.db"))
+
+    assert not os.path.exists(tmp_path / "lazy.db")
+    assert chart_cache_module.get_chart_cache() is chart_cache_module.get_chart_cache()
+    assert os.path.exists(tmp_path / "lazy.db")
+
+
+def test_trend_chart_is_rendered_as_png():
+    series = TrendSeries(
+        title="Глюкоза", unit="ммоль/л", dates=["2024-01-01", "2024-02-01"], values=[5.0, 6.5],
+        ref_low=[4.1, 4.1], ref_high=[6.0, None], abnormal=[False, True],
+    )
+
+    assert render_trend_chart(series).startswith(b"\x89PNG")
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch, cache):
+    storage = AnalysisStorage(str(tmp_path / "results.db"))
+    rendered = []
+
+    async def render(series):
+        rendered.append(series)
+        return b"png"
+
+    monkeypatch.setattr(analysis_service, "get_storage", lambda: storage)
+    monkeypatch.setattr(analysis_service, "get_chart_cache", lambda: cache)
+    monkeypatch.setattr(analysis_service.chart_renderer, "render", render)
+    yield storage, rendered
+    storage.close()
+
+
+def test_chart_is_rendered_once_per_history_version(service):
+    storage, rendered = service
+    storage.add_rows([
+        [1, "2024-01-01", "Глюкоза", "5.0", "ok", "4.1 - 6.0"],
+        [1, "2024-02-01", "Глюкоза", "6.5", "ok", "4.1 - 6.0"],
+        [1, "bad", "Глюкоза", "9.0", "ok", "4.1 - 6.0"],
+    ])
+
+    first = asyncio.run(AnalysisService.get_chart(1, "глюкоза"))
+    again = asyncio.run(AnalysisService.get_chart(1, "Глюкоза"))
+
+    assert first.png == again.png == b"png"
+    assert len(rendered) == 1
+    assert rendered[0].dates == ["2024-01-01", "2024-02-01"]
+    assert rendered[0].abnormal == [False, True]
+
+    storage.add_rows([[1, "2024-03-01", "Глюкоза", "5.5", "ok", "4.1 - 6.0"]])
+    asyncio.run(AnalysisService.get_chart(1, "глюкоза"))
+
+    assert len(rendered) == 2
+
+
+def test_no_chart_without_numeric_results(service):
+    storage, rendered = service
+    storage.add_rows([[1, "2024-01-01", "Глюкоза", "отрицательно", "ok"]])
+
+    assert asyncio.run(AnalysisService.get_chart(1, "глюкоза")) is None
+    assert asyncio.run(AnalysisService.get_chart(2, "глюкоза")) is None
+    assert rendered == []
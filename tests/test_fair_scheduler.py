@@ -0,0 +1,100 @@
+import asyncio
+from collections import deque
+
+from src.tg_bot.services.fair_scheduler import FairScheduler
+
+
+async def _run_jobs(scheduler, users):
+    """Ставит работы в очередь, пока слот занят, и возвращает порядок, в котором они его получили."""
+    order = []
+
+    async def job(user_id):
+        async with scheduler.slot(user_id):
+            order.append(user_id)
+            await asyncio.sleep(0)
+
+    await scheduler.acquire("blocker")
+    tasks = [asyncio.create_task(job(user_id)) for user_id in users]
+    await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_slots_are_shared_round_robin():
+    scheduler = FairScheduler("test", concurrency=1)
+
+    order = asyncio.run(_run_jobs(scheduler, [1, 1, 1, 2]))
+
+    assert order == [1, 2, 1, 1]
+
+
+def test_weight_gives_more_slots_per_round():
+    scheduler = FairScheduler("test", concurrency=1, weights={1: 2})
+
+    order = asyncio.run(_run_jobs(scheduler, [1, 1, 1, 2, 2]))
+
+    assert order == [1, 1, 2, 1, 2]
+
+
+def test_free_slot_is_taken_without_queueing():
+    scheduler = FairScheduler("test", concurrency=2)
+
+    async def run():
+        await scheduler.acquire(1)
+        await scheduler.acquire(1)
+        return scheduler.waiting
+
+    assert asyncio.run(run()) == 0
+
+
+def test_cancelled_waiter_leaves_queue_and_keeps_credit():
+    scheduler = FairScheduler("test", concurrency=1, weights={1: 2})
+
+    async def run():
+        order = []
+
+        async def job(user_id):
+            async with scheduler.slot(user_id):
+                order.append(user_id)
+                await asyncio.sleep(0)
+
+        await scheduler.acquire("blocker")
+        cancelled = asyncio.create_task(job(1))
+        tasks = [asyncio.create_task(job(user_id)) for user_id in (1, 1, 2)]
+        await asyncio.sleep(0)
+        assert scheduler.waiting == 4
+
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        waiting = scheduler.waiting
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return waiting, order
+
+    waiting, order = asyncio.run(run())
+
+    assert waiting == 3
+    assert order == [1, 1, 2]
+    assert scheduler.waiting == 0 and scheduler._active == 0
+
+
+def test_cancelled_future_is_skipped_without_charging_credit():
+    scheduler = FairScheduler("test", concurrency=1, weights={1: 2})
+
+    async def run():
+        await scheduler.acquire("blocker")
+        loop = asyncio.get_running_loop()
+        stale, first, second, other = (loop.create_future() for _ in range(4))
+        scheduler._queues[1] = deque([stale, first, second])
+        scheduler._credits[1] = 2
+        scheduler._queues[2] = deque([other])
+        scheduler._credits[2] = 1
+        stale.cancel()
+
+        scheduler.release()
+        assert first.done() and not second.done()
+        scheduler.release()
+        return second.done(), other.done()
+
+    assert asyncio.run(run()) == (True, False)
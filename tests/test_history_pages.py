@@ -0,0 +1,59 @@
+import pytest
+
+from src.tg_bot.handlers.user_handlers import HistoryPage, build_results_page
+from src.tg_bot.services import analysis_service
+from src.tg_bot.services.storage import AnalysisStorage
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = AnalysisStorage(str(tmp_path / "results.db"))
+    monkeypatch.setattr(analysis_service, "get_storage", lambda: storage)
+    yield storage
+    storage.close()
+
+
+def _buttons(keyboard):
+    return {button.text: HistoryPage.unpack(button.callback_data) for row in keyboard.inline_keyboard for button in row}
+
+
+def test_cursor_carries_only_row_id(storage):
+    storage.add_rows([[7, f"2024-01-{day:02d}", "Гемоглобин", str(130 + day), "ok"] for day in range(1, 26)])
+    # Дата крайней карточки с ':' и длиннее лимита callback data (64 байта)
+    storage._conn.execute("UPDATE results SET date = ? WHERE id = 10", ("2024-01-10 10:30 " + "x" * 60,))
+
+    text, keyboard = build_results_page(7, None, None)
+    buttons = _buttons(keyboard)
+    forward = buttons["Вперёд ▶️"]
+
+    assert forward.row_id == 10
+    assert all(len(button.callback_data) <= 64 for row in keyboard.inline_keyboard for button in row)
+    assert text.count("Гемоглобин") == 10
+
+
+def test_pages_link_back_and_forth(storage):
+    storage.add_rows([[7, f"2024-01-{day:02d}", "Гемоглобин", str(130 + day), "ok"] for day in range(1, 26)])
+
+    _, first = build_results_page(7, None, None)
+    second_text, second = build_results_page(7, None, None, cursor=_buttons(first)["Вперёд ▶️"])
+    first_again, _ = build_results_page(7, None, None, cursor=_buttons(second)["◀️ Назад"])
+
+    assert "2024-01-11" in second_text and "2024-01-10" not in second_text
+    assert "2024-01-01" in first_again and "2024-01-11" not in first_again
+
+
+def test_abnormal_filter_toggle(storage):
+    storage.add_rows([
+        [7, "2024-01-01", "Глюкоза", "5", "ok"],
+        [7, "2024-01-02", "Глюкоза", "9", "abnormal"],
+    ])
+
+    text, keyboard = build_results_page(7, None, None, abnormal=True)
+    toggle = _buttons(keyboard)["📋 Все результаты"]
+
+    assert "2024-01-02" in text and "2024-01-01" not in text
+    assert toggle.direction == "first" and not toggle.abnormal
+
+
+def test_empty_page(storage):
+    assert build_results_page(7, None, None) is None
@@ -0,0 +1,120 @@
+import asyncio
+import os
+
+import pytest
+
+from src.tg_bot.services.job_queue import DONE, FAILED, QUEUED, RUNNING, JobQueue, JobResultPoller
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), str(tmp_path / "spool"), max_attempts=2, retry_delay=0)
+    yield queue
+    queue.close()
+
+
+def _status(queue, job_id):
+    return queue._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+
+def test_job_input_is_spooled_and_removed_on_completion(queue):
+    job_id = queue.enqueue("scan", {"user_id": 1}, b"image")
+
+    job = queue.claim("w1", lease=60)
+
+    assert job.id == job_id and job.status == RUNNING and job.attempts == 1
+    assert queue.read_input(job) == b"image"
+    queue.complete(job, "w1", "csv")
+    assert _status(queue, job_id) == DONE
+    assert not os.path.exists(job.input_path)
+
+
+def test_running_job_is_not_claimed_twice(queue):
+    queue.enqueue("scan", {"user_id": 1})
+
+    assert queue.claim("w1", lease=60) is not None
+    assert queue.claim("w2", lease=60) is None
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(queue):
+    job_id = queue.enqueue("scan", {"user_id": 1})
+    first = queue.claim("w1", lease=-1)
+
+    second = queue.claim("w2", lease=60)
+
+    assert second.id == job_id and second.attempts == 2
+    assert not queue.extend_lease(job_id, "w1", lease=60)
+    assert queue.extend_lease(job_id, "w2", lease=60)
+    queue.complete(first, "w1", "устаревший результат")
+    assert _status(queue, job_id) == RUNNING
+
+
+def test_failed_attempt_is_retried_then_marked_failed(queue):
+    job_id = queue.enqueue("scan", {"user_id": 1})
+
+    queue.fail(queue.claim("w1", lease=60), "w1", "ошибка 1")
+    assert _status(queue, job_id) == QUEUED
+    queue.fail(queue.claim("w1", lease=60), "w1", "ошибка 2")
+
+    assert _status(queue, job_id) == FAILED
+    assert queue.claim("w1", lease=60) is None
+    assert [job.error for job in queue.finished()] == ["ошибка 2"]
+
+
+def test_retry_waits_for_its_delay(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), str(tmp_path / "spool"), max_attempts=3, retry_delay=60)
+    try:
+        queue.enqueue("scan", {"user_id": 1})
+        queue.fail(queue.claim("w1", lease=60), "w1", "ошибка")
+
+        assert queue.claim("w1", lease=60) is None
+        assert queue.depth() == 1
+    finally:
+        queue.close()
+
+
+def test_worker_crashing_on_last_attempt_fails_the_job(queue):
+    job_id = queue.enqueue("scan", {"user_id": 1})
+    queue.claim("w1", lease=-1)
+    queue.claim("w2", lease=-1)
+
+    assert queue.claim("w3", lease=60) is None
+    assert _status(queue, job_id) == FAILED
+
+
+def test_jobs_are_claimed_round_robin_between_users(queue):
+    for user_id in (1, 1, 1, 2):
+        queue.enqueue("scan", {"user_id": user_id})
+
+    order = []
+    while (job := queue.claim("w1", lease=60)) is not None:
+        order.append(job.payload["user_id"])
+        queue.complete(job, "w1", None)
+
+    assert order == [1, 2, 1, 1]
+
+
+def test_poller_delivers_finished_jobs_once(queue):
+    queue.enqueue("scan", {"user_id": 1})
+    job = queue.claim("w1", lease=60)
+    queue.complete(job, "w1", "csv")
+    delivered = []
+
+    async def deliver(finished_job):
+        delivered.append(finished_job.result)
+
+    async def run():
+        poller = JobResultPoller(queue, interval=0.01)
+        poller.register("scan", deliver)
+        await poller.start()
+        for _ in range(100):
+            if delivered and not queue.finished():
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        await poller.stop()
+
+    asyncio.run(run())
+
+    assert delivered == ["csv"]
+    assert queue.finished() == []
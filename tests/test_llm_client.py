@@ -0,0 +1,176 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.tg_bot.utils.llm_client import CircuitBreaker, CircuitOpenError, LLMClient
+
+
+def _result(text: str):
+    return SimpleNamespace(alternatives=[SimpleNamespace(text=text)], usage=None)
+
+
+class FakeModel:
+    """Хендл модели SDK: по очереди выдаёт исходы вызовов (исключение или текст)."""
+
+    def __init__(self, *outcomes, chunks: tuple[str, ...] = ()):
+        self.outcomes = list(outcomes)
+        self.chunks = chunks
+        self.calls = 0
+
+    async def run(self, prompt, timeout=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return _result(outcome)
+
+    async def run_stream(self, prompt, timeout=None):
+        self.calls += 1
+        if self.outcomes:
+            outcome = self.outcomes.pop(0)
+            if isinstance(outcome, BaseException):
+                raise outcome
+        text = ""
+        for chunk in self.chunks:
+            text += chunk
+            yield _result(text)
+            await asyncio.sleep(0)
+
+
+def _client(model: FakeModel, **kwargs) -> LLMClient:
+    options = dict(retries=2, backoff_base=0, timeout=1, breaker_threshold=3, breaker_reset=60)
+    options.update(kwargs)
+    client = LLMClient(**options)
+    client._models[("yandexgpt", None)] = model
+    return client
+
+
+def test_failed_calls_are_retried():
+    model = FakeModel(RuntimeError("boom"), RuntimeError("boom"), "ответ")
+
+    assert asyncio.run(_client(model).complete("вопрос")) == "ответ"
+    assert model.calls == 3
+
+
+def test_error_is_raised_after_last_retry():
+    model = FakeModel(*(RuntimeError("boom") for _ in range(3)))
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(_client(model, breaker_threshold=10).complete("вопрос"))
+    assert model.calls == 3
+
+
+def test_breaker_opens_after_threshold_and_rejects_calls():
+    model = FakeModel(*(RuntimeError("boom") for _ in range(3)))
+    client = _client(model)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(client.complete("вопрос"))
+    assert client.breaker.is_open
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(client.complete("вопрос"))
+    assert model.calls == 3
+
+
+def test_open_breaker_rejects_until_reset():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.before_call() is False
+
+    breaker.record_failure()
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_lets_one_trial_through_after_reset():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert not breaker.is_open
+    assert breaker.before_call() is False
+
+
+def test_failed_trial_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.reset_timeout = 60
+
+    breaker.record_failure()
+
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_released_trial_allows_next_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    breaker.before_call()
+
+    breaker.release_trial()
+
+    assert breaker.before_call() is True
+
+
+def test_cancelled_trial_call_releases_trial():
+    class HangingModel:
+        async def run(self, prompt, timeout=None):
+            await asyncio.sleep(10)
+
+    client = _client(HangingModel(), breaker_threshold=1, breaker_reset=0)
+    client.breaker.record_failure()
+
+    async def scenario():
+        call = asyncio.create_task(client.complete("вопрос"))
+        await asyncio.sleep(0.01)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+
+    asyncio.run(scenario())
+    assert client.breaker.before_call() is True
+
+
+def test_stream_yields_accumulated_text():
+    client = _client(FakeModel(chunks=("Гемо", "глобин", " в норме")))
+
+    async def scenario():
+        return [text async for text in client.stream("вопрос")]
+
+    texts = asyncio.run(scenario())
+
+    assert texts[-1] == "Гемоглобин в норме"
+    assert all(later.startswith(earlier) for earlier, later in zip(texts, texts[1:]))
+
+
+def test_stream_retries_before_first_chunk():
+    model = FakeModel(RuntimeError("boom"), chunks=("ответ",))
+    client = _client(model)
+
+    async def scenario():
+        return [text async for text in client.stream("вопрос")]
+
+    assert asyncio.run(scenario()) == ["ответ"]
+    assert model.calls == 2
+
+
+def test_abandoned_stream_releases_trial():
+    client = _client(FakeModel(chunks=("a", "b", "c")), breaker_threshold=1, breaker_reset=0)
+    client.breaker.record_failure()
+
+    async def scenario():
+        stream = client.stream("вопрос")
+        await anext(stream)
+        await stream.aclose()
+
+    asyncio.run(scenario())
+    assert client.breaker.before_call() is True
@@ -0,0 +1,54 @@
+import pytest
+
+from src.tg_bot.utils.metrics import ERRORS, STAGE_SECONDS, MetricsRegistry, request_trace, stage
+
+
+def test_nested_stages_count_an_error_once():
+    inner = ERRORS.value(source="test_inner", type="ValueError")
+    outer = ERRORS.value(source="test_outer", type="ValueError")
+    handler = ERRORS.value(source="handler:test", type="ValueError")
+
+    with pytest.raises(ValueError):
+        with request_trace("test", user_id=1) as trace:
+            with stage("test_outer"):
+                with stage("test_inner"):
+                    raise ValueError("boom")
+
+    assert ERRORS.value(source="test_inner", type="ValueError") == inner + 1
+    assert ERRORS.value(source="test_outer", type="ValueError") == outer
+    assert ERRORS.value(source="handler:test", type="ValueError") == handler
+    assert trace.error == "ValueError"
+    assert set(trace.stages) == {"test_outer", "test_inner"}
+
+
+def test_separate_errors_are_counted_separately():
+    before = ERRORS.value(source="test_repeat", type="RuntimeError")
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            with stage("test_repeat"):
+                raise RuntimeError
+
+    assert ERRORS.value(source="test_repeat", type="RuntimeError") == before + 2
+
+
+def test_stage_time_is_observed_on_failure():
+    with pytest.raises(KeyError):
+        with stage("test_observed"):
+            raise KeyError
+
+    assert 'labtracker_stage_seconds_count{stage="test_observed"} 1' in STAGE_SECONDS.render()
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_seconds", "Тест", buckets=(1, 5))
+    for value in (0.5, 2, 10):
+        histogram.observe(value)
+
+    text = registry.render()
+
+    assert 'test_seconds_bucket{le="1"} 1' in text
+    assert 'test_seconds_bucket{le="5"} 2' in text
+    assert 'test_seconds_bucket{le="+Inf"} 3' in text
+    assert "test_seconds_count 3" in text
@@ -0,0 +1,129 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from src.tg_bot.services import ocr_archive as ocr_archive_module
+from src.tg_bot.services.ocr_archive import OcrArchive
+from src.tg_bot.utils.pdf_reader import TextLine
+
+
+def _page(*texts, confidence=0.9):
+    return SimpleNamespace(text_lines=[
+        TextLine(text=text, bbox=[10.0, 20.0 * n, 100.0, 20.0 * n + 15], confidence=confidence)
+        for n, text in enumerate(texts)
+    ])
+
+
+def _texts(scan):
+    return [[line.text for line in page.text_lines] for page in scan.pages]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = OcrArchive(str(tmp_path / "archive"))
+    yield archive
+    archive.close()
+
+
+def _size(archive, name="bbox.bin"):
+    return os.path.getsize(os.path.join(archive.directory, name))
+
+
+def test_scan_round_trip(archive):
+    archive.put("a", [_page("Глюкоза 5.1", "Гемоглобин 140"), _page("Дата: 12.03.2024", confidence=None)], 7, "csv")
+
+    scan = archive.reader().get("a")
+
+    assert (scan.user_id, scan.csv_text) == (7, "csv")
+    assert _texts(scan) == [["Глюкоза 5.1", "Гемоглобин 140"], ["Дата: 12.03.2024"]]
+    assert scan.pages[0].text_lines[1].bbox == [10.0, 20.0, 100.0, 35.0]
+    assert scan.pages[0].text_lines[0].confidence == pytest.approx(0.9)
+    assert scan.pages[1].text_lines[0].confidence is None
+
+
+def test_empty_scan_round_trip(archive):
+    archive.put("empty", [SimpleNamespace(text_lines=[])])
+
+    assert _texts(archive.reader().get("empty")) == [[]]
+
+
+def test_reader_is_a_snapshot(archive):
+    archive.put("a", [_page("первый")])
+    reader = archive.reader()
+    archive.put("b", [_page("второй")])
+
+    assert reader.scan_ids() == ["a"]
+    assert archive.reader().scan_ids() == ["a", "b"]
+
+
+def test_torn_tail_is_truncated_by_next_write(archive):
+    archive.put("a", [_page("первый")])
+    size = _size(archive)
+    for name in ("bbox.bin", "text_span.bin", "text.bin"):
+        with open(os.path.join(archive.directory, name), "ab") as file:
+            file.write(b"\xff" * 13)
+
+    archive.put("b", [_page("второй")])
+
+    assert _size(archive) == 2 * size
+    assert _texts(archive.reader().get("b")) == [["второй"]]
+    assert _texts(archive.reader().get("a")) == [["первый"]]
+
+
+def test_same_pages_are_not_appended_again(archive):
+    archive.put("a", [_page("Глюкоза 5.1")], 1, None)
+    size = _size(archive)
+
+    archive.put("a", [_page("Глюкоза 5.1")], 1, "csv")
+
+    assert _size(archive) == size
+    assert archive.reader().get("a").csv_text == "csv"
+    assert archive.compact() == 0
+
+
+def test_compact_drops_replaced_versions(archive):
+    archive.put("a", [_page("старый текст", "вторая строка")])
+    archive.put("b", [_page("Гемоглобин 140")], 2, "csv b")
+    archive.put("a", [_page("новый текст")], 1, "csv a")
+    reader_before = archive.reader()
+
+    assert archive.compact() == 2
+
+    reader = archive.reader()
+    assert _texts(reader.get("a")) == [["новый текст"]]
+    assert _texts(reader.get("b")) == [["Гемоглобин 140"]]
+    assert reader.get("b").csv_text == "csv b"
+    assert _texts(reader_before.get("a")) == [["новый текст"]]
+    assert not os.path.exists(os.path.join(archive.directory, "bbox.bin"))
+
+    archive.put("c", [_page("после сжатия")])
+    assert _texts(archive.reader().get("c")) == [["после сжатия"]]
+
+
+def test_compacted_archive_survives_reopening(tmp_path):
+    directory = str(tmp_path / "archive")
+    archive = OcrArchive(directory)
+    archive.put("a", [_page("старый")])
+    archive.put("a", [_page("новый")])
+    archive.compact()
+    archive.close()
+
+    reopened = OcrArchive(directory)
+    try:
+        assert _texts(reopened.reader().get("a")) == [["новый"]]
+    finally:
+        reopened.close()
+
+
+def test_archive_is_opened_lazily(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_archive_module, "_ocr_archive", None)
+    monkeypatch.setattr(ocr_archive_module.settings, "ocr_archive_dir", str(tmp_path / "lazy"))
+
+    assert not os.path.exists(tmp_path / "lazy")
+    archive = ocr_archive_module.get_ocr_archive()
+    try:
+        assert archive is ocr_archive_module.get_ocr_archive()
+        assert os.path.isdir(tmp_path / "lazy")
+    finally:
+        archive.close()
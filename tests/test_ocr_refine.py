@@ -0,0 +1,59 @@
+import asyncio
+import io
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from src.tg_bot.config import settings
+from src.tg_bot.services import analysis_service
+from src.tg_bot.services.analysis_service import AnalysisService
+
+
+def _rotated_photo() -> Image.Image:
+    """Фото 200×100, которое по EXIF (Orientation=6) показывается повёрнутым: 100×200."""
+    image = Image.new("RGB", (200, 100), "white")
+    exif = image.getexif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", exif=exif)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+class FakeWorker:
+    def __init__(self):
+        self.crops = []
+
+    async def recognize(self, image):
+        line = SimpleNamespace(text="Глюкоза 5.1", bbox=[20, 150, 80, 170], polygon=None, confidence=0.1)
+        return SimpleNamespace(text_lines=[line])
+
+    async def recognize_crops(self, crops):
+        self.crops.extend(crops)
+        return [None] * len(crops)
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    seen = []
+
+    def enhance_crop(image, bbox, scale=2.0):
+        seen.append(image.size)
+        return image
+
+    monkeypatch.setattr(analysis_service, "ocr_worker", FakeWorker())
+    monkeypatch.setattr(analysis_service, "enhance_crop", enhance_crop)
+    monkeypatch.setattr(analysis_service, "table_line_indices", lambda lines: list(range(len(lines))))
+    monkeypatch.setattr(settings, "ocr_crop_page", False)
+    monkeypatch.setattr(settings, "ocr_deskew", False)
+    return seen
+
+
+@pytest.mark.parametrize("preprocess, size", [(True, (100, 200)), (False, (200, 100))])
+def test_crops_are_cut_from_the_image_bboxes_refer_to(sources, monkeypatch, preprocess, size):
+    monkeypatch.setattr(settings, "ocr_preprocess", preprocess)
+
+    asyncio.run(AnalysisService.recognize_image(_rotated_photo()))
+
+    assert sources == [size]
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from src.tg_bot.services import ocr_worker as ocr_worker_module
+from src.tg_bot.services.model_registry import ModelRegistry
+from src.tg_bot.services.ocr_worker import OcrQueueFullError, OcrWorker
+
+
+class FakeRecognition:
+    """Распознаватель Surya: каждому изображению — одна строка с его именем."""
+
+    def __init__(self, gate: threading.Event | None = None):
+        self.gate = gate
+        self.batches = []
+        self.bboxes = []
+
+    def __call__(self, images, det_predictor=None, bboxes=None):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append(list(images))
+        self.bboxes.append(bboxes)
+        if det_predictor is not None:
+            det_predictor(images)
+        return [SimpleNamespace(text_lines=[SimpleNamespace(text=f"text-{image}")]) for image in images]
+
+
+@pytest.fixture
+def recognition(monkeypatch):
+    fake = FakeRecognition()
+    registry = ModelRegistry()
+    registry.register("recognition", lambda: fake)
+    registry.register("detection", lambda: lambda images: None)
+    monkeypatch.setattr(ocr_worker_module, "model_registry", registry)
+    return fake
+
+
+def test_concurrent_requests_are_batched(recognition):
+    async def scenario():
+        worker = OcrWorker(max_batch_size=4, max_wait=0.2)
+        await worker.start()
+        try:
+            return await asyncio.gather(*(worker.recognize(f"img{i}") for i in range(6)))
+        finally:
+            await worker.stop()
+
+    predictions = asyncio.run(scenario())
+
+    assert [p.text_lines[0].text for p in predictions] == [f"text-img{i}" for i in range(6)]
+    assert [len(batch) for batch in recognition.batches] == [4, 2]
+
+
+def test_recognize_requires_started_worker(recognition):
+    with pytest.raises(RuntimeError):
+        asyncio.run(OcrWorker().recognize("img"))
+
+
+def test_full_queue_rejects_new_images(recognition):
+    recognition.gate = threading.Event()
+
+    async def scenario():
+        worker = OcrWorker(max_batch_size=1, max_wait=0, max_queue_size=1, enqueue_timeout=0.05)
+        await worker.start()
+        first = asyncio.create_task(worker.recognize("busy"))
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(worker.recognize("queued"))
+        await asyncio.sleep(0.05)
+        try:
+            with pytest.raises(OcrQueueFullError):
+                await worker.recognize("rejected")
+        finally:
+            recognition.gate.set()
+        results = await asyncio.gather(first, queued)
+        await worker.stop()
+        return results
+
+    first, queued = asyncio.run(scenario())
+    assert first.text_lines[0].text == "text-busy"
+    assert queued.text_lines[0].text == "text-queued"
+
+
+def test_stop_fails_waiting_requests(recognition):
+    recognition.gate = threading.Event()
+
+    async def scenario():
+        worker = OcrWorker(max_batch_size=1, max_wait=0)
+        await worker.start()
+        running = asyncio.create_task(worker.recognize("busy"))
+        await asyncio.sleep(0.05)
+        waiting = asyncio.create_task(worker.recognize("waiting"))
+        await asyncio.sleep(0.05)
+        await worker.stop()
+        recognition.gate.set()
+        with pytest.raises(RuntimeError):
+            await waiting
+        running.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_crops_are_recognized_as_single_lines(recognition):
+    crops = [SimpleNamespace(width=40, height=10), SimpleNamespace(width=80, height=12)]
+
+    lines = asyncio.run(OcrWorker().recognize_crops(crops))
+
+    assert len(lines) == 2
+    assert recognition.bboxes[-1] == [[[0, 0, 40, 10]], [[0, 0, 80, 12]]]
@@ -0,0 +1,59 @@
+import pandas as pd
+
+from src.tg_bot.utils.prompt_context import build_history_context, encode_history, estimate_tokens, select_relevant
+
+
+def _history(rows):
+    return pd.DataFrame(rows, columns=["date", "analysis", "result", "status", "analyte_code"])
+
+
+def test_history_is_grouped_per_indicator_newest_first():
+    df = _history([
+        ("2024-01-01", "Глюкоза", "5.0", "ok", "GLU"),
+        ("2024-03-01", "Гемоглобин", "120", "abnormal", "HGB"),
+        ("2024-02-01", "Глюкоза (кровь)", "5.5", "ok", "GLU"),
+    ])
+
+    assert encode_history(df) == (
+        "Гемоглобин: 2024-03-01=120 (abnormal)\n"
+        "Глюкоза (кровь): 2024-01-01=5.0; 2024-02-01=5.5"
+    )
+
+
+def test_only_latest_points_and_flagged_rows_are_kept():
+    rows = [(f"2024-01-{day:02d}", "Глюкоза", str(day), "ok", "GLU") for day in range(1, 11)]
+    rows[0] = ("2024-01-01", "Глюкоза", "9.9", "abnormal", "GLU")
+
+    text = build_history_context(_history(rows), latest_points=3)
+
+    assert text == "Глюкоза: 2024-01-01=9.9 (abnormal); 2024-01-08=8; 2024-01-09=9; 2024-01-10=10"
+
+
+def test_points_are_reduced_to_fit_budget():
+    rows = [(f"2024-01-{day:02d}", "Глюкоза", "5.0", "ok", "GLU") for day in range(1, 11)]
+
+    text = build_history_context(_history(rows), token_budget=15, latest_points=6)
+
+    assert estimate_tokens(text) <= 15
+    assert text.startswith("Глюкоза: ") and text.endswith("2024-01-10=5.0")
+
+
+def test_stale_indicators_are_dropped_with_a_note():
+    rows = [(f"2024-{month:02d}-01", f"Показатель {month}", "1.0", "ok", None) for month in range(1, 13)]
+
+    text = build_history_context(_history(rows), token_budget=30, latest_points=1)
+
+    lines = text.split("\n")
+    assert lines[0] == "Показатель 12: 2024-12-01=1.0"
+    assert lines[-1].startswith("(ещё ") and "не показаны" in lines[-1]
+    assert sum(estimate_tokens(line) + 1 for line in lines[:-1]) <= 30
+
+
+def test_question_selects_mentioned_indicators():
+    df = _history([
+        ("2024-01-01", "Глюкоза", "5.0", "ok", "GLU"),
+        ("2024-01-01", "Холестерин ЛПВП", "1.2", "ok", "HDL"),
+    ])
+
+    assert list(select_relevant(df, "Какая у меня глюкоза?")["analysis"]) == ["Глюкоза"]
+    assert len(select_relevant(df, "Как дела?")) == 2
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import shutil
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from src.tg_bot import reprocess
+from src.tg_bot.reprocess import Checkpoint, Item, Outcome, collect_files, csv_rows
+from src.tg_bot.services.ocr_archive import OcrArchive
+from src.tg_bot.services.storage import AnalysisStorage
+from src.tg_bot.utils.pdf_reader import TextLine
+
+SAMPLE = Path(__file__).resolve().parents[1] / "ocr_results.json"
+
+EXPECTED_CSV = (
+    "2025-10-05,Моноциты,9.03,invalid,3.0 - 11.0 %\n"
+    "2025-10-05,Базофилы,0.35,attention,0.0 - 1.0 %\n"
+    "2025-10-05,Холестерин ЛПВП,1.23,attention,0.9 - 2.0 ммоль/л\n"
+    "2025-10-05,Глюкоза,3.96,invalid,4.1 - 6.0 ммоль/л\n"
+)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = AnalysisStorage(str(tmp_path / "results.db"))
+    yield storage
+    storage.close()
+
+
+def test_upsert_is_idempotent(storage):
+    rows = [[1, "2024-01-01", "Глюкоза", "5.1", "ok", "4.1 - 6.0"], [1, "2024-01-01", "Гемоглобин", "140", "ok"]]
+
+    assert storage.upsert_rows(rows) == (2, 0)
+    assert storage.upsert_rows(rows) == (0, 0)
+    assert storage.get_user_version(1)[0] == 2
+
+
+def test_upsert_updates_reparsed_rows_in_place(storage):
+    storage.upsert_rows([[1, "2024-01-01", "Глюкоза", "5.1", "ok", "4.1 - 6.0"]])
+    version = storage.get_user_version(1)
+
+    assert storage.upsert_rows([[1, "2024-01-01", "Глюкоза", "7.2", "ok", "4.1 - 6.0"]]) == (0, 1)
+
+    rows = storage.get_user_rows(1)
+    assert list(rows["result"]) == ["7.2"]
+    assert list(rows["status"]) == ["abnormal"]
+    assert storage.get_user_version(1) == version
+
+
+def test_repeated_key_within_scan_is_matched_by_order(storage):
+    rows = [[1, "2024-01-01", "Глюкоза", "5.1", "ok"], [1, "2024-01-01", "Глюкоза", "5.3", "ok"]]
+    storage.upsert_rows(rows)
+
+    assert storage.upsert_rows(rows) == (0, 0)
+    assert storage.upsert_rows([*rows, [1, "2024-01-01", "Глюкоза", "5.5", "ok"]]) == (1, 0)
+
+
+def test_collect_files_keys_scans_by_content(tmp_path):
+    scans = tmp_path / "scans"
+    scans.mkdir()
+    (scans / "a.png").write_bytes(b"png")
+    (scans / "copy.PNG").write_bytes(b"png")
+    (scans / "b.pdf").write_bytes(b"pdf")
+    (scans / "notes.txt").write_text("skip")
+    shutil.copy(SAMPLE, scans / "ocr.json")
+
+    items = collect_files([str(scans)], user_id=5)
+
+    assert [(Path(item.path).name, item.kind) for item in items] == [
+        ("a.png", "image"), ("b.pdf", "pdf"), ("copy.PNG", "image"), ("ocr.json", "json"),
+    ]
+    assert items[0].scan_id == items[2].scan_id != items[1].scan_id
+    assert {item.user_id for item in items} == {5}
+
+
+def test_checkpoint_resumes_after_restart(tmp_path):
+    path = str(tmp_path / "run.checkpoint")
+    checkpoint = Checkpoint(path)
+    checkpoint.mark("a")
+    checkpoint.close()
+
+    resumed = Checkpoint(path)
+    resumed.mark("b")
+    resumed.close()
+
+    assert Checkpoint(path).done == {"a", "b"}
+
+
+def test_csv_rows_are_owned_by_the_scan_user():
+    outcome = Outcome("scan", 3, csv_text='2024-01-01,Глюкоза,5.1,ok,"4,1 - 6,0"\n\n')
+
+    assert csv_rows(outcome) == [[3, "2024-01-01", "Глюкоза", "5.1", "ok", "4,1 - 6,0"]]
+
+
+def test_recorded_ocr_json_is_parsed_without_models():
+    outcome = asyncio.run(reprocess._process_async(Item("scan", "json", str(SAMPLE), 1)))
+
+    assert outcome.csv_text == EXPECTED_CSV
+
+
+def _recorded_pages():
+    recorded = json.loads(SAMPLE.read_text(encoding="utf-8"))
+    return [
+        SimpleNamespace(text_lines=[
+            TextLine(text=line["text"], bbox=line["bbox"], confidence=line.get("confidence"))
+            for line in page["text_lines"]
+        ])
+        for page in recorded
+    ]
+
+
+def test_archived_scan_is_reparsed_from_snapshot(tmp_path, monkeypatch):
+    archive = OcrArchive(str(tmp_path / "archive"))
+    archive.put("scan", _recorded_pages(), 1)
+    monkeypatch.setattr(reprocess, "_archive_reader", archive.reader())
+
+    outcome = asyncio.run(reprocess._process_async(Item("scan", "archive", None, 1)))
+
+    assert outcome.csv_text == EXPECTED_CSV
+    archive.close()
@@ -0,0 +1,62 @@
+import math
+
+import pandas as pd
+import pytest
+
+from src.tg_bot.utils.result_normalization import normalize_dates, normalize_results, split_references, split_results
+
+
+def test_dates_are_converted_to_iso():
+    dates = pd.Series(["2024-03-12", "12.03.2024", "12.03.24", "12/03/2024", "2024-03-12 10:15:00"])
+
+    assert normalize_dates(dates).tolist() == ["2024-03-12"] * 5
+
+
+def test_unparsed_dates_become_empty():
+    assert normalize_dates(pd.Series(["bad", "", None])).tolist() == [None, None, None]
+
+
+def test_raw_date_keeps_unparsed_text():
+    df = normalize_results(pd.DataFrame({"date": ["12.03.2024", "вчера"], "result": ["5", "5"]}))
+
+    assert df["date"].tolist() == ["2024-03-12", None]
+    assert df["raw_date"].tolist() == [None, "вчера"]
+
+
+@pytest.mark.parametrize("text, value, unit, qualifier", [
+    ("5,1 ммоль/л", 5.1, "ммоль/л", None),
+    ("< 3.0", 3.0, None, "<"),
+    ("≥ 60 мл/мин", 60.0, "мл/мин", ">="),
+    ("отрицательно", None, None, None),
+])
+def test_split_results(text, value, unit, qualifier):
+    row = split_results(pd.Series([text])).iloc[0]
+
+    assert (math.isnan(row["value"]) if value is None else row["value"] == value)
+    assert (pd.isna(row["unit"]) if unit is None else row["unit"] == unit)
+    assert (pd.isna(row["qualifier"]) if qualifier is None else row["qualifier"] == qualifier)
+
+
+@pytest.mark.parametrize("text, low, high, unit", [
+    ("3.0 - 11.0 ммоль/л", 3.0, 11.0, "ммоль/л"),
+    ("от 3 до 5", 3.0, 5.0, None),
+    ("< 5,2", None, 5.2, None),
+    ("до 40 Ед/л", None, 40.0, "Ед/л"),
+    ("более 1.0", 1.0, None, None),
+    ("отрицательно", None, None, None),
+    (None, None, None, None),
+])
+def test_split_references(text, low, high, unit):
+    row = split_references(pd.Series([text], dtype=object)).iloc[0]
+
+    assert (pd.isna(row["ref_low"]) if low is None else row["ref_low"] == low)
+    assert (pd.isna(row["ref_high"]) if high is None else row["ref_high"] == high)
+    assert (pd.isna(row["ref_unit"]) if unit is None else row["ref_unit"] == unit)
+
+
+def test_reference_columns_are_added_only_with_reference():
+    plain = normalize_results(pd.DataFrame({"date": ["2024-01-01"], "result": ["5"]}))
+    referenced = normalize_results(pd.DataFrame({"date": ["2024-01-01"], "result": ["5"], "reference": ["3 - 11"]}))
+
+    assert "ref_low" not in plain
+    assert referenced[["ref_low", "ref_high"]].iloc[0].tolist() == [3.0, 11.0]
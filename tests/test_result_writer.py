@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from src.tg_bot.services.result_writer import ResultWriter
+from src.tg_bot.services.storage import AnalysisStorage
+
+
+class RecordingStorage(AnalysisStorage):
+    """Хранилище, которое запоминает групповые записи и падает на скане с анализом «сбой»."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.batches = []
+
+    def add_scans(self, scans, skip_existing=False):
+        self.batches.append(len(scans))
+        return super().add_scans(scans, skip_existing)
+
+    def add_rows(self, rows, skip_existing=False):
+        if any(row[2] == "сбой" for row in rows):
+            raise RuntimeError("битый скан")
+        return super().add_rows(rows, skip_existing)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = RecordingStorage(str(tmp_path / "results.db"))
+    yield storage
+    storage.close()
+
+
+def _scan(user_id, analysis, result="5"):
+    return [[user_id, "2024-01-01", analysis, result, "ok"]]
+
+
+def test_concurrent_scans_share_one_transaction(storage):
+    async def run():
+        writer = ResultWriter(storage, max_batch_rows=100, max_delay=0.2)
+        await writer.start()
+        counts = await asyncio.gather(*(writer.submit(_scan(user_id, "Глюкоза")) for user_id in (1, 2, 3)))
+        await writer.stop()
+        return counts
+
+    assert asyncio.run(run()) == [1, 1, 1]
+    assert storage.batches == [3]
+    assert all(storage.get_user_version(user_id)[0] == 1 for user_id in (1, 2, 3))
+
+
+def test_batch_is_flushed_when_row_limit_is_reached(storage):
+    async def run():
+        writer = ResultWriter(storage, max_batch_rows=2, max_delay=10)
+        await writer.start()
+        await asyncio.gather(*(writer.submit(_scan(1, f"Показатель {n}")) for n in range(4)))
+        await writer.stop()
+
+    asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+    assert storage.batches == [2, 2]
+
+
+def test_failed_batch_is_retried_scan_by_scan(storage, monkeypatch):
+    def fail_batch(scans, skip_existing=False):
+        storage.batches.append(len(scans))
+        if any(rows[0][2] == "сбой" for rows in scans):
+            raise RuntimeError("транзакция откатилась")
+        return AnalysisStorage.add_scans(storage, scans, skip_existing)
+
+    monkeypatch.setattr(storage, "add_scans", fail_batch)
+
+    async def run():
+        writer = ResultWriter(storage, max_batch_rows=100, max_delay=0.2)
+        await writer.start()
+        results = await asyncio.gather(
+            writer.submit(_scan(1, "Глюкоза")), writer.submit(_scan(2, "сбой")), writer.submit(_scan(3, "Гемоглобин")),
+            return_exceptions=True,
+        )
+        await writer.stop()
+        return results
+
+    good, bad, other = asyncio.run(run())
+
+    assert good == 1 and other == 1
+    assert isinstance(bad, RuntimeError)
+    assert storage.get_user_version(2) is None
+    assert storage.get_user_version(3)[0] == 1
+
+
+def test_stop_flushes_accepted_scans_and_later_writes_go_direct(storage):
+    async def run():
+        writer = ResultWriter(storage, max_batch_rows=100, max_delay=10)
+        await writer.start()
+        pending = asyncio.ensure_future(writer.submit(_scan(1, "Глюкоза")))
+        await asyncio.sleep(0)
+        await writer.stop()
+        return await pending, await writer.submit(_scan(1, "Гемоглобин"))
+
+    assert asyncio.run(asyncio.wait_for(run(), timeout=5)) == (1, 1)
+    assert storage.get_user_version(1)[0] == 2
+
+
+def test_duplicate_scan_adds_nothing(storage):
+    async def run():
+        writer = ResultWriter(storage, max_delay=0.01)
+        await writer.start()
+        first = await writer.submit(_scan(1, "Глюкоза"))
+        second = await writer.submit(_scan(1, "Глюкоза"))
+        await writer.stop()
+        return first, second
+
+    assert asyncio.run(run()) == (1, 0)
@@ -0,0 +1,54 @@
+import pytest
+from PIL import Image, ImageDraw
+
+from src.tg_bot.services.scan_cache import ScanCache
+
+
+def _form(value: str) -> Image.Image:
+    image = Image.new("RGB", (400, 300), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((20, 20, 380, 60), outline="black", width=3)
+    draw.text((30, 100), f"Глюкоза {value}", fill="black")
+    return image
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ScanCache(str(tmp_path / "scan_cache"), max_bytes=1_000_000)
+
+
+def test_same_file_and_image_hit(cache):
+    image = _form("5.1")
+    cache.put("file-1", image, [{"text": "Глюкоза"}], "2024-01-01,Глюкоза,5.1,ok,\n")
+
+    cached = cache.get("file-1", image)
+
+    assert cached.csv_text == "2024-01-01,Глюкоза,5.1,ok,\n"
+    assert cached.text_lines == [{"text": "Глюкоза"}]
+
+
+def test_other_file_with_same_image_misses(cache):
+    image = _form("5.1")
+    cache.put("file-1", image, [], "csv")
+
+    assert cache.get("file-2", image) is None
+
+
+def test_lookup_before_download_uses_file_id_only(cache):
+    cache.put("file-1", _form("5.1"), [], "csv")
+    cache.put("doc-1", None, [], "pdf csv")
+
+    assert cache.get("file-1").csv_text == "csv"
+    assert cache.get("doc-1").csv_text == "pdf csv"
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ScanCache(str(tmp_path / "scan_cache"), max_bytes=120)
+    cache.put("old", None, [], "x" * 50)
+    cache.put("new", None, [], "y" * 50)
+    cache.get("new")
+
+    cache.put("newest", None, [], "z" * 50)
+
+    assert cache.get("old") is None
+    assert cache.get("newest") is not None
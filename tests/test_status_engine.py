@@ -0,0 +1,89 @@
+import math
+
+import pandas as pd
+import pytest
+
+from src.tg_bot.services.storage import AnalysisStorage
+from src.tg_bot.utils.status_engine import compute_status, out_of_range
+
+
+def _rows(*rows):
+    return pd.DataFrame(rows, columns=["status", "value", "unit", "qualifier", "ref_low", "ref_high", "ref_unit"])
+
+
+@pytest.mark.parametrize("value, qualifier, low, high, direction", [
+    (5.0, None, 4.1, 6.0, 0),
+    (6.0, None, 4.1, 6.0, 0),
+    (3.9, None, 4.1, 6.0, -1),
+    (7.0, None, None, 6.0, 1),
+    (0.5, "<", 0.5, 6.0, -1),
+    (0.5, "<", 0.1, 6.0, 0),
+    (90.0, ">", None, 60.0, 1),
+    (60.0, ">=", 60.0, None, 0),
+    (5.0, None, None, None, None),
+    (None, None, 4.1, 6.0, None),
+])
+def test_out_of_range(value, qualifier, low, high, direction):
+    result = out_of_range(_rows(("ok", value, None, qualifier, low, high, None))).iloc[0]
+
+    assert math.isnan(result) if direction is None else result == direction
+
+
+def test_different_units_are_not_compared():
+    df = _rows(("ok", 140.0, "г/л", None, 13.0, 16.0, "г/дл"), ("ok", 140.0, "Г / Л", None, 130.0, 160.0, "г/л"))
+
+    assert out_of_range(df).isna().tolist() == [True, False]
+
+
+def test_status_keeps_form_marks():
+    df = _rows(
+        ("ok", 7.0, None, None, 4.1, 6.0, None),
+        ("abnormal", 5.0, None, None, 4.1, 6.0, None),
+        ("invalid", 5.0, None, None, 4.1, 6.0, None),
+        ("attention", 5.0, None, None, 4.1, 6.0, None),
+        ("attention", 7.0, None, None, 4.1, 6.0, None),
+        ("abnormal", None, None, None, None, None, None),
+        ("", None, None, None, None, None, None),
+    )
+
+    assert compute_status(df).tolist() == ["abnormal", "ok", "invalid", "attention", "abnormal", "abnormal", "ok"]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = AnalysisStorage(str(tmp_path / "results.db"))
+    yield storage
+    storage.close()
+
+
+def test_status_is_computed_on_write(storage):
+    storage.add_rows([[1, "2024-01-01", "Глюкоза", "7,2 ммоль/л", "ok", "4.1 - 6.0 ммоль/л"]])
+
+    assert list(storage.get_user_rows(1)["status"]) == ["abnormal"]
+
+
+def test_recompute_updates_only_changed_users(storage):
+    storage.add_rows([
+        [1, "2024-01-01", "Глюкоза", "5.1", "ok", "4.1 - 6.0"],
+        [2, "2024-01-01", "Глюкоза", "5.1", "ok", "4.1 - 6.0"],
+    ])
+    version = storage.get_user_version(1)
+    # Правило референса изменилось, а статус в базе — прежний
+    storage._conn.execute("UPDATE results SET ref_high = 5.0 WHERE user_id = 1")
+
+    assert storage.recompute_statuses() == {1}
+    assert list(storage.get_user_rows(1)["status"]) == ["abnormal"]
+    assert list(storage.get_user_rows(2)["status"]) == ["ok"]
+    assert storage.get_user_version(1) == version
+    assert storage.recompute_statuses() == set()
+
+
+def test_recompute_can_be_limited_to_one_user(storage):
+    storage.add_rows([
+        [1, "2024-01-01", "Глюкоза", "5.1", "ok", "4.1 - 6.0"],
+        [2, "2024-01-01", "Глюкоза", "5.1", "ok", "4.1 - 6.0"],
+    ])
+    storage._conn.execute("UPDATE results SET ref_high = 5.0")
+
+    assert storage.recompute_statuses(2) == {2}
+    assert list(storage.get_user_rows(1)["status"]) == ["ok"]
@@ -0,0 +1,176 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from src.tg_bot.services.storage import AnalysisStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = AnalysisStorage(str(tmp_path / "results.db"))
+    yield storage
+    storage.close()
+
+
+def test_rows_are_read_per_user_in_date_order(storage):
+    storage.add_rows([
+        [1, "2024-03-01", "Гемоглобин", "140", "ok"],
+        [1, "2024-01-01", "Гемоглобин", "130", "ok"],
+        [2, "2024-02-01", "Глюкоза", "5.0", "ok"],
+    ])
+
+    rows = storage.get_user_rows(1)
+
+    assert list(rows["date"]) == ["2024-01-01", "2024-03-01"]
+    assert list(rows["result"]) == ["130", "140"]
+
+
+def test_period_bounds_are_inclusive(storage):
+    storage.add_rows([[1, f"2024-01-{day:02d}", "Глюкоза", "5", "ok"] for day in (1, 10, 20, 31)])
+
+    rows = storage.get_user_rows(1, start=date(2024, 1, 10), end=date(2024, 1, 20))
+
+    assert list(rows["date"]) == ["2024-01-10", "2024-01-20"]
+
+
+def test_skip_existing_does_not_duplicate_rows(storage):
+    rows = [[1, "2024-01-01", "Гемоглобин", "140", "ok"], [1, "2024-01-01", "Гемоглобин", "140", "ok"]]
+
+    assert storage.add_rows(rows, skip_existing=True) == 1
+    assert storage.add_rows(rows, skip_existing=True) == 0
+    assert len(storage.get_user_rows(1)) == 1
+
+
+def test_malformed_rows_are_skipped(storage):
+    count = storage.add_rows([["not-a-user", "2024-01-01", "Глюкоза", "5", "ok"], [1, "2024-01-01"]])
+
+    assert count == 0
+    assert storage.get_user_version(1) is None
+
+
+def test_version_changes_with_new_rows(storage):
+    storage.add_rows([[1, "2024-01-01", "Глюкоза", "5", "ok"]])
+    before = storage.get_user_version(1)
+    storage.add_rows([[1, "2024-01-02", "Глюкоза", "5.5", "ok"]])
+
+    after = storage.get_user_version(1)
+
+    assert before[0] == 1 and after[0] == 2
+    assert after[1] > before[1]
+
+
+def test_legacy_csv_is_imported_once(storage, tmp_path):
+    path = tmp_path / "analysis_results.csv"
+    path.write_text(
+        "user_id,date,analysis,result,status\n"
+        "1,2024-01-01,Гемоглобин,140,ok\n"
+        "1,2024-02-01,Гемоглобин,135,ok\n",
+        encoding="utf-8",
+    )
+
+    assert storage.import_csv(str(path)) == 2
+    assert storage.import_csv(str(path)) == 0
+    assert storage.get_user_date_range(1) == ("2024-01-01", "2024-02-01")
+
+
+def test_data_survives_reopening(tmp_path):
+    path = str(tmp_path / "results.db")
+    first = AnalysisStorage(path)
+    first.add_rows([[1, "2024-01-01", "Глюкоза", "5", "ok"]])
+    first.close()
+
+    second = AnalysisStorage(path)
+    try:
+        assert len(second.get_user_rows(1)) == 1
+    finally:
+        second.close()
+
+
+def _page_ids(page):
+    rows, has_more = page
+    return list(rows["id"]), has_more
+
+
+def test_keyset_pages_walk_forward_and_back(storage):
+    storage.add_rows([[1, f"2024-01-{day:02d}", "Глюкоза", str(day), "ok"] for day in range(1, 8)])
+    storage.add_rows([[2, "2024-01-03", "Глюкоза", "9", "ok"]])
+
+    first = _page_ids(storage.get_user_page(1, limit=3))
+    second = _page_ids(storage.get_user_page(1, after=first[0][-1], limit=3))
+    third = _page_ids(storage.get_user_page(1, after=second[0][-1], limit=3))
+    back = _page_ids(storage.get_user_page(1, before=third[0][0], limit=3))
+
+    assert first == ([1, 2, 3], True)
+    assert second == ([4, 5, 6], True)
+    assert third == ([7], False)
+    assert back == ([4, 5, 6], True)
+
+
+def test_keyset_cursor_orders_rows_of_one_date_by_id(storage):
+    storage.add_rows([[1, "2024-01-01", f"Показатель {n}", "1", "ok"] for n in range(5)])
+
+    first, _ = storage.get_user_page(1, limit=2)
+    second, has_more = storage.get_user_page(1, after=int(first["id"].iloc[-1]), limit=2)
+
+    assert list(second["analysis"]) == ["Показатель 2", "Показатель 3"]
+    assert has_more
+
+
+def test_cursor_of_another_user_matches_nothing(storage):
+    storage.add_rows([[1, "2024-01-01", "Глюкоза", "5", "ok"]])
+    storage.add_rows([[2, "2024-01-01", "Глюкоза", "5", "ok"]])
+
+    rows, has_more = storage.get_user_page(2, after=1)
+
+    assert rows.empty and not has_more
+
+
+def test_page_filters_by_status_and_period(storage):
+    storage.add_rows([
+        [1, "2024-01-01", "Глюкоза", "7", "abnormal"],
+        [1, "2024-02-01", "Глюкоза", "5", "ok"],
+        [1, "2024-03-01", "Глюкоза", "8", "abnormal"],
+    ])
+
+    rows, _ = storage.get_user_page(1, start=date(2024, 2, 1), statuses=["abnormal"])
+
+    assert list(rows["date"]) == ["2024-03-01"]
+
+
+def test_unparsed_date_is_kept_aside_and_excluded_from_date_queries(storage):
+    storage.add_rows([
+        [1, "2024-01-01", "Глюкоза", "5", "ok"],
+        [1, "bad", "Глюкоза", "9", "ok"],
+    ])
+
+    assert storage.get_user_date_range(1) == ("2024-01-01", "2024-01-01")
+    assert list(storage.get_user_rows(1)["result"]) == ["5"]
+    assert list(storage.get_user_page(1)[0]["result"]) == ["5"]
+    assert storage.get_user_version(1)[0] == 2
+    assert storage._conn.execute("SELECT raw_date FROM results WHERE date IS NULL").fetchone() == ("bad",)
+
+
+def test_undated_rows_are_upserted_in_place(storage):
+    storage.upsert_rows([[1, "bad", "Глюкоза", "9", "ok"]])
+
+    assert storage.upsert_rows([[1, "bad", "Глюкоза", "9", "ok"]]) == (0, 0)
+    assert storage.add_rows([[1, "bad", "Глюкоза", "9", "ok"]], skip_existing=True) == 0
+
+
+def test_legacy_non_iso_dates_are_moved_to_raw_date(tmp_path):
+    path = str(tmp_path / "results.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE results (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, date TEXT, "
+                 "analysis TEXT, result TEXT, status TEXT)")
+    conn.executemany("INSERT INTO results (user_id, date, analysis, result, status) VALUES (?, ?, ?, ?, ?)",
+                     [(1, "2024-01-01", "Глюкоза", "5", "ok"), (1, "bad", "Глюкоза", "9", "ok")])
+    conn.commit()
+    conn.close()
+
+    storage = AnalysisStorage(path)
+    try:
+        assert storage.get_user_date_range(1) == ("2024-01-01", "2024-01-01")
+        assert storage._conn.execute("SELECT raw_date FROM results WHERE date IS NULL").fetchone() == ("bad",)
+    finally:
+        storage.close()
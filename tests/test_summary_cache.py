@@ -0,0 +1,130 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from src.tg_bot.models.analysis_models import AnalysisResult
+from src.tg_bot.services import analysis_service
+from src.tg_bot.services.analysis_service import AnalysisService
+from src.tg_bot.services.storage import AnalysisStorage
+from src.tg_bot.services.summary_cache import SummaryCache
+
+
+def _result(user_id: int, summary: str) -> AnalysisResult:
+    return AnalysisResult(user_id=user_id, summary=summary, generated_at=datetime(2024, 1, 1))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SummaryCache(str(tmp_path / "results.db"), max_entries=100, ttl_seconds=3600)
+
+
+def test_entry_keeps_its_history_version(cache):
+    cache.put(_result(1, "сводка"), "analyse", (3, 42))
+
+    cached = cache.get(1, "analyse")
+
+    assert cached.result.summary == "сводка"
+    assert cached.version == (3, 42)
+
+
+def test_answers_are_keyed_by_normalized_question(cache):
+    cache.put(_result(1, "ответ"), "ask", (1, 1), prompt="Какой   Гемоглобин?")
+
+    assert cache.get(1, "ask", prompt="какой гемоглобин?").result.summary == "ответ"
+    assert cache.get(1, "ask", prompt="какая глюкоза?") is None
+    assert cache.get(2, "ask", prompt="какой гемоглобин?") is None
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    cache = SummaryCache(str(tmp_path / "results.db"), max_entries=100, ttl_seconds=0)
+    cache.put(_result(1, "сводка"), "analyse", (1, 1))
+
+    assert cache.get(1, "analyse") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = SummaryCache(str(tmp_path / "results.db"), max_entries=2, ttl_seconds=3600)
+    cache.put(_result(1, "первая"), "analyse", (1, 1))
+    cache.put(_result(2, "вторая"), "analyse", (1, 2))
+    cache.get(1, "analyse")
+
+    cache.put(_result(3, "третья"), "analyse", (1, 3))
+
+    assert cache.get(2, "analyse") is None
+    assert cache.get(1, "analyse") is not None
+    assert cache.get(3, "analyse") is not None
+
+
+def test_invalidate_keeps_analyse_summary_for_delta_update(cache):
+    cache.put(_result(1, "сводка"), "analyse", (1, 1))
+    cache.put(_result(1, "ответ"), "ask", (1, 1), prompt="вопрос")
+
+    cache.invalidate(1)
+
+    assert cache.get(1, "analyse") is not None
+    assert cache.get(1, "ask", prompt="вопрос") is None
+
+
+def test_invalidate_after_updated_rows_drops_analyse_summary(cache):
+    cache.put(_result(1, "сводка"), "analyse", (1, 1))
+    cache.put(_result(2, "сводка"), "analyse", (1, 2))
+
+    cache.invalidate(1, rows_updated=True)
+
+    assert cache.get(1, "analyse") is None
+    assert cache.get(2, "analyse") is not None
+
+
+class RacingStorage(AnalysisStorage):
+    """Хранилище, в которое дописывается строка между чтением версии и чтением истории."""
+
+    racing = True
+
+    def get_user_rows(self, user_id, *args, **kwargs):
+        if self.racing:
+            self.add_rows([[user_id, "2024-02-01", "Глюкоза", "5.0", "ok"]])
+        return super().get_user_rows(user_id, *args, **kwargs)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    storage = RacingStorage(str(tmp_path / "results.db"))
+    cache = SummaryCache(str(tmp_path / "results.db"), max_entries=100, ttl_seconds=3600)
+    monkeypatch.setattr(analysis_service, "get_storage", lambda: storage)
+    monkeypatch.setattr(analysis_service, "get_summary_cache", lambda: cache)
+
+    async def summarize(prompt, on_partial=None):
+        return "сводка"
+
+    monkeypatch.setattr(AnalysisService, "_summarize_with_yandexgpt", staticmethod(summarize))
+    yield storage, cache
+    storage.close()
+
+
+def test_summary_is_cached_for_stable_history(service):
+    storage, cache = service
+    storage.racing = False
+    storage.add_rows([[1, "2024-01-01", "Гемоглобин", "140", "ok"]])
+
+    asyncio.run(AnalysisService.analyse_history(1))
+
+    assert cache.get(1, "analyse").version == storage.get_user_version(1)
+
+
+def test_summary_is_not_cached_when_history_appears_during_load(service):
+    storage, cache = service
+
+    result = asyncio.run(AnalysisService.analyse_history(1))
+
+    assert result.summary == "сводка"
+    assert cache.get(1, "analyse") is None
+
+
+def test_summary_is_not_cached_when_history_changes_during_load(service):
+    storage, cache = service
+    AnalysisStorage.add_rows(storage, [[1, "2024-01-01", "Гемоглобин", "140", "ok"]])
+
+    asyncio.run(AnalysisService.analyse_history(1))
+
+    assert cache.get(1, "analyse") is None
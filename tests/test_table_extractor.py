@@ -0,0 +1,168 @@
+import asyncio
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from src.tg_bot.utils import ocr_to_csv
+from src.tg_bot.utils.table_extractor import classify_status, extract_table, parse_reference
+
+SAMPLE = Path(__file__).resolve().parents[1] / "ocr_results.json"
+
+
+def _line(text, x0, y0, x1=None, confidence=None):
+    line = {"text": text, "bbox": [x0, y0, x1 if x1 is not None else x0 + 10 * len(text), y0 + 20]}
+    if confidence is not None:
+        line["confidence"] = confidence
+    return line
+
+
+def _form(*rows, date_text="Дата взятия образца: 12.03.2024"):
+    lines = [_line(date_text, 10, 10)]
+    lines += [_line("Исследование", 10, 60), _line("Результат", 300, 60), _line("Единицы", 420, 60),
+              _line("Референсные значения", 520, 60), _line("Комментарий", 760, 60)]
+    y = 100
+    for row in rows:
+        for x, text in zip((10, 300, 420, 520, 760), row):
+            if text:
+                lines.append(_line(text, x, y, confidence=0.99))
+        y += 40
+    return lines
+
+
+def test_bundled_scan_is_pinned():
+    text_lines = json.loads(SAMPLE.read_text(encoding="utf-8"))[0]["text_lines"]
+
+    table = extract_table(text_lines)
+
+    assert table.date == "2025-10-05"
+    assert table.unplaced == []
+    assert table.rows == [
+        ["2025-10-05", "Моноциты", "9.03", "invalid", "3.0 - 11.0 %"],
+        ["2025-10-05", "Базофилы", "0.35", "attention", "0.0 - 1.0 %"],
+        ["2025-10-05", "Холестерин ЛПВП", "1.23", "attention", "0.9 - 2.0 ммоль/л"],
+        ["2025-10-05", "Глюкоза", "3.96", "invalid", "4.1 - 6.0 ммоль/л"],
+    ]
+
+
+def test_columns_are_mapped_by_header_positions():
+    table = extract_table(_form(
+        ("Гемоглобин", "180", "г/л", "130 - 160", ""),
+        ("Глюкоза", "5,1", "ммоль/л", "4.1 - 6.0", ""),
+    ))
+
+    assert table.rows == [
+        ["2024-03-12", "Гемоглобин", "180", "abnormal", "130 - 160 г/л"],
+        ["2024-03-12", "Глюкоза", "5.1", "ok", "4.1 - 6.0 ммоль/л"],
+    ]
+
+
+def test_multiline_comment_is_joined_to_previous_row():
+    table = extract_table(_form(
+        ("Глюкоза", "5.1", "ммоль/л", "4.1 - 6.0", "см."),
+        ("", "", "", "", "примечание"),
+    ))
+
+    assert len(table.rows) == 1
+    assert table.rows[0][3] == "attention"
+
+
+def test_low_confidence_row_is_invalid():
+    lines = _form(("Глюкоза", "5.1", "ммоль/л", "4.1 - 6.0", ""))
+    lines[-3]["confidence"] = 0.3
+
+    table = extract_table(lines, min_confidence=0.75)
+
+    assert table.rows[0][3] == "invalid"
+
+
+def test_page_without_header_is_left_to_llm():
+    assert extract_table([_line("Просто текст", 10, 10)]) is None
+
+
+def test_continuation_page_uses_form_date():
+    lines = [line for line in _form(("Глюкоза", "5.1", "", "", "")) if "Дата" not in line["text"]]
+
+    assert extract_table(lines, default_date="2024-01-01").rows[0][0] == "2024-01-01"
+
+
+@pytest.mark.parametrize("text, bounds", [
+    ("3.0 - 11.0", (3.0, 11.0)),
+    ("4,1–6,0", (4.1, 6.0)),
+    ("< 5.2", (None, 5.2)),
+    ("до 34", (None, 34.0)),
+    ("> 1", (1.0, None)),
+    ("отрицательно", (None, None)),
+])
+def test_parse_reference(text, bounds):
+    assert parse_reference(text) == bounds
+
+
+@pytest.mark.parametrize("result, reference, comment, status", [
+    ("5", "3 - 11", "", "ok"),
+    ("12", "3 - 11", "", "abnormal"),
+    ("5", "3 - 11", "Результат может быть неверным", "invalid"),
+    ("5", "", "Пограничное значение", "attention"),
+    ("5", "", "Повышен", "abnormal"),
+])
+def test_classify_status(result, reference, comment, status):
+    assert classify_status(result, reference, comment) == status
+
+
+def _page(lines):
+    return SimpleNamespace(text_lines=[SimpleNamespace(**line) for line in lines])
+
+
+def _confident(lines):
+    return [{**line, "confidence": line.get("confidence", 0.99)} for line in lines]
+
+
+def test_llm_is_not_called_for_fully_parsed_pages(monkeypatch):
+    async def fail(pages):
+        raise AssertionError("LLM не должен вызываться")
+
+    monkeypatch.setattr(ocr_to_csv, "_parse_with_llm", fail)
+
+    text = asyncio.run(ocr_to_csv.ocr_results_to_csv([_page(_confident(_form(("Глюкоза", "5.1", "", "", ""))))]))
+
+    assert text == "2024-03-12,Глюкоза,5.1,ok,\n"
+
+
+def test_local_rows_survive_llm_failure(monkeypatch):
+    async def fail(pages):
+        raise RuntimeError("YandexGPT недоступен")
+
+    monkeypatch.setattr(ocr_to_csv, "_parse_with_llm", fail)
+    pages = [_page(_confident(_form(("Глюкоза", "5.1", "", "", "")))), _page(_confident([_line("Без таблицы", 10, 10)]))]
+
+    text = asyncio.run(ocr_to_csv.ocr_results_to_csv(pages))
+
+    assert text == "2024-03-12,Глюкоза,5.1,ok,\n"
+
+
+def test_llm_failure_without_local_rows_is_raised(monkeypatch):
+    async def fail(pages):
+        raise RuntimeError("YandexGPT недоступен")
+
+    monkeypatch.setattr(ocr_to_csv, "_parse_with_llm", fail)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(ocr_to_csv.ocr_results_to_csv([_page(_confident([_line("Без таблицы", 10, 10)]))]))
+
+
+def test_llm_rows_are_appended_after_local_rows(monkeypatch):
+    seen = []
+
+    async def parse(pages):
+        seen.extend(pages)
+        return "2024-03-12,Гемоглобин,140,ok,\n"
+
+    monkeypatch.setattr(ocr_to_csv, "_parse_with_llm", parse)
+    pages = [_page(_confident(_form(("Глюкоза", "5.1", "", "", "")))),
+             _page([{**_line("Без таблицы", 10, 10), "confidence": 0.1}])]
+
+    text = asyncio.run(ocr_to_csv.ocr_results_to_csv(pages))
+
+    assert text.splitlines() == ["2024-03-12,Глюкоза,5.1,ok,", "2024-03-12,Гемоглобин,140,ok,"]
+    assert seen[0]["text_lines"][0]["low_confidence"] is True
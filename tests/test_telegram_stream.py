@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from src.tg_bot.utils.telegram_stream import CURSOR, MessageStream, split_message
+
+
+@pytest.mark.parametrize("text, limit, chunks", [
+    ("короткий", 20, ["короткий"]),
+    ("первая строка\nвторая строка", 20, ["первая строка", "вторая строка"]),
+    ("a" * 25, 10, ["a" * 10, "a" * 10, "a" * 5]),
+    ("ab\n" + "c" * 12, 10, ["ab\n" + "c" * 7, "c" * 5]),
+    ("", 10, [""]),
+])
+def test_split_message(text, limit, chunks):
+    assert split_message(text, limit) == chunks
+
+
+def test_chunks_never_exceed_limit_and_keep_text():
+    text = "\n".join(f"Строка {n}: " + "x" * (n % 17) for n in range(200))
+
+    chunks = split_message(text, 100)
+
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "") == text.replace("\n", "")
+
+
+class FakeMessage:
+    _ids = 0
+
+    def __init__(self, text=""):
+        FakeMessage._ids += 1
+        self.message_id = FakeMessage._ids
+        self.text = text
+        self.sent: list["FakeMessage"] = []
+        self.deleted = False
+
+    async def edit_text(self, text):
+        self.text = text
+
+    async def answer(self, text):
+        message = FakeMessage(text)
+        self.sent.append(message)
+        return message
+
+    async def delete(self):
+        self.deleted = True
+
+
+def test_long_answer_continues_in_new_messages():
+    first = FakeMessage("Анализирую…")
+    stream = MessageStream(first, interval=0, limit=10)
+
+    async def run():
+        await stream.update("a" * 15)
+        await stream.finish("a" * 15)
+
+    asyncio.run(run())
+
+    assert [message.text for message in stream.messages] == ["a" * 10, "a" * 5]
+
+
+def test_partial_text_shows_cursor_until_finish():
+    message = FakeMessage("Анализирую…")
+    stream = MessageStream(message, interval=0)
+
+    asyncio.run(stream.update("Ответ"))
+    assert message.text == "Ответ" + CURSOR
+
+    asyncio.run(stream.finish("Ответ готов"))
+    assert message.text == "Ответ готов"
+
+
+def test_updates_are_throttled():
+    message = FakeMessage("Анализирую…")
+    stream = MessageStream(message, interval=60)
+
+    async def run():
+        await stream.update("первая")
+        await stream.update("вторая")
+
+    asyncio.run(run())
+
+    assert message.text == "первая" + CURSOR
+
+
+def test_extra_parts_are_deleted_when_final_text_is_shorter():
+    stream = MessageStream(FakeMessage("Анализирую…"), interval=0, limit=10)
+
+    async def run():
+        await stream.update("a" * 25)
+        extra = stream.messages[1:]
+        await stream.finish("Ошибка")
+        return extra
+
+    extra = asyncio.run(run())
+
+    assert [message.text for message in stream.messages] == ["Ошибка"]
+    assert extra and all(message.deleted for message in extra)
@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.filters.state import StateFilter
+
+from src.tg_bot.handlers import user_handlers
+from src.tg_bot.handlers.user_handlers import PromptState
+from src.tg_bot.middlewares.throttling import ThrottlingMiddleware, TokenBucket
+
+
+def test_bucket_allows_burst_then_reports_wait():
+    bucket = TokenBucket(capacity=2, rate=0.5)
+
+    assert bucket.take() == 0 and bucket.take() == 0
+    assert 0 < bucket.take() <= 2
+
+
+def test_bucket_refills_over_time():
+    bucket = TokenBucket(capacity=2, rate=1)
+    bucket.take(), bucket.take()
+
+    bucket.updated -= 1.5
+
+    assert bucket.take() == 0
+    assert not bucket.is_full()
+
+
+def _call(middleware, command_class, user_id=1):
+    calls = []
+
+    async def handler(event, data):
+        calls.append(event)
+        return "ok"
+
+    data = {"event_from_user": SimpleNamespace(id=user_id), "handler": SimpleNamespace(flags={"rate_limit": command_class})}
+    result = asyncio.run(middleware(handler, object(), data))
+    return result, len(calls)
+
+
+def test_middleware_limits_each_user_and_class_separately():
+    middleware = ThrottlingMiddleware({"llm": (1, 1)})
+
+    assert _call(middleware, "llm") == ("ok", 1)
+    assert _call(middleware, "llm") == (None, 0)
+    assert _call(middleware, "llm", user_id=2) == ("ok", 1)
+    assert _call(middleware, None) == ("ok", 1)
+
+
+def test_prompt_cancel_is_handled_before_the_rate_limited_handler():
+    handlers = [
+        handler for handler in user_handlers.router.message.handlers
+        if any(isinstance(f.callback, StateFilter) and PromptState.waiting_for_prompt in f.callback.states
+               for f in handler.filters or [])
+    ]
+
+    names = [handler.callback.__name__ for handler in handlers]
+
+    assert names.index("process_prompt_cancel") < names.index("process_user_prompt")
+    cancel = handlers[names.index("process_prompt_cancel")]
+    assert "rate_limit" not in cancel.flags